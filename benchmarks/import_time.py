@@ -0,0 +1,58 @@
+import os
+import statistics
+import subprocess
+import sys
+from argparse import ArgumentParser, Namespace
+from typing import Final
+
+ROOT_DIR: Final[str] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS: Final[dict[str, str]] = {
+    "config": "from src.config.config import Config",
+    "main": "import main",
+    "system": "from src.config.config import Config; from src.logger.bot_logger import BotLogger; Config(BotLogger()).get_registry().get_handler('system')",
+    "ssh": "from src.config.config import Config; from src.logger.bot_logger import BotLogger; Config(BotLogger()).get_registry().get_handler('ssh')",
+    "apex": "from src.config.config import Config; from src.logger.bot_logger import BotLogger; Config(BotLogger()).get_registry().get_handler('apex')",
+}
+
+
+def measure(code: str) -> (int, list[tuple[int, str]]):
+    """
+    Runs code in a fresh interpreter with -X importtime.
+    @return: total cumulative import time in microseconds and the top level imports sorted by cost.
+    """
+    result: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    top_level: list[tuple[int, str]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isnumeric() or name.startswith("  "):
+            continue
+        top_level.append((int(cumulative), name.strip()))
+    return sum(us for us, _ in top_level), sorted(top_level, reverse=True)
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser(description="startup import time per handler")
+    parser.add_argument("-n", "--runs", help="runs per scenario", type=int, default=5)
+    parser.add_argument("-t", "--top", help="heaviest top level imports to show", type=int, default=5)
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS.keys()))
+    args: Namespace = parser.parse_args()
+
+    for scenario in args.scenarios:
+        totals: list[int] = []
+        heaviest: list[tuple[int, str]] = []
+        for _ in range(args.runs):
+            total, heaviest = measure(SCENARIOS[scenario])
+            totals.append(total)
+        print(f"{scenario:<8} median={statistics.median(totals) / 1000:8.1f}ms min={min(totals) / 1000:8.1f}ms")
+        for us, name in heaviest[:args.top]:
+            print(f"    {us / 1000:8.1f}ms {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,109 @@
 from argparse import ArgumentParser, FileType, Namespace
+from typing import Optional
 
+from src.cluster.cluster import ClusterCoordinator
 from src.config.config import Config
+from src.config.handler_spec import HandlerSpec
+from src.config.settings import BotSettings
 from src.constant import BOT_NAME
-from src.kcp.kcp import KCPHandler
+from src.diagnostics.diagnostics import Diagnostics
+from src.fanin.fanin_config import FanInConfig
+from src.kcp.process_manager import ProcessManager
 from src.logger.bot_logger import BotLogger
 from src.thread_executor.client_executor import ClientExecutor
 from src.thread_executor.server_executor import ServerExecutor
 
 
-def main():
-    parser: ArgumentParser = ArgumentParser()
-    parser.add_argument("-c", "--config", help="path of the config file", type=FileType("r"), default="config.yml")
-    args: Namespace = parser.parse_args()
+def mirror(bot_logger: BotLogger, settings: BotSettings):
+    from src.helpers.github import GithubReleaseClient
+    from src.mirror.mirror import Mirror
 
-    bot_logger = BotLogger()
-    bot_logger.info(f"Started {BOT_NAME} bot")
+    Mirror(bot_logger, settings.mirror_config.mirror_dir).prefetch(GithubReleaseClient(bot_logger, settings.github_config))
+
+
+def diag(bot_logger: BotLogger, settings: BotSettings, command: list[str]):
+    if not settings.diagnostics_config.control_socket:
+        bot_logger.error("The diagnostics socket is disabled in the config")
+        return
+    # a profile replies once it is done
+    bot_logger.info(Diagnostics.send(settings.diagnostics_config.control_socket, " ".join(command) or "stacks", Diagnostics.MAX_PROFILE + 30))
+
+
+def fanin(bot_logger: BotLogger, fanin_config: FanInConfig, clients: list[HandlerSpec]):
+    from src.fanin.fanin import FanInBackend, FanInProxy
+
+    backends: list[FanInBackend] = []
+    for client in clients:
+        if fanin_config.clients is None or client.name in fanin_config.clients:
+            # the spec builds the handler once, the client executor schedules the same one
+            backends.append(FanInBackend(client.name, lambda c=client: c.get_handler().get_probe_addresses()[0], lambda c=client: c.get_handler().get_tunnel_rtt()))
+    FanInProxy(bot_logger, fanin_config, backends).start()
+
+
+def run(bot_logger: BotLogger, config: Config, args: Namespace):
+    # the handlers run on their own threads, only the main thread can install the SIGCHLD fallback
+    ProcessManager.get_default(bot_logger)
+    server, clients = config.read_specs(args.config)  # type: HandlerSpec, list[HandlerSpec]
+
+    if config.get_settings().mirror_config.serve:
+        from src.mirror.mirror import MirrorServer
 
-    config: Config = Config(bot_logger)
-    server, clients = config.read_config(args.config)  # type: KCPHandler, list[KCPHandler]
+        MirrorServer(bot_logger, config.get_settings().mirror_config.mirror_dir, config.get_settings().mirror_config.serve).start()
 
-    server_executor: ServerExecutor = ServerExecutor(bot_logger, server)
+    diagnostics: Diagnostics = Diagnostics(bot_logger, config.get_settings().diagnostics_config)
+    diagnostics.start()
+
+    server_executor: ServerExecutor = ServerExecutor(bot_logger, server.get_handler())
     server_executor.start()
 
-    client_executor: ClientExecutor = ClientExecutor(bot_logger)
+    coordinator: Optional[ClusterCoordinator] = None
+    if config.get_settings().cluster_config.enabled:
+        coordinator = ClusterCoordinator(bot_logger, config.get_settings().cluster_config)
+        bot_logger.info(f"Running as cluster node {coordinator.get_node()}")
+
+    client_executor: ClientExecutor = ClientExecutor(bot_logger, coordinator)
     client_executor.start()
 
     for client in clients:
-        client_executor.add_handler(client)
+        client_executor.add_spec(client)
+    if coordinator:
+        coordinator.start()
+
+    for fanin_config in config.get_settings().fanin_configs:
+        fanin(bot_logger, fanin_config, clients)
+
+    try:
+        server_executor.join()
+    finally:
+        diagnostics.close()
+
+
+def main():
+    parser: ArgumentParser = ArgumentParser()
+    parser.add_argument("command", help="run the bot, prefetch every release artifact into the mirror or send a diagnostics command to the running bot", nargs="?", choices=("run", "mirror", "diag"), default="run")
+    parser.add_argument("diag_command", help="diag only: stacks, profile [seconds], trace start, trace diff or trace stop", nargs="*")
+    parser.add_argument("-c", "--config", help="path of the config file", type=FileType("r"), default="config.yml")
+    parser.add_argument("--config-cache", help="compiled config kept between restarts, empty to always parse the config file", default="config.cache")
+    parser.add_argument("--mirror-dir", help="artifact mirror directory, overrides the config file")
+    parser.add_argument("--offline", help="resolve artifacts only from the mirror", action="store_true")
+    parser.add_argument("--serve-mirror", help="serve the mirror over http on this address, for example 0.0.0.0:8000")
+    parser.add_argument("--mirror-url", help="url the ssh targets use to reach the served mirror")
+    args: Namespace = parser.parse_args()
+    if args.diag_command and args.command != "diag":
+        parser.error(f"unexpected arguments: {' '.join(args.diag_command)}")
+
+    bot_logger = BotLogger()
+    bot_logger.info(f"Started {BOT_NAME} bot")
+
+    config: Config = Config(bot_logger, cache_path=args.config_cache or None)
+    config.set_mirror_overrides(mirror_dir=args.mirror_dir, offline=args.offline or None, serve=args.serve_mirror, public_url=args.mirror_url)
 
-    server_executor.join()
+    if args.command == "mirror":
+        mirror(bot_logger, config.load(args.config))
+    elif args.command == "diag":
+        diag(bot_logger, config.load(args.config), args.diag_command)
+    else:
+        run(bot_logger, config, args)
 
 
 if __name__ == '__main__':
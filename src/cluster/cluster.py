@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import time
+from typing import Optional, Callable
+
+from src.cluster.cluster_config import ClusterConfig
+from src.cluster.lease import LeaseBackend, MemoryLeaseBackend, SqliteLeaseBackend
+from src.decorators.background import background
+from src.logger.bot_logger import BotLogger
+
+
+class ClusterException(Exception):
+    def __init__(self, msg: str):
+        super(ClusterException, self).__init__(msg)
+
+
+def rendezvous_owner(key: str, nodes: list[str]) -> Optional[str]:
+    """
+    Highest random weight: every node ranks the same way, and a node joining or leaving only moves the keys it wins or held.
+    """
+    if not nodes:
+        return None
+    return max(nodes, key=lambda node: hashlib.sha256(f"{node}\0{key}".encode("utf-8")).digest())
+
+
+class ClusterCoordinator:
+    """
+    Keeps this node alive in the backend and holds the leases of the client handlers rendezvous hashing assigns to it.
+    A lease assigned elsewhere is renewed until the local handler stopped and only then released, expired ones are taken over.
+    """
+    def __init__(self, bot_logger: BotLogger, config: ClusterConfig, backend: Optional[LeaseBackend] = None):
+        self._bot_logger: BotLogger = bot_logger
+        self._config: ClusterConfig = config
+        self._backend: LeaseBackend = backend if backend else self.create_backend(config)
+        self._lock: threading.Lock = threading.Lock()
+        self._keys: list[str] = []
+        self._owned: set[str] = set()
+        # leases held for handlers that still run here although the key moved to another node
+        self._draining: set[str] = set()
+        self._is_active: dict[str, Callable[[], bool]] = {}
+        self._nodes: list[str] = []
+        self._renewed: float = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop: threading.Event = threading.Event()
+
+    @classmethod
+    def create_backend(cls, config: ClusterConfig) -> LeaseBackend:
+        if config.backend == "sqlite":
+            return SqliteLeaseBackend(config.path)
+        if config.backend == "memory":
+            return MemoryLeaseBackend()
+        raise ClusterException(f"Unknown cluster backend {config.backend}")
+
+    def get_node(self) -> str:
+        return self._config.node
+
+    def add_key(self, key: str, is_active: Optional[Callable[[], bool]] = None):
+        """
+        @param is_active: True while the handler of the key still runs on this node, its lease is kept until then.
+        """
+        with self._lock:
+            if key not in self._keys:
+                self._keys.append(key)
+            if is_active:
+                self._is_active[key] = is_active
+
+    def is_owner(self, key: str) -> bool:
+        with self._lock:
+            return key in self._owned
+
+    def get_owned(self) -> set[str]:
+        with self._lock:
+            return set(self._owned)
+
+    def get_draining(self) -> set[str]:
+        with self._lock:
+            return set(self._draining)
+
+    def get_nodes(self) -> list[str]:
+        with self._lock:
+            return list(self._nodes)
+
+    def rebalance(self):
+        """
+        One round: renews the heartbeat, then acquires, renews or releases every lease.
+        """
+        node: str = self._config.node
+        self._backend.heartbeat(node, self._config.lease_ttl)
+        nodes: list[str] = self._backend.get_nodes()
+        if node not in nodes:
+            nodes = sorted(nodes + [node])
+        with self._lock:
+            keys: list[str] = list(self._keys)
+            previous: set[str] = self._owned | self._draining
+            is_active: dict[str, Callable[[], bool]] = dict(self._is_active)
+        owned: set[str] = set()
+        for key in keys:
+            if rendezvous_owner(key, nodes) == node and self._backend.acquire(key, node, self._config.lease_ttl):
+                owned.add(key)
+        with self._lock:
+            # no handler starts once the key is not owned, from here on is_active only goes down
+            self._owned = owned
+            self._nodes = nodes
+        draining: set[str] = set()
+        for key in previous - owned:
+            if rendezvous_owner(key, nodes) == node:
+                # still ours but taken by another node after it expired
+                continue
+            # the new owner can only start the handler once this node released the lease
+            if key in is_active and is_active[key]():
+                if self._backend.acquire(key, node, self._config.lease_ttl):
+                    draining.add(key)
+            else:
+                self._backend.release(key, node)
+        with self._lock:
+            handing: set[str] = draining - self._draining
+            self._draining = draining
+            self._renewed = time.monotonic()
+        for key in sorted(owned - previous):
+            self._bot_logger.info(f"Cluster node {node} took over {key}")
+        for key in sorted(handing):
+            self._bot_logger.info(f"Cluster node {node} hands over {key} once its handler stopped")
+        for key in sorted(previous - owned - draining):
+            self._bot_logger.info(f"Cluster node {node} handed over {key}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.rebalance()
+        self._thread = self._loop()
+
+    def stop(self):
+        """
+        Leaves the cluster right away instead of letting the leases expire.
+        """
+        self._stop.set()
+        with self._lock:
+            self._owned = set()
+            self._draining = set()
+        self._backend.leave(self._config.node)
+
+    @background("CLUSTER")
+    def _loop(self):
+        while not self._stop.wait(self._config.renew_interval):
+            try:
+                self.rebalance()
+            except Exception as e:
+                self._bot_logger.error(f"Cluster round of {self._config.node} failed: {e}")
+                with self._lock:
+                    # once the leases could have expired another node may run the handlers
+                    expired: bool = bool(self._owned or self._draining) and time.monotonic() - self._renewed >= self._config.lease_ttl
+                    if expired:
+                        self._owned = set()
+                        self._draining = set()
+                if expired:
+                    self._bot_logger.error(f"Cluster node {self._config.node} could not renew its leases, dropping them")
@@ -0,0 +1,16 @@
+import os
+import socket
+from typing import Optional
+
+
+class ClusterConfig:
+    def __init__(self, enabled: bool = False, node: Optional[str] = None, backend: str = "sqlite", path: str = "cluster.db", lease_ttl: int = 15, renew_interval: int = 5):
+        self.enabled: bool = enabled
+        # unique per bot instance, the host name and pid when unset
+        self.node: str = node if node else f"{socket.gethostname()}-{os.getpid()}"
+        # "sqlite" on a volume every node mounts, "memory" for nodes in the same process
+        self.backend: str = backend
+        self.path: str = path
+        # seconds a lease and a node heartbeat last without being renewed
+        self.lease_ttl: int = lease_ttl
+        self.renew_interval: int = renew_interval
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class LeaseBackend:
+    """
+    Shared by every node of the cluster: node heartbeats and one lease per client handler.
+    Expiry times are wall clock, the nodes need synced clocks.
+    """
+    def heartbeat(self, node: str, ttl: float):
+        raise NotImplementedError
+
+    def leave(self, node: str):
+        """
+        Drops the node and every lease it holds, the others take over on their next round.
+        """
+        raise NotImplementedError
+
+    def get_nodes(self) -> list[str]:
+        """
+        @return: nodes whose heartbeat did not expire, sorted.
+        """
+        raise NotImplementedError
+
+    def acquire(self, key: str, node: str, ttl: float) -> bool:
+        """
+        Takes a free or expired lease, or renews one the node already holds.
+        @return: True when the node holds the lease.
+        """
+        raise NotImplementedError
+
+    def release(self, key: str, node: str):
+        raise NotImplementedError
+
+    def get_owner(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+
+class MemoryLeaseBackend(LeaseBackend):
+    """
+    Stand-in for nodes living in the same process, mostly tests.
+    """
+    def __init__(self):
+        self._lock: threading.Lock = threading.Lock()
+        self._nodes: dict[str, float] = {}
+        self._leases: dict[str, tuple[str, float]] = {}
+
+    def heartbeat(self, node: str, ttl: float):
+        with self._lock:
+            self._nodes[node] = time.time() + ttl
+
+    def leave(self, node: str):
+        with self._lock:
+            self._nodes.pop(node, None)
+            self._leases = {key: lease for key, lease in self._leases.items() if lease[0] != node}
+
+    def get_nodes(self) -> list[str]:
+        now: float = time.time()
+        with self._lock:
+            return sorted(node for node, expires in self._nodes.items() if expires > now)
+
+    def acquire(self, key: str, node: str, ttl: float) -> bool:
+        now: float = time.time()
+        with self._lock:
+            owner, expires = self._leases.get(key, (None, 0.0))
+            if owner not in (None, node) and expires > now:
+                return False
+            self._leases[key] = (node, now + ttl)
+            return True
+
+    def release(self, key: str, node: str):
+        with self._lock:
+            if self._leases.get(key, (None, 0.0))[0] == node:
+                del self._leases[key]
+
+    def get_owner(self, key: str) -> Optional[str]:
+        with self._lock:
+            owner, expires = self._leases.get(key, (None, 0.0))
+            return owner if expires > time.time() else None
+
+
+class _Transaction:
+    """
+    Takes the write lock on enter, commits on a clean exit, rolls back on an exception, and always closes the connection.
+    """
+    def __init__(self, db: sqlite3.Connection):
+        self._db: sqlite3.Connection = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            # a database locked past the timeout, __exit__ is not called for a failed __enter__
+            self._db.close()
+            raise
+        return self._db
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self._db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._db.close()
+
+
+class SqliteLeaseBackend(LeaseBackend):
+    """
+    A sqlite database on a volume every node mounts, writes take the database lock so two nodes never hold the same lease.
+    """
+    TIMEOUT: float = 10.0
+
+    def __init__(self, path: str):
+        self._path: str = path
+        directory: str = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS nodes (node TEXT PRIMARY KEY, expires REAL NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, node TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _connect(self) -> _Transaction:
+        # a connection per call, the coordinator and the executors use the backend from different threads
+        return _Transaction(sqlite3.connect(self._path, timeout=self.TIMEOUT, isolation_level=None))
+
+    def heartbeat(self, node: str, ttl: float):
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO nodes (node, expires) VALUES (?, ?)", (node, time.time() + ttl))
+
+    def leave(self, node: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM nodes WHERE node = ?", (node,))
+            db.execute("DELETE FROM leases WHERE node = ?", (node,))
+
+    def get_nodes(self) -> list[str]:
+        with self._connect() as db:
+            return [row[0] for row in db.execute("SELECT node FROM nodes WHERE expires > ? ORDER BY node", (time.time(),))]
+
+    def acquire(self, key: str, node: str, ttl: float) -> bool:
+        now: float = time.time()
+        with self._connect() as db:
+            row: Optional[tuple] = db.execute("SELECT node, expires FROM leases WHERE key = ?", (key,)).fetchone()
+            if row and row[0] != node and row[1] > now:
+                return False
+            db.execute("INSERT OR REPLACE INTO leases (key, node, expires) VALUES (?, ?, ?)", (key, node, now + ttl))
+            return True
+
+    def release(self, key: str, node: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM leases WHERE key = ? AND node = ?", (key, node))
+
+    def get_owner(self, key: str) -> Optional[str]:
+        with self._connect() as db:
+            row: Optional[tuple] = db.execute("SELECT node FROM leases WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+            return row[0] if row else None
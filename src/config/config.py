@@ -1,19 +1,32 @@
+import hashlib
 import json
 from io import TextIOWrapper
-from typing import Optional, Type, Any
+from typing import Optional, Type, Any, Final
 
 import yaml
 
-from src.handlers.apex.apex import ApexHandler
-from src.handlers.apex.apex_config import ApexHandlerConfig
+from src.cluster.cluster_config import ClusterConfig
+from src.config.config_cache import ConfigCache
+from src.config.handler_spec import HandlerSpec
+from src.config.keys import KeyNotFoundException, KeyNotValidTypeException, get_key, get_optional_key
+from src.config.settings import BotSettings
+from src.diagnostics.diagnostics_config import DiagnosticsConfig
+from src.fanin.fanin_config import FanInConfig
 from src.handlers.handler_config import HandlerConfig
-from src.handlers.ssh.ssh import SSHHandler
-from src.handlers.ssh.ssh_config import SSHHandlerConfig
-from src.handlers.system.system import SystemHandler
+from src.handlers.registry import HandlerRegistry, InvalidHandlerException
+from src.helpers.github_config import GithubConfig
 from src.kcp.kcp import KCPHandler
+from src.kcp.adapt_config import AdaptConfig, AdaptProfile
+from src.kcp.failover_config import FailoverConfig
 from src.kcp.kcp_config import KCPClientConfig, KCPServerConfig, KCPConfig
+from src.kcp.probe_config import ProbeConfig
+from src.kcp.process_config import ProcessConfig
+from src.kcp.upgrade_config import UpgradeConfig
 from src.logger.bot_logger import BotLogger
+from src.logger.log_config import LogConfig
+from src.mirror.mirror_config import MirrorConfig
 from src.service.mode import ServiceMode
+from src.state.state_config import StateConfig
 
 
 class ConfigException(Exception):
@@ -26,21 +39,6 @@ class KCPConfigException(Exception):
         super(KCPConfigException, self).__init__(msg)
 
 
-class KeyNotFoundException(Exception):
-    def __init__(self, msg: str):
-        super(KeyNotFoundException, self).__init__(msg)
-
-
-class KeyNotValidTypeException(Exception):
-    def __init__(self, msg: str):
-        super(KeyNotValidTypeException, self).__init__(msg)
-
-
-class InvalidHandlerException(Exception):
-    def __init__(self, msg: str):
-        super(InvalidHandlerException, self).__init__(msg)
-
-
 class InvalidConfigHandlerException(Exception):
     def __init__(self, msg: str):
         super(InvalidConfigHandlerException, self).__init__(msg)
@@ -52,84 +50,366 @@ class InvalidConfigFileExtensionException(Exception):
 
 
 class Config:
-    def __init__(self, bot_logger: BotLogger):
+    SETTINGS_KEYS: Final[tuple[str, ...]] = ("logs", "mirror", "state", "github", "cluster", "fanin", "diagnostics")
+    # the libyaml loader is an order of magnitude faster on big fleets, the pure python one is the fallback
+    YAML_LOADER: Final[Type] = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+    def __init__(self, bot_logger: BotLogger, registry: Optional[HandlerRegistry] = None, cache_path: Optional[str] = None):
+        """
+        @param cache_path: where the compiled config is kept between restarts, None to always parse the file.
+        """
+        self._registry: HandlerRegistry = registry if registry else HandlerRegistry()
         self._config_data: Optional[dict] = None
         self._bot_logger: BotLogger = bot_logger
+        self._settings: BotSettings = BotSettings()
+        self._mirror_overrides: dict[str, Any] = {}
+        self._cache: Optional[ConfigCache] = ConfigCache(cache_path) if cache_path else None
 
     def read_config(self, file: TextIOWrapper) -> (KCPHandler, list[KCPHandler]):
-        if file.name.endswith(".yaml") or file.name.endswith(".yml"):
-            with file as f:
-                self._config_data = yaml.load(f, Loader=yaml.SafeLoader)
-        elif file.name.endswith(".json"):
-            with file as f:
-                self._config_data = json.loads(f.read())
+        server, clients = self.read_specs(file)  # type: HandlerSpec, list[HandlerSpec]
+        return server.get_handler(), [client.get_handler() for client in clients]
+
+    def read_specs(self, file: TextIOWrapper) -> (HandlerSpec, list[HandlerSpec]):
+        """
+        Validates every entry without building any handler, the compiled cache skips parsing and validation when the file did not change.
+        @return: the server spec and the client specs, handlers are built on the first get_handler.
+        """
+        content: str = self._read_file(file)
+        digest: str = hashlib.sha256(content.encode()).hexdigest()
+        compiled: Optional[tuple[dict, list[dict]]] = self._cache.read(digest) if self._cache else None
+        if compiled:
+            sections, records = compiled
         else:
+            sections, records = self._compile(self._parse(file.name, content))
+            if self._cache:
+                self._write_cache(digest, sections, records)
+        self._settings = self.get_settings_config(sections)
+        specs: list[HandlerSpec] = [HandlerSpec.from_dict(record, self.build_handler) for record in records]
+        return specs[0], specs[1:]
+
+    def load(self, file: TextIOWrapper) -> BotSettings:
+        self._config_data = self._parse(file.name, self._read_file(file))
+        self._settings = self.get_settings_config(self._config_data)
+        return self._settings
+
+    @classmethod
+    def _read_file(cls, file: TextIOWrapper) -> str:
+        if not file.name.endswith((".yaml", ".yml", ".json")):
             file.close()
             raise InvalidConfigFileExtensionException(f"Config file does not have a valid extension [.json/.yaml]")
-        return self._process_server(), self._process_clients()
-
-    def _process_server(self) -> KCPHandler:
-        server: dict = self._get_key(self._config_data, "server", dict)
-        kcp_config: KCPConfig = self.get_kcp_config(server, "server")
-        kcp_handler, handler_config = self.get_handler_config(server)  # type: Type[KCPHandler], HandlerConfig
-        return kcp_handler(self._bot_logger, ServiceMode.SERVER, kcp_config, handler_config)
-
-    def _process_clients(self) -> list[KCPHandler]:
-        clients: list = self._get_key(self._config_data, "clients", list)
-        client_handlers: list[KCPHandler] = []
-        for client in clients:
-            client_handlers.append(self._process_client(client))
-        return client_handlers
-
-    def _process_client(self, client: dict) -> KCPHandler:
-        kcp_config: KCPConfig = self.get_kcp_config(client, "client")
-        kcp_handler, handler_config = self.get_handler_config(client)  # type: Type[KCPHandler], HandlerConfig
-        return kcp_handler(self._bot_logger, ServiceMode.CLIENT, kcp_config, handler_config)
+        with file as f:
+            return f.read()
+
+    def _parse(self, name: str, content: str) -> dict:
+        if name.endswith(".json"):
+            data: Any = json.loads(content)
+        else:
+            data: Any = yaml.load(content, Loader=self.YAML_LOADER)
+        if not isinstance(data, dict):
+            raise ConfigException("Config file must hold a mapping")
+        return data
+
+    def _compile(self, data: dict) -> (dict, list[dict]):
+        """
+        Validates the settings and every handler entry.
+        @return: the settings sections and one record per handler, the server first.
+        """
+        sections: dict = {key: data[key] for key in self.SETTINGS_KEYS if key in data}
+        self.get_settings_config(sections)
+        server: dict = self._get_key(data, "server", dict)
+        clients: list = self._get_key(data, "clients", list)
+        records: list[dict] = [self._compile_entry(server, ServiceMode.SERVER, "server")]
+        for i, client in enumerate(clients):
+            if not isinstance(client, dict):
+                raise ConfigException(f"Client entry {i} is not a mapping")
+            records.append(self._compile_entry(client, ServiceMode.CLIENT, f"client_{i}"))
+        names: set[str] = {record["name"] for record in records[1:]}
+        fanin_configs: list[FanInConfig] = self.get_fanin_configs(sections)
+        for fanin in fanin_configs:
+            unknown: list[str] = [name for name in fanin.clients or [] if name not in names]
+            if unknown:
+                raise ConfigException(f"Fan-in on {fanin.listen} names unknown clients: {', '.join(unknown)}")
+        fronted: set[str] = {name for fanin in fanin_configs for name in (names if fanin.clients is None else fanin.clients)}
+        for record, client in zip(records[1:], clients):
+            if (client.get("upgrade") or {}).get("alt_listen") and record["name"] not in fronted:
+                self._bot_logger.warning(f"{record['name']} swaps its listen port with upgrade.alt_listen on every upgrade, put it behind a fanin entry so applications keep a stable port")
+        return sections, records
+
+    def _compile_entry(self, entry: dict, mode: ServiceMode, default_name: str) -> dict:
+        try:
+            self.get_kcp_config(entry, mode.value)
+            self.get_handler_config(entry)
+            name: str = self._get_optional_key(entry, "name", str, default_name)
+        except Exception:
+            self._bot_logger.error(f"Invalid config entry {entry.get('name', default_name)}")
+            raise
+        return HandlerSpec(name, mode, entry.get("handler"), entry, self.build_handler).to_dict()
+
+    def _write_cache(self, digest: str, sections: dict, records: list[dict]):
+        try:
+            self._cache.write(digest, sections, records)
+        except (OSError, TypeError, ValueError) as e:
+            self._bot_logger.warning(f"Unable to write the compiled config to {self._cache.get_path()}: {e}")
+
+    def build_handler(self, spec: HandlerSpec) -> KCPHandler:
+        kcp_config: KCPConfig = self.get_kcp_config(spec.entry, spec.mode.value)
+        kcp_handler, handler_config = self.get_handler_config(spec.entry)  # type: Type[KCPHandler], HandlerConfig
+        return kcp_handler(self._bot_logger, spec.mode, kcp_config, handler_config, self._settings, spec.name)
+
+    def set_mirror_overrides(self, **overrides: Any):
+        self._mirror_overrides = {k: v for k, v in overrides.items() if v is not None}
+
+    def get_settings(self) -> BotSettings:
+        return self._settings
+
+    def get_registry(self) -> HandlerRegistry:
+        return self._registry
 
     @classmethod
     def _get_key(cls, instance: dict[str, str], key: str, type_: Type = str) -> Any:
-        k: Any = instance.get(key)
-        if not k:
-            raise KeyNotFoundException(f"{key} not found!")
-        if type_ == int and type(k) == str and k.isnumeric():
-            k = int(k)
-        key_type: Type = type(k)
-        if key_type != type_:
-            raise KeyNotValidTypeException(f"{key} has an invalid type! found {key_type}, expected {type_}")
-        return k
+        return get_key(instance, key, type_)
+
+    @classmethod
+    def _get_optional_key(cls, instance: dict, key: str, type_: Type, default: Any) -> Any:
+        return get_optional_key(instance, key, type_, default)
+
+    def get_settings_config(self, instance: dict) -> BotSettings:
+        logs: dict = self._get_optional_key(instance, "logs", dict, {})
+        default_logs: LogConfig = LogConfig()
+        log_config: LogConfig = LogConfig(
+            self._get_optional_key(logs, "enabled", bool, default_logs.enabled),
+            self._get_optional_key(logs, "dir", str, default_logs.log_dir),
+            self._get_optional_key(logs, "max_size", int, default_logs.max_size),
+            self._get_optional_key(logs, "max_total_size", int, default_logs.max_total_size),
+            self._get_optional_key(logs, "memory_lines", int, default_logs.memory_lines),
+            self._get_optional_key(logs, "trace", bool, default_logs.trace)
+        )
+        mirror: dict = self._get_optional_key(instance, "mirror", dict, {})
+        default_mirror: MirrorConfig = MirrorConfig()
+        mirror_config: MirrorConfig = MirrorConfig(
+            self._get_optional_key(mirror, "dir", str, default_mirror.mirror_dir),
+            self._get_optional_key(mirror, "offline", bool, default_mirror.offline),
+            self._get_optional_key(mirror, "serve", str, default_mirror.serve),
+            self._get_optional_key(mirror, "public_url", str, default_mirror.public_url)
+        )
+        for key, value in self._mirror_overrides.items():
+            setattr(mirror_config, key, value)
+        state: dict = self._get_optional_key(instance, "state", dict, {})
+        default_state: StateConfig = StateConfig()
+        state_config: StateConfig = StateConfig(
+            self._get_optional_key(state, "enabled", bool, default_state.enabled),
+            self._get_optional_key(state, "file", str, default_state.state_file),
+            self._get_optional_key(state, "artifact_ttl", int, default_state.artifact_ttl)
+        )
+        github: dict = self._get_optional_key(instance, "github", dict, {})
+        default_github: GithubConfig = GithubConfig()
+        github_config: GithubConfig = GithubConfig(
+            self._get_optional_key(github, "token", str, default_github.token),
+            self._get_optional_key(github, "min_remaining", int, default_github.min_remaining),
+            self._get_optional_key(github, "cache_ttl", int, default_github.cache_ttl)
+        )
+        cluster: dict = self._get_optional_key(instance, "cluster", dict, {})
+        default_cluster: ClusterConfig = ClusterConfig()
+        cluster_config: ClusterConfig = ClusterConfig(
+            self._get_optional_key(cluster, "enabled", bool, default_cluster.enabled),
+            self._get_optional_key(cluster, "node", str, None),
+            self._get_optional_key(cluster, "backend", str, default_cluster.backend),
+            self._get_optional_key(cluster, "path", str, default_cluster.path),
+            self._get_optional_key(cluster, "lease_ttl", int, default_cluster.lease_ttl),
+            self._get_optional_key(cluster, "renew_interval", int, default_cluster.renew_interval)
+        )
+        if cluster_config.backend not in ("sqlite", "memory"):
+            raise KeyNotValidTypeException(f"backend has an invalid value! found {cluster_config.backend}, expected sqlite or memory")
+        if cluster_config.renew_interval <= 0 or cluster_config.lease_ttl <= cluster_config.renew_interval:
+            raise ConfigException("cluster renew_interval must be positive and shorter than lease_ttl")
+        diagnostics: dict = self._get_optional_key(instance, "diagnostics", dict, {})
+        default_diagnostics: DiagnosticsConfig = DiagnosticsConfig()
+        diagnostics_config: DiagnosticsConfig = DiagnosticsConfig(
+            self._get_optional_key(diagnostics, "signals", bool, default_diagnostics.signals),
+            self._get_optional_key(diagnostics, "socket", str, default_diagnostics.control_socket),
+            self._get_optional_key(diagnostics, "dir", str, default_diagnostics.diag_dir),
+            self._get_optional_key(diagnostics, "profile_seconds", int, default_diagnostics.profile_seconds),
+            self._get_optional_key(diagnostics, "profile_interval", int, default_diagnostics.profile_interval),
+            self._get_optional_key(diagnostics, "top", int, default_diagnostics.top)
+        )
+        if diagnostics_config.profile_seconds <= 0 or diagnostics_config.profile_interval <= 0 or diagnostics_config.top <= 0:
+            raise ConfigException("diagnostics profile_seconds, profile_interval and top must be positive")
+        return BotSettings(log_config, mirror_config, state_config, github_config, cluster_config, self.get_fanin_configs(instance), diagnostics_config)
+
+    def get_fanin_configs(self, instance: dict) -> list[FanInConfig]:
+        fanin: dict | list = instance.get("fanin", [])
+        entries: list = fanin if isinstance(fanin, list) else [fanin]
+        configs: list[FanInConfig] = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                raise KeyNotValidTypeException(f"fanin has an invalid value! found {entry}, expected a mapping")
+            clients: Optional[list[str]] = self._get_optional_key(entry, "clients", list, None)
+            if clients is not None and not all(isinstance(client, str) for client in clients):
+                raise KeyNotValidTypeException(f"clients has an invalid value! found {clients}, expected a list of client names")
+            default: FanInConfig = FanInConfig("")
+            config: FanInConfig = FanInConfig(
+                self._get_key(entry, "listen"),
+                clients,
+                self._get_optional_key(entry, "balance", str, default.balance),
+                self._get_optional_key(entry, "connect_timeout", int, default.connect_timeout),
+                self._get_optional_key(entry, "cooldown", int, default.cooldown)
+            )
+            if config.balance not in ("least_conn", "rtt"):
+                raise KeyNotValidTypeException(f"balance has an invalid value! found {config.balance}, expected least_conn or rtt")
+            configs.append(config)
+        return configs
 
     def get_handler_config(self, instance: dict) -> (Type[KCPHandler], HandlerConfig):
         handler_type: str = self._get_key(instance, "handler")
-        if handler_type == "system":
-            return SystemHandler, HandlerConfig()
-        elif handler_type == "ssh":
-            conf: dict = self._get_key(instance, "config", dict)
-            ssh_user: str = self._get_key(conf, "ssh_user")
-            ssh_pass: str = self._get_key(conf, "ssh_pass")
-            ssh_host: str = self._get_key(conf, "ssh_host")
-            ssh_port: int = self._get_key(conf, "ssh_port", int)
-            return SSHHandler, SSHHandlerConfig(ssh_user, ssh_pass, ssh_host, ssh_port)
-        elif handler_type == "apex":
-            conf: dict = self._get_key(instance, "config", dict)
-            panel_user: str = self._get_key(conf, "panel_user")
-            panel_pass: str = self._get_key(conf, "panel_pass")
-            return ApexHandler, ApexHandlerConfig(panel_user, panel_pass)
-        else:
-            raise InvalidHandlerException(f"Unable to parse config for handler named: {handler_type}!")
+        kcp_handler: Type[KCPHandler] = self._registry.get_handler(handler_type)
+        return kcp_handler, kcp_handler.CONFIG_CLASS.from_dict(instance)
+
+    def get_failover_config(self, instance: dict) -> FailoverConfig:
+        failover: dict = self._get_optional_key(instance, "failover", dict, {})
+        default: FailoverConfig = FailoverConfig()
+        return FailoverConfig(
+            self._get_optional_key(failover, "interval", int, default.interval),
+            self._get_optional_key(failover, "margin", int, default.margin),
+            self._get_optional_key(failover, "rounds", int, default.rounds),
+            self._get_optional_key(failover, "samples", int, default.samples),
+            self._get_optional_key(failover, "timeout", int, default.timeout)
+        )
+
+    def get_upgrade_config(self, instance: dict) -> UpgradeConfig:
+        upgrade: dict = self._get_optional_key(instance, "upgrade", dict, {})
+        default: UpgradeConfig = UpgradeConfig()
+        return UpgradeConfig(
+            self._get_optional_key(upgrade, "enabled", bool, True),
+            self._get_optional_key(upgrade, "interval", int, default.interval),
+            self._get_optional_key(upgrade, "alt_listen", str, default.alt_listen),
+            self._get_optional_key(upgrade, "health_timeout", int, default.health_timeout),
+            self._get_optional_key(upgrade, "drain_timeout", int, default.drain_timeout)
+        )
+
+    def get_probe_config(self, instance: dict) -> ProbeConfig:
+        probe: dict = self._get_optional_key(instance, "probe", dict, {})
+        default: ProbeConfig = ProbeConfig()
+        config: ProbeConfig = ProbeConfig(
+            self._get_optional_key(probe, "interval", int, default.interval),
+            self._get_optional_key(probe, "samples", int, default.samples),
+            self._get_optional_key(probe, "burst", int, default.burst),
+            self._get_optional_key(probe, "max_rtt", int, default.max_rtt),
+            self._get_optional_key(probe, "min_goodput", int, default.min_goodput),
+            self._get_optional_key(probe, "failures", int, default.failures),
+            self._get_optional_key(probe, "grace", int, default.grace),
+            self._get_optional_key(probe, "timeout", int, default.timeout),
+            self._get_optional_key(probe, "peek_timeout", int, default.peek_timeout)
+        )
+        if config.interval <= 0 or config.samples <= 0 or config.failures <= 0 or config.timeout <= 0 or config.peek_timeout <= 0:
+            raise KCPConfigException("probe interval, samples, failures, timeout and peek_timeout must be positive numbers")
+        return config
+
+    def get_adapt_config(self, instance: dict) -> AdaptConfig:
+        adapt: dict = self._get_optional_key(instance, "adapt", dict, {})
+        profiles: list[AdaptProfile] = []
+        for profile in self._get_key(adapt, "profiles", list):
+            if not isinstance(profile, dict):
+                raise KeyNotValidTypeException(f"profiles has an invalid value! found {profile}, expected a mapping")
+            max_loss: Optional[int | float] = profile.get("max_loss")
+            if max_loss is not None and (isinstance(max_loss, bool) or not isinstance(max_loss, (int, float))):
+                raise KeyNotValidTypeException(f"max_loss has an invalid value! found {max_loss}, expected a number")
+            profiles.append(AdaptProfile(
+                self._get_key(profile, "name"),
+                self._get_optional_key(profile, "mode", str, "fast3"),
+                self._get_optional_key(profile, "datashard", int, None),
+                self._get_optional_key(profile, "parityshard", int, None),
+                float(max_loss) if max_loss is not None else None,
+                self._get_optional_key(profile, "max_rtt", int, None)
+            ))
+        if len(profiles) < 2:
+            raise KCPConfigException("adapt needs at least two profiles")
+        if any((profile.datashard or 0) < 0 or (profile.parityshard or 0) < 0 for profile in profiles):
+            raise KCPConfigException("adapt profile shards can not be negative")
+        if any(profile.max_loss is None and profile.max_rtt is None for profile in profiles[:-1]):
+            raise KCPConfigException("every adapt profile but the last needs max_loss or max_rtt")
+        default: AdaptConfig = AdaptConfig(profiles)
+        config: AdaptConfig = AdaptConfig(
+            profiles,
+            self._get_optional_key(adapt, "interval", int, default.interval),
+            self._get_optional_key(adapt, "rounds", int, default.rounds),
+            self._get_optional_key(adapt, "dwell", int, default.dwell),
+            self._get_optional_key(adapt, "max_switches", int, default.max_switches)
+        )
+        if config.interval <= 0 or config.rounds <= 0:
+            raise KCPConfigException("adapt interval and rounds must be positive numbers")
+        return config
+
+    def get_process_config(self, instance: dict) -> ProcessConfig:
+        process: dict = self._get_optional_key(instance, "process", dict, {})
+        affinity: Optional[list[int] | str] = process.get("affinity")
+        if affinity is not None and affinity != "auto" and not (isinstance(affinity, list) and all(isinstance(core, int) for core in affinity)):
+            raise KeyNotValidTypeException(f"affinity has an invalid value! found {affinity}, expected a list of cores or auto")
+        reserved: list[int] = self._get_optional_key(process, "reserved", list, [])
+        if not all(isinstance(core, int) for core in reserved):
+            raise KeyNotValidTypeException(f"reserved has an invalid value! found {reserved}, expected a list of cores")
+        ionice: dict = self._get_optional_key(process, "ionice", dict, {})
+        exec_mode: str = self._get_optional_key(process, "exec", str, "disk")
+        if exec_mode not in ("disk", "memory"):
+            raise KeyNotValidTypeException(f"exec has an invalid value! found {exec_mode}, expected disk or memory")
+        default: ProcessConfig = ProcessConfig()
+        sample_interval: int = self._get_optional_key(process, "sample_interval", int, default.sample_interval)
+        sample_history: int = self._get_optional_key(process, "sample_history", int, default.sample_history)
+        if sample_interval < 0 or sample_history <= 0:
+            raise KCPConfigException("sample_interval can not be negative and sample_history must be a positive number")
+        return ProcessConfig(
+            affinity,
+            reserved,
+            self._get_optional_key(process, "nice", int, None),
+            self._get_optional_key(ionice, "class", int, None),
+            self._get_optional_key(ionice, "level", int, None),
+            self._get_optional_key(process, "gomaxprocs", int, None),
+            self._get_optional_key(process, "gogc", int, None),
+            self._get_optional_key(process, "nofile", int, None),
+            exec_mode,
+            sample_interval,
+            sample_history
+        )
 
     def get_kcp_config(self, instance: dict, svc_type: str) -> KCPConfig:
         kcp_config: dict = self._get_key(instance, "kcp", dict)
         listen_addr: str = self._get_key(kcp_config, "listen")
         password: str = self._get_key(kcp_config, "password")
         target_addr: str = kcp_config.get("target")
-        remote_addr: str = kcp_config.get("remote")
+        remote_addr: str | list[str] = kcp_config.get("remote")
         if not target_addr and not remote_addr:
             raise KCPConfigException("Target or remote kcp config not found")
         if target_addr:
             remote_addr: str = target_addr
+        if isinstance(remote_addr, list) and (svc_type != "client" or not all(isinstance(r, str) and r for r in remote_addr)):
+            raise KCPConfigException("A list of remotes is only valid for clients and must contain addresses")
+        crypt: Optional[str] = self._get_optional_key(kcp_config, "crypt", str, None)
+        conn: Optional[int] = self._get_optional_key(kcp_config, "conn", int, None)
+        throughput_test: bool = self._get_optional_key(kcp_config, "throughput_test", bool, False)
         if svc_type == "client":
-            return KCPClientConfig(remote_addr, listen_addr, password)
+            config: KCPConfig = KCPClientConfig(remote_addr, listen_addr, password, crypt, conn, throughput_test)
+            if instance.get("failover") is not None:
+                config.failover = self.get_failover_config(instance)
         elif svc_type == "server":
-            return KCPServerConfig(remote_addr, listen_addr, password)
+            config: KCPConfig = KCPServerConfig(remote_addr, listen_addr, password, crypt, conn, throughput_test)
         else:
             raise KCPConfigException("invalid service type")
+        for key in ("bandwidth", "rtt", "sndwnd", "rcvwnd", "sockbuf"):
+            value: Optional[int] = self._get_optional_key(kcp_config, key, int, None)
+            if value is not None and value <= 0:
+                raise KCPConfigException(f"{key} must be a positive number")
+            setattr(config, key, value)
+        for key in ("datashard", "parityshard"):
+            # 0 turns forward error correction off
+            value: Optional[int] = self._get_optional_key(kcp_config, key, int, None)
+            if value is not None and value < 0:
+                raise KCPConfigException(f"{key} can not be negative")
+            setattr(config, key, value)
+        if instance.get("upgrade") is not None:
+            config.upgrade = self.get_upgrade_config(instance)
+        if instance.get("process") is not None:
+            config.process = self.get_process_config(instance)
+        if instance.get("probe") is not None:
+            config.probe = self.get_probe_config(instance)
+        if instance.get("adapt") is not None:
+            config.adapt = self.get_adapt_config(instance)
+        return config
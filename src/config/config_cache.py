@@ -0,0 +1,48 @@
+import json
+import os
+from typing import Optional, Final
+
+
+class ConfigCache:
+    """
+    Compiled form of an already validated config file, one json record per line after a header.
+    The header holds the sha256 of the config file, any change to the file makes the cache miss.
+    """
+    VERSION: Final[int] = 1
+
+    def __init__(self, path: str):
+        self._path: str = path
+
+    def get_path(self) -> str:
+        return self._path
+
+    def read(self, digest: str) -> Optional[tuple[dict, list[dict]]]:
+        """
+        @return: the settings sections and the handler records, None when the cache is missing, stale or truncated.
+        """
+        try:
+            with open(self._path) as f:
+                header: dict = json.loads(f.readline())
+                if not isinstance(header, dict) or header.get("version") != self.VERSION or header.get("digest") != digest:
+                    return None
+                records: list[dict] = [json.loads(line) for line in f]
+        except (OSError, ValueError):
+            return None
+        if len(records) != header.get("count"):
+            return None
+        return header.get("settings", {}), records
+
+    def write(self, digest: str, settings: dict, records: list[dict]):
+        directory: str = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path: str = f"{self._path}.tmp"
+        # handler entries hold passwords
+        fd: int = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps({"version": self.VERSION, "digest": digest, "count": len(records), "settings": settings}) + "\n")
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
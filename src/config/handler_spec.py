@@ -0,0 +1,46 @@
+import threading
+from typing import Optional, Callable
+
+from src.kcp.kcp import KCPHandler
+from src.service.mode import ServiceMode
+
+
+class HandlerSpec:
+    """
+    Validated config entry of a handler, the handler itself is only built the first time it is scheduled.
+    Fleets hold thousands of these, slots keep every record small.
+    """
+    __slots__ = ("name", "mode", "handler_type", "entry", "_factory", "_handler")
+    # one for every spec, handlers are built rarely and the executor and the fan-in proxy may ask at once
+    _build_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, name: str, mode: ServiceMode, handler_type: str, entry: Optional[dict], factory: Callable[["HandlerSpec"], KCPHandler]):
+        self.name: str = name
+        self.mode: ServiceMode = mode
+        self.handler_type: str = handler_type
+        self.entry: Optional[dict] = entry
+        self._factory: Callable[["HandlerSpec"], KCPHandler] = factory
+        self._handler: Optional[KCPHandler] = None
+
+    @classmethod
+    def of(cls, handler: KCPHandler) -> "HandlerSpec":
+        spec: HandlerSpec = cls(handler.get_name(), ServiceMode.CLIENT if handler.is_client() else ServiceMode.SERVER, handler.__class__.__name__, None, lambda s: handler)
+        spec._handler = handler
+        return spec
+
+    def is_built(self) -> bool:
+        return self._handler is not None
+
+    def get_handler(self) -> KCPHandler:
+        if self._handler is None:
+            with self._build_lock:
+                if self._handler is None:
+                    self._handler = self._factory(self)
+        return self._handler
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "mode": self.mode.value, "handler": self.handler_type, "entry": self.entry}
+
+    @classmethod
+    def from_dict(cls, data: dict, factory: Callable[["HandlerSpec"], KCPHandler]) -> "HandlerSpec":
+        return cls(data["name"], ServiceMode(data["mode"]), data["handler"], data["entry"], factory)
@@ -0,0 +1,32 @@
+from typing import Type, Any
+
+
+class KeyNotFoundException(Exception):
+    def __init__(self, msg: str):
+        super(KeyNotFoundException, self).__init__(msg)
+
+
+class KeyNotValidTypeException(Exception):
+    def __init__(self, msg: str):
+        super(KeyNotValidTypeException, self).__init__(msg)
+
+
+def get_key(instance: dict, key: str, type_: Type = str) -> Any:
+    k: Any = instance.get(key)
+    if not k:
+        raise KeyNotFoundException(f"{key} not found!")
+    if type_ == int and type(k) == str and k.isnumeric():
+        k = int(k)
+    key_type: Type = type(k)
+    if key_type != type_:
+        raise KeyNotValidTypeException(f"{key} has an invalid type! found {key_type}, expected {type_}")
+    return k
+
+
+def get_optional_key(instance: dict, key: str, type_: Type, default: Any) -> Any:
+    value: Any = instance.get(key)
+    if value is None:
+        return default
+    if type(value) == type_:
+        return value
+    return get_key(instance, key, type_)
@@ -0,0 +1,20 @@
+from typing import Optional
+
+from src.cluster.cluster_config import ClusterConfig
+from src.diagnostics.diagnostics_config import DiagnosticsConfig
+from src.fanin.fanin_config import FanInConfig
+from src.helpers.github_config import GithubConfig
+from src.logger.log_config import LogConfig
+from src.mirror.mirror_config import MirrorConfig
+from src.state.state_config import StateConfig
+
+
+class BotSettings:
+    def __init__(self, log_config: Optional[LogConfig] = None, mirror_config: Optional[MirrorConfig] = None, state_config: Optional[StateConfig] = None, github_config: Optional[GithubConfig] = None, cluster_config: Optional[ClusterConfig] = None, fanin_configs: Optional[list[FanInConfig]] = None, diagnostics_config: Optional[DiagnosticsConfig] = None):
+        self.log_config: LogConfig = log_config if log_config else LogConfig()
+        self.mirror_config: MirrorConfig = mirror_config if mirror_config else MirrorConfig()
+        self.state_config: StateConfig = state_config if state_config else StateConfig()
+        self.github_config: GithubConfig = github_config if github_config else GithubConfig()
+        self.cluster_config: ClusterConfig = cluster_config if cluster_config else ClusterConfig()
+        self.fanin_configs: list[FanInConfig] = fanin_configs if fanin_configs else []
+        self.diagnostics_config: DiagnosticsConfig = diagnostics_config if diagnostics_config else DiagnosticsConfig()
@@ -0,0 +1,334 @@
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+from collections import Counter
+from typing import Optional, Final
+
+from src.decorators.background import background
+from src.diagnostics.diagnostics_config import DiagnosticsConfig
+from src.logger.bot_logger import BotLogger
+
+
+class DiagnosticsException(Exception):
+    def __init__(self, msg: str):
+        super(DiagnosticsException, self).__init__(msg)
+
+
+def dump_stacks() -> str:
+    """
+    @return: the current stack of every thread, under the name given by @background.
+    """
+    frames: dict = sys._current_frames()
+    blocks: list[str] = []
+    for thread in sorted(threading.enumerate(), key=lambda t: t.name):
+        frame = frames.get(thread.ident)
+        if frame is None:
+            continue
+        blocks.append(f"Thread {thread.name} (ident={thread.ident}, daemon={thread.daemon}):\n{''.join(traceback.format_stack(frame))}")
+    return "\n".join(blocks)
+
+
+def get_thread_cpu(proc: str = "/proc") -> dict[str, float]:
+    """
+    @return: cpu seconds used so far per thread name, empty without a /proc.
+    """
+    ticks: float = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100.0
+    times: dict[str, float] = {}
+    for thread in threading.enumerate():
+        try:
+            with open(f"{proc}/self/task/{thread.native_id}/stat") as f:
+                # the thread name is between parentheses and may hold spaces
+                fields: list[str] = f.read().rpartition(")")[2].split()
+        except (OSError, AttributeError):
+            # the thread exited meanwhile
+            continue
+        times[thread.name] = times.get(thread.name, 0.0) + (int(fields[11]) + int(fields[12])) / ticks
+    return times
+
+
+class SamplingProfiler:
+    """
+    Looks at the stack of every thread at a fixed interval, nothing is traced so the tunnels keep their pace.
+    Stacks are counted per thread name in the collapsed format flame graph tools read.
+    """
+    MAX_DEPTH: Final[int] = 64
+
+    def __init__(self, interval: float):
+        """
+        @param interval: seconds between two samples.
+        """
+        self._interval: float = interval
+        self._stacks: Counter = Counter()
+        self._leaves: Counter = Counter()
+        self._cpu: dict[str, float] = {}
+        self._samples: int = 0
+        self._duration: float = 0.0
+
+    @classmethod
+    def _describe(cls, frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def sample(self, skip: Optional[int] = None):
+        """
+        @param skip: thread ident left out, the one running the profiler.
+        """
+        names: dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            stack: list[str] = []
+            while frame is not None and len(stack) < self.MAX_DEPTH:
+                stack.append(self._describe(frame))
+                frame = frame.f_back
+            name: str = names.get(ident, str(ident))
+            self._stacks[";".join([name] + stack[::-1])] += 1
+            self._leaves[f"{name}: {stack[0]}"] += 1
+        self._samples += 1
+
+    def run(self, seconds: float):
+        me: int = threading.get_ident()
+        before: dict[str, float] = get_thread_cpu()
+        started: float = time.monotonic()
+        while time.monotonic() - started < seconds:
+            self.sample(me)
+            time.sleep(self._interval)
+        self._duration = time.monotonic() - started
+        # threads that started during the profile count from zero
+        self._cpu = {name: spent - before.get(name, 0.0) for name, spent in get_thread_cpu().items() if name != threading.current_thread().name}
+
+    def get_samples(self) -> int:
+        return self._samples
+
+    def get_collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def get_report(self, top: int) -> str:
+        lines: list[str] = [f"{self._samples} samples in {self._duration:.1f} seconds"]
+        if self._cpu:
+            lines.append("cpu seconds per thread:")
+            lines += [f"  {spent:8.3f} {name}" for name, spent in sorted(self._cpu.items(), key=lambda item: -item[1])[:top]]
+        lines.append("innermost frames (waits included):")
+        lines += [f"  {count * 100 / max(self._samples, 1):6.1f}% {leaf}" for leaf, count in self._leaves.most_common(top)]
+        return "\n".join(lines)
+
+
+class MemoryTracer:
+    """
+    tracemalloc snapshots, every diff compares with the previous snapshot so growth shows up per interval.
+    """
+    FRAMES: Final[int] = 10
+
+    def __init__(self):
+        self._lock: threading.Lock = threading.Lock()
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def is_tracing(self) -> bool:
+        return self._snapshot is not None and tracemalloc.is_tracing()
+
+    @classmethod
+    def _take(cls) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>")
+        ))
+
+    def start(self) -> str:
+        with self._lock:
+            if self.is_tracing():
+                raise DiagnosticsException("memory tracing is already started")
+            tracemalloc.start(self.FRAMES)
+            self._snapshot = self._take()
+            return "memory tracing started, the next diff compares with this point"
+
+    def diff(self, top: int) -> str:
+        with self._lock:
+            if not self.is_tracing():
+                raise DiagnosticsException("memory tracing is not started")
+            snapshot: tracemalloc.Snapshot = self._take()
+            stats: list[tracemalloc.StatisticDiff] = snapshot.compare_to(self._snapshot, "lineno")
+            self._snapshot = snapshot
+            current, peak = tracemalloc.get_traced_memory()
+            growth: int = sum(stat.size_diff for stat in stats)
+            lines: list[str] = [f"traced {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB, {growth / 1024:+.1f} KiB since the previous snapshot"]
+            lines += [str(stat) for stat in stats[:top]]
+            return "\n".join(lines)
+
+    def stop(self):
+        with self._lock:
+            if not self.is_tracing():
+                raise DiagnosticsException("memory tracing is not started")
+            self._snapshot = None
+            tracemalloc.stop()
+
+
+class Diagnostics:
+    """
+    Looks inside a running bot without a restart: thread stacks, a time boxed sampling profile and tracemalloc diffs.
+    SIGUSR1 dumps the stacks and profiles, SIGUSR2 starts or diffs the memory tracing, the control socket takes any command.
+    Every report goes to a file in the diagnostics dir, the handlers keep running meanwhile.
+    """
+    USAGE: Final[str] = "stacks, profile [seconds], trace start, trace diff or trace stop"
+    MAX_PROFILE: Final[float] = 300.0
+    READ_TIMEOUT: Final[float] = 5.0
+    MAX_COMMAND: Final[int] = 1024
+
+    def __init__(self, bot_logger: BotLogger, config: DiagnosticsConfig):
+        self._bot_logger: BotLogger = bot_logger
+        self._config: DiagnosticsConfig = config
+        self._memory: MemoryTracer = MemoryTracer()
+        self._profile_lock: threading.Lock = threading.Lock()
+        self._server: Optional[socket.socket] = None
+
+    def start(self):
+        if self._config.signals:
+            self.install_signals()
+        if self._config.control_socket:
+            try:
+                self.open_control_socket()
+            except (DiagnosticsException, OSError) as e:
+                self._bot_logger.warning(f"Diagnostics control socket disabled: {e}")
+
+    def install_signals(self):
+        """
+        Has to be called from the main thread.
+        """
+        if not hasattr(signal, "SIGUSR1"):
+            self._bot_logger.warning("Diagnostics signals are not available on this platform")
+            return
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self._on_signal("stacks", "profile"))
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self._on_signal("trace diff" if self._memory.is_tracing() else "trace start"))
+
+    @background("DIAGNOSTICS")
+    def _on_signal(self, *commands: str):
+        # the signal handler only starts this thread, the main thread goes back to its work right away
+        for command in commands:
+            self._bot_logger.info(self.execute(command))
+
+    def execute(self, command: str) -> str:
+        """
+        @return: what was done and where the report was written, or why it failed.
+        """
+        words: list[str] = command.split()
+        try:
+            if words == ["stacks"]:
+                return f"thread stacks written to {self._write('stacks', dump_stacks())}"
+            if words[:1] == ["profile"] and len(words) <= 2:
+                return self.profile(float(words[1]) if len(words) == 2 else self._config.profile_seconds)
+            if words == ["trace", "start"]:
+                return self._memory.start()
+            if words == ["trace", "diff"]:
+                return f"memory diff written to {self._write('memory', self._memory.diff(self._config.top))}"
+            if words == ["trace", "stop"]:
+                self._memory.stop()
+                return "memory tracing stopped"
+        except (DiagnosticsException, OSError, ValueError) as e:
+            return f"{command} failed: {e}"
+        return f"unknown command {command!r}, expected {self.USAGE}"
+
+    def profile(self, seconds: float) -> str:
+        if not 0 < seconds <= self.MAX_PROFILE:
+            raise DiagnosticsException(f"a profile lasts between 0 and {self.MAX_PROFILE:.0f} seconds")
+        if not self._profile_lock.acquire(blocking=False):
+            raise DiagnosticsException("a profile is already running")
+        try:
+            self._bot_logger.info(f"Profiling every thread for {seconds:.0f} seconds")
+            profiler: SamplingProfiler = SamplingProfiler(self._config.profile_interval / 1000)
+            profiler.run(seconds)
+        finally:
+            self._profile_lock.release()
+        collapsed: str = self._write("profile", profiler.get_collapsed(), "folded")
+        report: str = self._write("profile", profiler.get_report(self._config.top))
+        return f"profile of {profiler.get_samples()} samples written to {report}, collapsed stacks in {collapsed}"
+
+    def _write(self, kind: str, text: str, extension: str = "txt") -> str:
+        os.makedirs(self._config.diag_dir, exist_ok=True)
+        now: float = time.time()
+        path: str = os.path.join(self._config.diag_dir, f"{kind}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}.{extension}")
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def open_control_socket(self):
+        if not hasattr(socket, "AF_UNIX"):
+            raise DiagnosticsException("unix sockets are not available on this platform")
+        path: str = self._config.control_socket
+        if os.path.exists(path):
+            try:
+                self.send(path, "", 1.0)
+            except OSError:
+                # left behind by a bot that did not exit cleanly
+                os.remove(path)
+            else:
+                raise DiagnosticsException(f"{path} is used by another running bot")
+        server: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(path)
+            # the socket can profile and dump the process, only the bot user may connect
+            os.chmod(path, 0o600)
+            server.listen(8)
+        except OSError:
+            server.close()
+            raise
+        self._server = server
+        self._accept_loop(server)
+        self._bot_logger.info(f"Diagnostics listening on {path}")
+
+    def close(self):
+        if self._server:
+            self._server.close()
+            self._server = None
+            if os.path.exists(self._config.control_socket):
+                os.remove(self._config.control_socket)
+
+    @background("DIAGNOSTICS")
+    def _accept_loop(self, server: socket.socket):
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), name="DIAGNOSTICS_CONN", daemon=True).start()
+
+    def _handle(self, conn: socket.socket):
+        with conn:
+            conn.settimeout(self.READ_TIMEOUT)
+            data: bytes = b""
+            try:
+                while b"\n" not in data and len(data) < self.MAX_COMMAND:
+                    chunk: bytes = conn.recv(self.MAX_COMMAND)
+                    if not chunk:
+                        break
+                    data += chunk
+            except OSError:
+                return
+            command: str = data.split(b"\n")[0].decode(errors="replace").strip()
+            if not command:
+                return
+            reply: str = self.execute(command)
+            try:
+                conn.sendall(reply.encode() + b"\n")
+            except OSError:
+                pass
+
+    @classmethod
+    def send(cls, path: str, command: str, timeout: float) -> str:
+        """
+        Runs a command on the bot listening on path.
+        @return: the reply of the bot.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(path)
+            client.sendall(command.encode() + b"\n")
+            client.shutdown(socket.SHUT_WR)
+            chunks: list[bytes] = []
+            while chunk := client.recv(4096):
+                chunks.append(chunk)
+        return b"".join(chunks).decode(errors="replace").strip()
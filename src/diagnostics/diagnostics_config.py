@@ -0,0 +1,12 @@
+class DiagnosticsConfig:
+    def __init__(self, signals: bool = True, control_socket: str = "diag.sock", diag_dir: str = "logs/diagnostics", profile_seconds: int = 10, profile_interval: int = 10, top: int = 25):
+        # SIGUSR1 dumps the thread stacks and profiles, SIGUSR2 starts or diffs the memory tracing
+        self.signals: bool = signals
+        # unix socket for "python main.py diag", empty to disable it
+        self.control_socket: str = control_socket
+        self.diag_dir: str = diag_dir
+        self.profile_seconds: int = profile_seconds
+        # ms between two samples of every thread
+        self.profile_interval: int = profile_interval
+        # lines kept in the profile and memory reports
+        self.top: int = top
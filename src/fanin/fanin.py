@@ -0,0 +1,163 @@
+import socket
+import threading
+import time
+from typing import Optional, Callable, Final
+
+from src.decorators.background import background
+from src.fanin.fanin_config import FanInConfig
+from src.helpers.network import parse_address
+from src.helpers.relay import relay
+from src.logger.bot_logger import BotLogger
+
+
+class FanInBackend:
+    # weight of the newest connect time in the rtt average
+    ALPHA: Final[float] = 0.3
+
+    def __init__(self, name: str, get_address: Callable[[], str], get_rtt: Optional[Callable[[], Optional[float]]] = None):
+        """
+        @param get_address: where the kcptun client of the backend listens, asked on every connection.
+        @param get_rtt: ms through the tunnel when the handler probes it, the connect times are used otherwise.
+        """
+        self.name: str = name
+        self._get_address: Callable[[], str] = get_address
+        self._get_rtt: Optional[Callable[[], Optional[float]]] = get_rtt
+        self.active: int = 0
+        self.total: int = 0
+        self.failures: int = 0
+        self.sent: int = 0
+        self.received: int = 0
+        self.down_until: float = 0.0
+        self.connect_rtt: Optional[float] = None
+
+    def get_address(self) -> str:
+        return self._get_address()
+
+    def get_rtt(self) -> Optional[float]:
+        rtt: Optional[float] = self._get_rtt() if self._get_rtt else None
+        return rtt if rtt is not None else self.connect_rtt
+
+    def add_connect_time(self, rtt: float):
+        self.connect_rtt = rtt if self.connect_rtt is None else self.ALPHA * rtt + (1 - self.ALPHA) * self.connect_rtt
+
+    def __repr__(self):
+        rtt: Optional[float] = self.get_rtt()
+        return f"FanInBackend[{self.name}: active={self.active}, total={self.total}, failures={self.failures}, rtt={'-' if rtt is None else f'{rtt:.1f}ms'}]"
+
+
+class FanInBalancer:
+    POLICIES: Final[tuple[str, ...]] = ("least_conn", "rtt")
+
+    def __init__(self, backends: list[FanInBackend], policy: str = "least_conn"):
+        self._backends: list[FanInBackend] = backends
+        self._policy: str = policy
+        self._lock: threading.Lock = threading.Lock()
+
+    def get_backends(self) -> list[FanInBackend]:
+        return list(self._backends)
+
+    def pick(self, exclude: tuple[FanInBackend, ...] = (), now: Optional[float] = None) -> Optional[FanInBackend]:
+        """
+        Counts the connection on the picked backend, done or failed has to follow.
+        @return: None when every backend is down or excluded.
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            candidates: list[FanInBackend] = [backend for backend in self._backends if backend not in exclude and backend.down_until <= now]
+            if not candidates:
+                return None
+            if self._policy == "rtt":
+                # backends without a rtt yet go first, they need a connection to get one
+                picked: FanInBackend = min(candidates, key=lambda backend: (backend.get_rtt() or 0.0, backend.active))
+            else:
+                picked: FanInBackend = min(candidates, key=lambda backend: (backend.active, backend.get_rtt() or 0.0))
+            picked.active += 1
+            picked.total += 1
+            return picked
+
+    def done(self, backend: FanInBackend, sent: int = 0, received: int = 0):
+        with self._lock:
+            backend.active -= 1
+            backend.sent += sent
+            backend.received += received
+
+    def failed(self, backend: FanInBackend, cooldown: float, now: Optional[float] = None):
+        with self._lock:
+            backend.active -= 1
+            backend.total -= 1
+            backend.failures += 1
+            backend.down_until = (now if now is not None else time.monotonic()) + cooldown
+
+
+class FanInProxy:
+    """
+    One local port in front of several kcptun clients, every accepted connection goes to one of them.
+    """
+    def __init__(self, bot_logger: BotLogger, config: FanInConfig, backends: list[FanInBackend]):
+        self._bot_logger: BotLogger = bot_logger
+        self._config: FanInConfig = config
+        self._balancer: FanInBalancer = FanInBalancer(backends, config.balance)
+        host, port = parse_address(config.listen)
+        self._server: socket.socket = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen(512)
+        self._thread: Optional[threading.Thread] = None
+
+    def get_address(self) -> str:
+        host, port = self._server.getsockname()[:2]
+        return f"{host}:{port}"
+
+    def get_balancer(self) -> FanInBalancer:
+        return self._balancer
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._bot_logger.info(f"Fan-in proxy on {self.get_address()} over {', '.join(backend.name for backend in self._balancer.get_backends())}")
+        self._thread = self._accept_loop()
+
+    def close(self):
+        self._server.close()
+
+    @background("FANIN")
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client,), name="FANIN_CONN", daemon=True).start()
+
+    def _connect(self) -> (Optional[FanInBackend], Optional[socket.socket]):
+        tried: tuple[FanInBackend, ...] = ()
+        while backend := self._balancer.pick(tried):
+            tried += (backend,)
+            started: float = time.perf_counter()
+            try:
+                host, port = parse_address(backend.get_address())
+                upstream: socket.socket = socket.create_connection((host or "127.0.0.1", port), timeout=self._config.connect_timeout)
+            except (OSError, ValueError) as e:
+                self._balancer.failed(backend, self._config.cooldown)
+                self._bot_logger.warning(f"Fan-in backend {backend.name} failed, skipping it for {self._config.cooldown} seconds: {e}")
+                continue
+            backend.add_connect_time((time.perf_counter() - started) * 1000)
+            # splice needs blocking sockets
+            upstream.settimeout(None)
+            upstream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return backend, upstream
+        return None, None
+
+    def _handle(self, client: socket.socket):
+        with client:
+            backend, upstream = self._connect()
+            if not backend:
+                self._bot_logger.error(f"Fan-in proxy on {self.get_address()} has no backend up")
+                return
+            sent, received = 0, 0
+            try:
+                with upstream:
+                    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    sent, received = relay(client, upstream)
+            finally:
+                self._balancer.done(backend, sent, received)
@@ -0,0 +1,13 @@
+from typing import Optional
+
+
+class FanInConfig:
+    def __init__(self, listen: str, clients: Optional[list[str]] = None, balance: str = "least_conn", connect_timeout: int = 5, cooldown: int = 10):
+        self.listen: str = listen
+        # names of the client entries behind the front, every client when unset
+        self.clients: Optional[list[str]] = clients
+        # "least_conn" or "rtt"
+        self.balance: str = balance
+        self.connect_timeout: int = connect_timeout
+        # seconds a backend that refused a connection is skipped
+        self.cooldown: int = cooldown
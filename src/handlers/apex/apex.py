@@ -1,24 +1,35 @@
+import ftplib
+import hashlib
 import json
 import os
 import re
 import shutil
 import socket
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from re import Match
-from typing import Final, Optional, AnyStr
+from typing import Final, Optional, AnyStr, Type, Pattern
 
 import requests
 from bs4 import BeautifulSoup, Tag, ResultSet
 from requests import Response
-from requests.cookies import RequestsCookieJar
+from requests.cookies import RequestsCookieJar, cookiejar_from_dict
+from requests.utils import dict_from_cookiejar
 
-from src.constant import KCP_JAR_URL
+from src.config.settings import BotSettings
 from src.handlers.apex.apex_config import ApexHandlerConfig
+from src.handlers.apex.apex_server import ApexServer
+from src.handlers.apex.governor import RequestGovernor
 from src.handlers.handler_config import HandlerConfig
-from src.helpers.ftp import FTPProcessor, FTPFile
+from src.helpers.artifacts import ArtifactProvider, CachedArtifactProvider, get_artifact_provider
+from src.helpers.ftp import FTPProcessor, FTPFile, FTPLogTail
+from src.helpers.github import Artifact
+from src.kcp.exit_cause import ExitClassifier, ExitCause
 from src.kcp.kcp import KCPHandler, GithubDownloadException, HandlerConfigNotValid
 from src.kcp.kcp_config import KCPConfig
 from src.logger.bot_logger import BotLogger
+from src.logger.tracer import Span
 from src.service.mode import ServiceMode
 
 
@@ -62,12 +73,25 @@ class ApexTimeoutException(Exception):
         super(ApexTimeoutException, self).__init__(msg)
 
 
+class ApexStartException(Exception):
+    def __init__(self, msg: str):
+        super(ApexStartException, self).__init__(msg)
+
+
 class ApexHandler(KCPHandler):
-    def __init__(self, bot_logger: BotLogger, svc_mode: ServiceMode, kcp_config: KCPConfig, handler_config: HandlerConfig):
+    CONFIG_CLASS: Type[HandlerConfig] = ApexHandlerConfig
+    # kcptun appends its log here, relative to the server root, and it is tailed over ftp after every restart
+    KCP_LOG: Final[str] = "data/kcp.log"
+    LOG_POLL: Final[float] = 2.0
+    PROBE_INTERVAL: Final[float] = 20.0
+    READY_TIMEOUT: Final[float] = 200.0
+    READY_PATTERN: Final[Pattern[str]] = re.compile(r"listening on:", re.I)
+
+    def __init__(self, bot_logger: BotLogger, svc_mode: ServiceMode, kcp_config: KCPConfig, handler_config: HandlerConfig, settings: Optional[BotSettings] = None, name: Optional[str] = None):
         if not isinstance(handler_config, ApexHandlerConfig):
             raise HandlerConfigNotValid("Invalid handler config object for SSH handler")
 
-        super(ApexHandler, self).__init__(bot_logger, svc_mode, kcp_config, handler_config)
+        super(ApexHandler, self).__init__(bot_logger, svc_mode, kcp_config, handler_config, settings, name)
         self._RESOURCES_DIR: Final[str] = self.get_unique_name()
         self._JAR_NAME: Final[str] = "apex_java"
         self._JAVA_VERSION: Final[str] = "8"
@@ -80,7 +104,7 @@ class ApexHandler(KCPHandler):
         self._panel_pass: str = self.__handler_config.panel_pass
         self._url: str = "https://panel.apexminecrafthosting.com"
         self._login_url: str = f"{self._url}/site/login"
-        self._server_id: Optional[str] = ""
+        self._artifacts: ArtifactProvider = get_artifact_provider(bot_logger, self._settings)
 
         if self.is_server():
             raise ServerModeNotValidException(f"Apex hosting can't be used as a server yet!")
@@ -102,15 +126,21 @@ class ApexHandler(KCPHandler):
         self._cookies: Optional[RequestsCookieJar] = None
         self._csrf_token: Optional[str] = None
 
-        self._server_ip: Optional[str] = ""
-        self._server_port: Optional[str] = ""
+        self._servers: list[ApexServer] = []
+        self._stop_event: threading.Event = threading.Event()
+        self._governor: RequestGovernor = RequestGovernor.for_url(self._url)
+
+    def _request(self, method: str, url: str, **kwargs) -> Response:
+        self._governor.acquire()
+        r: Response = requests.request(method, url, timeout=60, **kwargs)
+        self._governor.report(r)
+        return r
 
     def _login(self) -> Response:
         self._bot_logger.info("Logging in apex...")
-        r: Response = requests.get(self._login_url, headers=self._default_headers)
+        r: Response = self._request("GET", self._login_url, headers=self._default_headers)
         if r.status_code == 429:
-            self._bot_logger.error("Thats a cloudflare timeout... waiting 40 seconds!")
-            time.sleep(40)
+            self._bot_logger.error(f"Thats a cloudflare timeout... every apex handler waits {self._governor.get_backoff():.0f} seconds!")
             raise CloudflareException("requests status code 429!")
         soup: BeautifulSoup = BeautifulSoup(r.text, "html.parser")
         token_input: Tag = soup.find("input", attrs={"type": "hidden", "name": "YII_CSRF_TOKEN"})
@@ -131,9 +161,9 @@ class ApexHandler(KCPHandler):
         self._default_headers.update({"Content-Type": "application/x-www-form-urlencoded"})
         self._default_headers.update({"Origin": "null"})
         self._bot_logger.info("Log in attempt")
-        cookie_capture: Response = requests.post(self._login_url, headers=self._default_headers, data=login_data, cookies=self._cookies, allow_redirects=False)
+        cookie_capture: Response = self._request("POST", self._login_url, headers=self._default_headers, data=login_data, cookies=self._cookies, allow_redirects=False)
         self._cookies.update(cookie_capture.cookies.copy())
-        log: Response = requests.post(self._login_url, headers=self._default_headers, data=login_data, cookies=self._cookies)
+        log: Response = self._request("POST", self._login_url, headers=self._default_headers, data=login_data, cookies=self._cookies)
         self._default_headers.pop("Content-Type")
         self._default_headers.pop("Origin")
         self._cookies.update(log.cookies.copy())
@@ -141,6 +171,10 @@ class ApexHandler(KCPHandler):
         return log
 
     def _resolve_challenge(self, login_panel):
+        with self._span("challenge"):
+            self.__resolve_challenge(login_panel)
+
+    def __resolve_challenge(self, login_panel):
         self._bot_logger.info("Bypassing cloudflare antibot challenge...")
         s: BeautifulSoup = BeautifulSoup(login_panel.text, "html.parser")
         challenge_id: str = ""
@@ -150,20 +184,22 @@ class ApexHandler(KCPHandler):
                 continue
             challenge_id: str = challenge_id_find.group(1)
         if not challenge_id:
+            self._governor.penalize()
             raise CloudflareChallengeException("Challenge ID not found!")
         challenge: str = f"{self._url}/cdn-cgi/challenge-platform/h/b/cv/result/{challenge_id}"
-        r: Response = requests.post(challenge, headers=self._default_headers, cookies=self._cookies)
+        r: Response = self._request("POST", challenge, headers=self._default_headers, cookies=self._cookies)
         if r.status_code != 200:
+            self._governor.penalize()
             raise CloudflareChallengeException("Unable to retrieve cookies from challenge!")
         self._cookies.update(r.cookies.copy())
         self._bot_logger.info("Done!")
 
     @classmethod
-    def _get_server_url(cls, login_response: Response) -> str:
-        uri: Optional[Match[AnyStr]] = re.search(r"/server/\d+", login_response.text)
-        if not uri:
+    def _get_server_ids(cls, login_response: Response) -> list[str]:
+        server_ids: list[str] = list(dict.fromkeys(re.findall(r"/server/(\d+)", login_response.text)))
+        if not server_ids:
             raise ServerUrlNotFoundException("Unable to find a valid server url!")
-        return uri.group(0)
+        return server_ids
 
     @classmethod
     def _get_redirect_url(cls, login_response: Response) -> str:
@@ -172,8 +208,8 @@ class ApexHandler(KCPHandler):
             raise ServerUrlNotFoundException("Unable to find a valid server url!")
         return uri.group(0)
 
-    def _get_ftp_creds(self) -> (str, str, str):
-        r: Response = requests.get(f"{self._url}/ftpClient/login/{self._server_id}", headers=self._default_headers, cookies=self._cookies)
+    def _get_ftp_creds(self, server_id: str) -> (str, str, str):
+        r: Response = self._request("GET", f"{self._url}/ftpClient/login/{server_id}", headers=self._default_headers, cookies=self._cookies)
         s: BeautifulSoup = BeautifulSoup(r.text, "html.parser")
         table: Tag = s.find("table", attrs={"class": "detail-view"})
         rows: ResultSet[Tag] = table.find_all("tr")
@@ -193,7 +229,7 @@ class ApexHandler(KCPHandler):
                 ftp_port: str = row.find_all("td")[0].text
             if "ftp username" in header_name:
                 ftp_user: str = row.find_all("td")[0].text
-        self._bot_logger.info("Server FTP creds retrieved")
+        self._bot_logger.info(f"Server {server_id} FTP creds retrieved")
         return ftp_host, ftp_port, ftp_user
 
     def _get_server_data(self, login_response: Response) -> (str, str):
@@ -207,7 +243,7 @@ class ApexHandler(KCPHandler):
         return server_ip, server_port
 
     def _do_redirect(self, url: str):
-        r: Response = requests.get(url, headers=self._default_headers, cookies=self._cookies)
+        r: Response = self._request("GET", url, headers=self._default_headers, cookies=self._cookies)
         self._cookies.update(r.cookies)
 
     def _save_changes(self, login_response, jar_name: str) -> dict[str, str]:
@@ -238,9 +274,24 @@ class ApexHandler(KCPHandler):
         }
         return apply_jar
 
-    def _ftp_upload(self, ftp_host: str, ftp_port: str, ftp_user: str):
-        self._bot_logger.info("Logging in the FTP server")
-        with FTPProcessor(ftp_host, ftp_port, ftp_user, self._panel_pass) as ftp:
+    def _get_kcp_json(self) -> dict[str, str]:
+        kcp_json: dict[str, str] = {
+            "remoteaddr": self._kcp_config.remote,
+            "localaddr": self._kcp_config.listen,
+            "mode": self._kcp_config.mode,
+            "crypt": self._kcp_config.crypt,
+            "conn": self._kcp_config.conn,
+            "key": self._kcp_config.key,
+            "log": self.KCP_LOG
+        }
+        for key in ("sndwnd", "rcvwnd", "sockbuf", "datashard", "parityshard"):
+            if getattr(self._kcp_config, key) is not None:
+                kcp_json[key] = getattr(self._kcp_config, key)
+        return kcp_json
+
+    def _ftp_upload(self, server: ApexServer):
+        self._bot_logger.info(f"Logging in the FTP server of {server.server_id}")
+        with FTPProcessor(server.ftp_host, server.ftp_port, server.ftp_user, self._panel_pass) as ftp:
             root_files: list[FTPFile] = ftp.list_files()
             jar_dir_found: bool = False
             data_dir_found: bool = False
@@ -284,108 +335,293 @@ class ApexHandler(KCPHandler):
                 self._bot_logger.info(f"old jar/{self._JAR_NAME}-{self._JAVA_VERSION}.jar found! reloading file...")
                 ftp.delete_file(f"jar/{self._JAR_NAME}-{self._JAVA_VERSION}.jar")
 
-            config: dict[str, str] = {
-                "remoteaddr": self._kcp_config.remote,
-                "localaddr": self._kcp_config.listen,
-                "mode": self._kcp_config.mode,
-                "crypt": self._kcp_config.crypt,
-                "key": self._kcp_config.key
-            }
-            with open(f"{self._RESOURCES_DIR}/config.json", "w") as f:
-                f.write(json.dumps(config, indent=2))
-
-            self._bot_logger.info(f"Uploading jar/{self._JAR_NAME}-{self._JAVA_VERSION}.jar...")
+            # uploads run in parallel, every server gets its own local copy of the config
+            config_path: str = f"{self._RESOURCES_DIR}/config-{server.server_id}.json"
+            with open(config_path, "w") as f:
+                f.write(json.dumps(self._get_kcp_json(), indent=2))
+
+            self._bot_logger.info(f"Uploading jar/{self._JAR_NAME}-{self._JAVA_VERSION}.jar to {server.server_id}...")
             ftp.upload_file(
                 f"{self._RESOURCES_DIR}/{self._JAR_NAME}-{self._JAVA_VERSION}.jar",
                 f"{self._JAR_NAME}-{self._JAVA_VERSION}.jar",
                 "jar"
             )
-            self._bot_logger.info(f"Uploading data/config/config.json...")
-            ftp.upload_file(f"{self._RESOURCES_DIR}/config.json", "config.json", "data/config")
-            os.remove(f"{self._RESOURCES_DIR}/config.json")
-        os.remove(f"{self._RESOURCES_DIR}/{self._JAR_NAME}-{self._JAVA_VERSION}.jar")
-
-    def download_bin(self):
-        dashboard: Response = self._login()
-        server_url: str = f"{self._url}{self._get_server_url(dashboard)}"
+            self._bot_logger.info(f"Uploading data/config/config.json to {server.server_id}...")
+            ftp.upload_file(config_path, "config.json", "data/config")
+            os.remove(config_path)
+
+    def _load_server(self, server: ApexServer, page: Optional[Response] = None):
+        """
+        Scrapes the address and the FTP credentials of a server.
+        @param page: the server page when it is already loaded.
+        """
+        self._default_headers.update({"Referer": f"{self._url}/server/{server.server_id}"})
+        if page is None:
+            page = self._request("GET", f"{self._url}/server/{server.server_id}", headers=self._default_headers, cookies=self._cookies)
+            self._cookies.update(page.cookies.copy())
+        server.page = page
+        server.ip, server.port = self._get_server_data(page)
+        server.ftp_host, server.ftp_port, server.ftp_user = self._get_ftp_creds(server.server_id)
+
+    def _open_dashboard(self):
+        # logins are queued, concurrent ones from the same ip are what trips the anti bot checks
+        with self._governor.login_slot(), self._span("login"):
+            dashboard: Response = self._login()
+        server_ids: list[str] = self._get_server_ids(dashboard)
         redirect_server_url: str = f"{self._url}{self._get_redirect_url(dashboard)}"
-        self._do_redirect(redirect_server_url)
+        with self._span("redirect"):
+            self._do_redirect(redirect_server_url)
         self._resolve_challenge(dashboard)
-        self._server_id: str = server_url.split("/")[-1]
-        self._default_headers.update({"Referer": f"{self._url}/server/{self._server_id}"})
-        server_ip, server_port = self._get_server_data(dashboard)
-        ftp_host, ftp_port, ftp_user = self._get_ftp_creds()
-        self._server_ip: str = server_ip
-        self._server_port: str = server_port
-        self._bot_logger.info(f"Downloading a valid jar with GO KCP binary for java {self._JAVA_VERSION}")
+        selected: list[str] = self.__handler_config.select_servers(server_ids)
+        if not selected:
+            raise ServerUrlNotFoundException(f"None of the configured servers {self.__handler_config.servers} found, account servers: {', '.join(server_ids)}")
+        self._bot_logger.info(f"Found {len(server_ids)} apex servers, running on {', '.join(selected)}")
+        self._servers = [ApexServer(server_id) for server_id in selected]
+        with self._span("scrape"):
+            for server in self._servers:
+                # the dashboard already is the page of the first server
+                self._load_server(server, dashboard if server.server_id == server_ids[0] else None)
+
+    def _restore_session(self) -> bool:
+        """
+        Reuses the panel session of a previous run, skipping the login, the challenge and the scraping.
+        @return: False when there is no session or it expired.
+        """
+        session: Optional[dict] = self._state.get("session")
+        if not session:
+            return False
+        servers: list[ApexServer] = [ApexServer.from_dict(server) for server in session.get("servers", [])]
+        if not servers or session.get("selection") != self.__handler_config.servers:
+            self._state.remove("session")
+            return False
+        self._bot_logger.info("Reusing the previous apex session...")
+        self._cookies = cookiejar_from_dict(session.get("cookies", {}))
+        self._default_headers.update({"Sec-Fetch-Site": "same-origin", "Referer": f"{self._url}/server/{servers[0].server_id}"})
         try:
-            r = requests.get(KCP_JAR_URL)
+            r: Response = self._request("GET", f"{self._url}/server/{servers[0].server_id}", headers=self._default_headers, cookies=self._cookies)
         except Exception as e:
-            self._bot_logger.error(f"Unable to get valid KCP assets {e}")
-            raise GithubDownloadException(f"Unable to get valid KCP assets {e}")
-        if r.status_code != 200:
-            raise GithubDownloadException(f"Unable to get a valid release, got status code {r.status_code}!")
-        download_url: str = ""
-        for release in r.json():
-            if release.get("name") == f"java-{self._JAVA_VERSION}":
-                download_url: str = release.get("assets")[0].get("browser_download_url")
-                break
-        if not download_url:
-            raise GithubDownloadException(f"Unable to get valid KCP assets")
-
-        if not os.path.isdir(self._RESOURCES_DIR):
-            os.mkdir(self._RESOURCES_DIR)
-        if os.path.isfile(f"{self._RESOURCES_DIR}/{self._JAR_NAME}-{self._JAVA_VERSION}.jar"):
-            os.remove(f"{self._RESOURCES_DIR}/{self._JAR_NAME}-{self._JAVA_VERSION}.jar")
-
-        kcp_jar: Response = requests.get(download_url, stream=True)
-        with open(f"{self._RESOURCES_DIR}/{self._JAR_NAME}-{self._JAVA_VERSION}.jar", "wb") as f:
-            for chunk in kcp_jar.iter_content(chunk_size=2048):
-                if chunk:
-                    f.write(chunk)
-
-        self._bot_logger.info("Uploading assets to the apex FTP server...")
-        self._ftp_upload(ftp_host, ftp_port, ftp_user)
-        self._bot_logger.info("Uploaded! everything is up to date")
-        self._bot_logger.info("Applying changes")
+            self._bot_logger.warning(f"Unable to reuse the apex session {e}")
+            return False
+        if r.status_code == 429:
+            self._bot_logger.warning("Apex panel is throttling, keeping the session for later")
+            return False
+        if r.status_code != 200 or "Server[name]" not in r.text:
+            self._bot_logger.warning("Apex session expired, logging in again")
+            self._state.remove("session")
+            self._cookies = None
+            return False
+        self._cookies.update(r.cookies.copy())
+        token_input: Optional[Tag] = BeautifulSoup(r.text, "html.parser").find("input", attrs={"type": "hidden", "name": "YII_CSRF_TOKEN"})
+        self._csrf_token = token_input.get("value") if token_input else session.get("csrf_token")
+        servers[0].page = r
+        self._servers = servers
+        return True
+
+    def _save_session(self):
+        self._state.set(session={
+            "cookies": dict_from_cookiejar(self._cookies),
+            "csrf_token": self._csrf_token,
+            "selection": self.__handler_config.servers,
+            "servers": [server.to_dict() for server in self._servers]
+        })
+
+    def _set_ajax_headers(self):
         self._default_headers.update({"Sec-Fetch-Dest": "empty"})
         self._default_headers.update({"Sec-Fetch-Mode": "cors"})
         self._default_headers.update({"X-Requested-With": "XMLHttpRequest"})
         self._default_headers.update({"Origin": self._url})
         self._default_headers.update({"Alt-Used": self._url})
         self._default_headers.update({"Accept": "*/*"})
-        apply_changes: dict[str, str] = self._save_changes(dashboard, f"{self._JAR_NAME}-{self._JAVA_VERSION}.jar")
-        applied = requests.post(server_url, headers=self._default_headers, data=apply_changes, cookies=self._cookies)
+
+    def _apply_changes(self, server: ApexServer):
+        server_url: str = f"{self._url}/server/{server.server_id}"
+        self._default_headers.update({"Referer": server_url})
+        if server.page is None:
+            server.page = self._request("GET", server_url, headers=self._default_headers, cookies=self._cookies)
+        apply_changes: dict[str, str] = self._save_changes(server.page, f"{self._JAR_NAME}-{self._JAVA_VERSION}.jar")
+        with self._span("save_changes"):
+            applied = self._request("POST", server_url, headers=self._default_headers, data=apply_changes, cookies=self._cookies)
         if applied.status_code != 200:
-            raise ApexSaveChangesException("Unable to save changes for new config!")
+            raise ApexSaveChangesException(f"Unable to save changes for new config on {server.server_id}!")
+
+    def download_bin(self):
+        with self._span("session_restore"):
+            restored: bool = self._restore_session()
+        if not restored:
+            self._open_dashboard()
+        self._save_session()
+        self._bot_logger.info(f"Downloading a valid jar with GO KCP binary for java {self._JAVA_VERSION}")
+        artifacts: CachedArtifactProvider = CachedArtifactProvider(self._artifacts, self._state, self._settings.state_config.artifact_ttl)
+        with self._span("release_lookup"):
+            artifact: Optional[Artifact] = artifacts.get_jar_artifact(self._JAVA_VERSION)
+        if not artifact:
+            raise GithubDownloadException(f"Unable to get valid KCP assets")
+        deployment: str = hashlib.sha256(json.dumps({"jar": artifact.url, "config": self._get_kcp_json()}, sort_keys=True).encode()).hexdigest()
+        deployments: dict[str, str] = dict(self._state.get("deployments", {}))
+        pending: list[ApexServer] = [server for server in self._servers if deployments.get(server.server_id) != deployment]
+        if not pending:
+            self._bot_logger.info("Jar and config already deployed, ready to run! :)")
+            return
+
+        if not os.path.isdir(self._RESOURCES_DIR):
+            os.mkdir(self._RESOURCES_DIR)
+        jar_path: str = f"{self._RESOURCES_DIR}/{self._JAR_NAME}-{self._JAVA_VERSION}.jar"
+        if os.path.isfile(jar_path):
+            os.remove(jar_path)
+
+        with self._span("download") as span:
+            artifacts.fetch(artifact, jar_path)
+            span.add_bytes(os.path.getsize(jar_path))
+
+        self._bot_logger.info(f"Uploading assets to {len(pending)} apex FTP servers...")
+        with self._span("ftp_upload") as span:
+            span.add_bytes(os.path.getsize(jar_path) * len(pending))
+            with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="APEX_FTP") as executor:
+                for _ in executor.map(self._ftp_upload, pending):
+                    pass
+        os.remove(jar_path)
+        self._bot_logger.info("Uploaded! everything is up to date")
+        self._bot_logger.info("Applying changes")
+        self._set_ajax_headers()
+        for server in pending:
+            self._apply_changes(server)
+            deployments[server.server_id] = deployment
+            self._state.set(deployments=deployments)
+        self._save_session()
         self._bot_logger.info("Setup done, ready to run! :)")
         if os.path.isdir(self._RESOURCES_DIR):
             shutil.rmtree(self._RESOURCES_DIR)
 
-    def run_kcp(self):
-        self._bot_logger.info("Sending restart signal!")
-        url: str = f"{self._url}/server/{self._server_id}"
+    def stop_kcp(self):
+        self._stop_event.set()
+
+    def get_probe_addresses(self) -> list[str]:
+        return [f"{server.ip}:{server.port}" for server in self._servers]
+
+    @classmethod
+    def _probe(cls, server: ApexServer) -> bool:
+        try:
+            with socket.create_connection((server.ip, int(server.port)), timeout=30):
+                return True
+        except (OSError, ValueError):
+            return False
+
+    def _open_tails(self) -> dict[str, FTPLogTail]:
+        """
+        Opens one ftp connection per server before the restart, so only what the new kcptun writes is read.
+        """
+        def open_tail(server: ApexServer) -> Optional[FTPLogTail]:
+            try:
+                return FTPLogTail(FTPProcessor(server.ftp_host, server.ftp_port, server.ftp_user, self._panel_pass), self.KCP_LOG)
+            except (OSError, EOFError, ftplib.Error) as e:
+                self._bot_logger.warning(f"Unable to follow the KCP log of {server.server_id}, waiting for its listener instead: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=len(self._servers), thread_name_prefix="APEX_FTP") as executor:
+            tails: list[Optional[FTPLogTail]] = list(executor.map(open_tail, self._servers))
+        return {server.server_id: tail for server, tail in zip(self._servers, tails) if tail}
+
+    def _read_log(self, server: ApexServer, tails: dict[str, FTPLogTail]) -> bool:
+        """
+        @return: True once kcptun logged that it listens.
+        """
+        try:
+            lines: list[str] = tails[server.server_id].read_lines()
+        except (OSError, EOFError, ftplib.Error) as e:
+            self._bot_logger.warning(f"Lost the KCP log of {server.server_id}, waiting for its listener instead: {e}")
+            tails.pop(server.server_id).close()
+            return False
+        ready: bool = False
+        for line in lines:
+            self._process_logger.write_line(f"[{server.server_id}] {line}")
+            cause, _ = ExitClassifier.classify([line], None)
+            if cause.is_permanent():
+                self._record_exit(cause, line)
+                raise ApexStartException(f"KCP on {server.server_id} failed to start: {line}")
+            ready = ready or bool(self.READY_PATTERN.search(line))
+        return ready
+
+    def _give_up(self, ready_spans: dict[str, Span], server_ids: list[str]):
+        for span in ready_spans.values():
+            span.outcome = "timeout"
+            span.finish()
+            self._tracer.record(span)
+        # the saved session and deployments may be what is broken, start from scratch next time
+        self._state.remove("session", "deployments")
+        # 5 minutes wait until process crashes and restarts!
+        time.sleep(60 * 5)
+        raise ApexTimeoutException(f"KCP Node timed out on {', '.join(server_ids)}! crashing...")
+
+    def _wait_ready(self, ready_spans: dict[str, Span], tails: dict[str, FTPLogTail], executor: ThreadPoolExecutor) -> bool:
+        """
+        Servers with a log tail are ready as soon as kcptun logs its listener, the others once it answers.
+        @return: False when stopped before every server was ready.
+        """
+        pending: dict[str, ApexServer] = {server.server_id: server for server in self._servers}
+        deadline: float = time.monotonic() + self.READY_TIMEOUT
+        probed: float = time.monotonic()
+        while pending:
+            if time.monotonic() > deadline:
+                self._give_up(ready_spans, list(pending.keys()))
+            if self._stop_event.wait(self.LOG_POLL):
+                return False
+            ready: list[str] = [server_id for server_id, server in pending.items() if server_id in tails and self._read_log(server, tails)]
+            untailed: list[ApexServer] = [server for server_id, server in pending.items() if server_id not in tails]
+            if untailed and time.monotonic() - probed >= self.PROBE_INTERVAL:
+                probed = time.monotonic()
+                ready += [server.server_id for server, alive in zip(untailed, executor.map(self._probe, untailed)) if alive]
+            for server_id in ready:
+                pending.pop(server_id)
+                span: Span = ready_spans.pop(server_id)
+                span.finish()
+                self._tracer.record(span)
+                self._bot_logger.info(f"Apex KCP listener {server_id} is up after {span.duration:.0f} seconds")
+        return True
+
+    def _restart_servers(self) -> dict[str, Span]:
+        """
+        @return: one span per server, from the restart until its listener is up.
+        """
         restart_data: dict[str, str] = {
             "ajax": "restart",
             "YII_CSRF_TOKEN": self._csrf_token
         }
-        _ = requests.post(url, headers=self._default_headers, cookies=self._cookies, data=restart_data)
-        self._bot_logger.info("starting Apex KCP service, should be up in some minutes!")
-        timeout: int = 10
-        while True:
-            if timeout < 0:
-                # 5 minutes wait until process crashes and restarts!
-                time.sleep(60 * 5)
-                raise ApexTimeoutException("KCP Node timed out 10 times! crashing...")
+        ready_spans: dict[str, Span] = {}
+        for server in self._servers:
+            self._bot_logger.info(f"Sending restart signal to {server.server_id}!")
+            url: str = f"{self._url}/server/{server.server_id}"
+            self._default_headers.update({"Referer": url})
+            with self._span("restart"):
+                _ = self._request("POST", url, headers=self._default_headers, cookies=self._cookies, data=restart_data)
+            ready_spans[server.server_id] = Span(self.__class__.__name__, self._name, "ready_wait")
+        return ready_spans
+
+    def run_kcp(self):
+        self._stop_event.clear()
+        self._set_ajax_headers()
+        tails: dict[str, FTPLogTail] = self._open_tails()
+        with ThreadPoolExecutor(max_workers=len(self._servers), thread_name_prefix="APEX_PROBE") as executor:
             try:
-                time.sleep(20)
-                socket.setdefaulttimeout(30)
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.connect((self._server_ip, int(self._server_port)))
-            except Exception as e:
-                _ = e
-                timeout -= 1
-                self._bot_logger.warning(f"Apex KCP listener did not respond timeout: {10-timeout}/10")
-            else:
-                s.close()
-                timeout: int = 10
+                ready_spans: dict[str, Span] = self._restart_servers()
+                self._bot_logger.info("starting Apex KCP service, following its log until it listens")
+                ready: bool = self._wait_ready(ready_spans, tails, executor)
+            finally:
+                for tail in tails.values():
+                    tail.close()
+            if not ready:
+                self._bot_logger.warning("Apex KCP monitor stopped")
+                return
+            timeouts: dict[str, int] = {server.server_id: 10 for server in self._servers}
+            while True:
+                if any(timeout < 0 for timeout in timeouts.values()):
+                    self._give_up({}, [k for k, v in timeouts.items() if v < 0])
+                if self._stop_event.wait(self.PROBE_INTERVAL):
+                    self._bot_logger.warning("Apex KCP monitor stopped")
+                    return
+                # every server is probed at the same time, a round takes as long as the slowest one
+                for server, alive in zip(self._servers, executor.map(self._probe, self._servers)):
+                    if not alive:
+                        timeouts[server.server_id] -= 1
+                        self._bot_logger.warning(f"Apex KCP listener {server.server_id} did not respond timeout: {10-timeouts[server.server_id]}/10")
+                        continue
+                    timeouts[server.server_id] = 10
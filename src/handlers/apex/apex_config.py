@@ -1,8 +1,39 @@
+from typing import Optional, Union, Any
+
+from src.config.keys import get_key, KeyNotValidTypeException
 from src.handlers.handler_config import HandlerConfig
 
 
 class ApexHandlerConfig(HandlerConfig):
-    def __init__(self, panel_user: str, panel_pass: str):
+    def __init__(self, panel_user: str, panel_pass: str, servers: Optional[Union[str, list[str]]] = None):
+        """
+        @param servers: server ids to run on, "all" for every server of the account, None for the first one.
+        """
         super(ApexHandlerConfig, self).__init__()
         self.panel_user: str = panel_user
         self.panel_pass: str = panel_pass
+        self.servers: Optional[Union[str, list[str]]] = servers
+
+    def get_identity(self) -> str:
+        return self.panel_user
+
+    def select_servers(self, server_ids: list[str]) -> list[str]:
+        if self.servers is None:
+            return server_ids[:1]
+        if self.servers == "all":
+            return server_ids
+        return [server_id for server_id in server_ids if server_id in self.servers]
+
+    @classmethod
+    def from_dict(cls, instance: dict) -> "ApexHandlerConfig":
+        conf: dict = get_key(instance, "config", dict)
+        panel_user: str = get_key(conf, "panel_user")
+        panel_pass: str = get_key(conf, "panel_pass")
+        servers: Any = conf.get("servers")
+        if servers is not None and servers != "all":
+            if type(servers) in (str, int):
+                servers = [servers]
+            if type(servers) != list or not servers or any(type(s) not in (str, int) for s in servers):
+                raise KeyNotValidTypeException("servers has an invalid type! expected \"all\" or a list of server ids")
+            servers = [str(s) for s in servers]
+        return cls(panel_user, panel_pass, servers)
@@ -0,0 +1,39 @@
+from typing import Optional
+
+from requests import Response
+
+
+class ApexServer:
+    """
+    One server of the apex account, everything needed to deploy to it and probe it once scraped.
+    """
+    def __init__(self, server_id: str, ip: str = "", port: str = "", ftp_host: str = "", ftp_port: str = "", ftp_user: str = ""):
+        self.server_id: str = server_id
+        self.ip: str = ip
+        self.port: str = port
+        self.ftp_host: str = ftp_host
+        self.ftp_port: str = ftp_port
+        self.ftp_user: str = ftp_user
+        # server page holding the settings form, only fetched when changes are saved
+        self.page: Optional[Response] = None
+
+    def to_dict(self) -> dict[str, str]:
+        return {
+            "server_id": self.server_id,
+            "ip": self.ip,
+            "port": self.port,
+            "ftp_host": self.ftp_host,
+            "ftp_port": self.ftp_port,
+            "ftp_user": self.ftp_user
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ApexServer":
+        return cls(
+            str(data.get("server_id", "")),
+            data.get("ip", ""),
+            data.get("port", ""),
+            data.get("ftp_host", ""),
+            data.get("ftp_port", ""),
+            data.get("ftp_user", "")
+        )
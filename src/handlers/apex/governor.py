@@ -0,0 +1,91 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Final, Iterator
+from urllib.parse import urlparse
+
+from requests import Response
+
+
+class RequestGovernor:
+    """
+    Token bucket shared by every handler talking to the same panel host.
+    A 429 or a cloudflare challenge pauses every handler with an exponential backoff, and logins run one at a time.
+    """
+    BACKOFF_BASE: Final[float] = 40.0
+    BACKOFF_MAX: Final[float] = 600.0
+    _governors: dict[str, "RequestGovernor"] = {}
+    _governors_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, rate: float = 0.5, burst: int = 3):
+        """
+        @param rate: requests per second allowed once the burst is spent.
+        @param burst: requests that can go out back to back.
+        """
+        self._rate: float = rate
+        self._burst: int = burst
+        self._tokens: float = float(burst)
+        self._updated: float = time.monotonic()
+        self._backoff_until: float = 0.0
+        self._strikes: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._login_lock: threading.Lock = threading.Lock()
+
+    @classmethod
+    def for_url(cls, url: str) -> "RequestGovernor":
+        host: str = urlparse(url).netloc
+        with cls._governors_lock:
+            if host not in cls._governors:
+                cls._governors[host] = cls()
+            return cls._governors[host]
+
+    def get_wait(self) -> float:
+        """
+        @return: seconds until a request may go out, 0 when a token was taken.
+        """
+        with self._lock:
+            now: float = time.monotonic()
+            if now < self._backoff_until:
+                return self._backoff_until - now
+            self._tokens = min(float(self._burst), self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self._rate
+
+    def acquire(self):
+        while (wait := self.get_wait()) > 0:
+            time.sleep(min(wait, 5.0))
+
+    def penalize(self) -> float:
+        """
+        Called after a 429 or a challenge, every handler of the host waits the returned seconds.
+        """
+        with self._lock:
+            delay: float = min(self.BACKOFF_BASE * 2 ** self._strikes, self.BACKOFF_MAX)
+            self._strikes += 1
+            self._backoff_until = max(self._backoff_until, time.monotonic() + delay)
+            self._tokens = 0.0
+            return delay
+
+    def report(self, r: Response) -> bool:
+        """
+        @return: True when the panel throttled the request.
+        """
+        if r.status_code == 429 or r.headers.get("cf-mitigated") == "challenge":
+            self.penalize()
+            return True
+        if r.status_code < 400:
+            with self._lock:
+                self._strikes = 0
+        return False
+
+    def get_backoff(self) -> float:
+        with self._lock:
+            return max(0.0, self._backoff_until - time.monotonic())
+
+    @contextmanager
+    def login_slot(self) -> Iterator[None]:
+        with self._login_lock:
+            yield
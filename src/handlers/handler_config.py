@@ -1,3 +1,13 @@
 class HandlerConfig:
     def __init__(self):
         pass
+
+    def get_identity(self) -> str:
+        """
+        Tells apart the targets a handler may point to, state saved for another target is not trusted.
+        """
+        return ""
+
+    @classmethod
+    def from_dict(cls, instance: dict) -> "HandlerConfig":
+        return cls()
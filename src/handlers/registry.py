@@ -0,0 +1,60 @@
+import importlib
+from typing import Final, Type, Optional, Any
+
+from src.kcp.kcp import KCPHandler
+
+
+class InvalidHandlerException(Exception):
+    def __init__(self, msg: str):
+        super(InvalidHandlerException, self).__init__(msg)
+
+
+class HandlerRegistry:
+    ENTRY_POINT_GROUP: Final[str] = "kcp_bot.handlers"
+
+    def __init__(self):
+        # handler name -> "module:Class", imported only the first time the handler is requested
+        self._handlers: dict[str, str] = {
+            "system": "src.handlers.system.system:SystemHandler",
+            "ssh": "src.handlers.ssh.ssh:SSHHandler",
+            "apex": "src.handlers.apex.apex:ApexHandler"
+        }
+        self._loaded: dict[str, Type[KCPHandler]] = {}
+        self._entry_points: Optional[dict[str, Any]] = None
+
+    def register(self, name: str, handler: str | Type[KCPHandler]):
+        if isinstance(handler, str):
+            self._handlers[name] = handler
+            self._loaded.pop(name, None)
+        else:
+            self._handlers[name] = f"{handler.__module__}:{handler.__name__}"
+            self._loaded[name] = handler
+
+    def get_names(self) -> list[str]:
+        return sorted(set(self._handlers.keys()) | set(self._get_entry_points().keys()))
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def get_handler(self, name: str) -> Type[KCPHandler]:
+        handler: Optional[Type[KCPHandler]] = self._loaded.get(name)
+        if handler:
+            return handler
+        if name in self._handlers:
+            module_name, class_name = self._handlers[name].split(":")
+            handler = getattr(importlib.import_module(module_name), class_name)
+        elif name in self._get_entry_points():
+            handler = self._get_entry_points()[name].load()
+        else:
+            raise InvalidHandlerException(f"Unable to parse config for handler named: {name}!")
+        if not isinstance(handler, type) or not issubclass(handler, KCPHandler):
+            raise InvalidHandlerException(f"Handler {name} does not point to a KCPHandler subclass!")
+        self._loaded[name] = handler
+        return handler
+
+    def _get_entry_points(self) -> dict[str, Any]:
+        # importlib.metadata and the distributions scan are not free, only pay for them when a handler is not built in
+        if self._entry_points is None:
+            from importlib.metadata import entry_points
+            self._entry_points = {ep.name: ep for ep in entry_points(group=self.ENTRY_POINT_GROUP)}
+        return self._entry_points
@@ -1,59 +1,76 @@
 import os
-import re
+import shlex
 import shutil
 import tarfile
-from typing import Optional
+from typing import Optional, Type
 
-import requests
 from paramiko.channel import Channel
 from paramiko.client import SSHClient, AutoAddPolicy
 from paramiko.sftp_client import SFTPClient
 
-from src.constant import KCPTUN_URL
+from src.config.settings import BotSettings
 from src.handlers.handler_config import HandlerConfig
 from src.handlers.ssh.ssh_config import SSHHandlerConfig
+from src.helpers.artifacts import ArtifactProvider, CachedArtifactProvider, get_artifact_provider
+from src.helpers.capabilities import CapabilityProbe
 from src.helpers.detector import Detector, Arch, OS
-from src.kcp.kcp import KCPHandler, InvalidSystemException, GithubDownloadException, HandlerConfigNotValid
+from src.helpers.files import sha256_file
+from src.helpers.github import Artifact
+from src.helpers.network import parse_address, parse_ping_rtt
+from src.kcp.kcp import KCPHandler, InvalidSystemException, HandlerConfigNotValid
 from src.kcp.kcp_config import KCPConfig
 from src.kcp.process import KCPProcess
+from src.kcp.snmp import SnmpLog, TunnelSample
 from src.logger.bot_logger import BotLogger
+from src.logger.process_logger import ProcessLogger
 from src.service.mode import ServiceMode
 
 
 class KCPSSHProcess(KCPProcess):
-    def __init__(self, bot_logger: BotLogger, is_client: bool, kcp_config: KCPConfig, ssh_client: SSHClient):
-        super().__init__(bot_logger, is_client, kcp_config)
+    def __init__(self, bot_logger: BotLogger, is_client: bool, kcp_config: KCPConfig, process_logger: ProcessLogger, ssh_client: SSHClient):
+        super().__init__(bot_logger, is_client, kcp_config, process_logger)
         self._ssh_client: SSHClient = ssh_client
+        self._chan: Optional[Channel] = None
 
-    def start(self, kcp_path: str):
-        if self._is_client:
-            kcp_command: str = f"./{kcp_path} -r {self._kcp_config.remote} -l {self._kcp_config.listen} -mode {self._kcp_config.mode} --crypt {self._kcp_config.crypt} --key {self._kcp_config.key}"
-        else:
-            kcp_command: str = f"./{kcp_path} -t {self._kcp_config.remote} -l {self._kcp_config.listen} -mode {self._kcp_config.mode} --crypt {self._kcp_config.crypt} --key {self._kcp_config.key}"
+    def stop(self):
+        if self._chan:
+            self._chan.close()
 
+    def start(self, kcp_path: str):
+        kcp_command: str = shlex.join(self.build_command(f"./{kcp_path}"))
         chan: Channel = self._ssh_client.invoke_shell()
+        self._chan = chan
         chan.send(bytes(kcp_command + "\n", "utf-8"))
         buffer: str = ""
         is_running: bool = True
         while is_running:
-            buffer += chan.recv(2048).decode("utf-8")
+            data: bytes = chan.recv(2048)
+            if not data:
+                break
+            buffer += data.decode("utf-8", errors="replace")
             lines: list[str] = buffer.split("\r\n")
             if len(lines) > 1:
                 buffer: str = lines[-1]
                 for line in lines[:-1]:
-                    # self._bot_logger.info(line)
+                    self._process_logger.write_line(line)
                     if line.lower() == "terminated":
                         is_running = False
         chan.close()
         self._ssh_client.close()
+        self._process_logger.close()
+        self._bot_logger.warning("Process finished")
+        self._log_last_output()
 
 
 class SSHHandler(KCPHandler):
-    def __init__(self, bot_logger: BotLogger, svc_mode: ServiceMode, kcp_config: KCPConfig, handler_config: HandlerConfig):
+    CONFIG_CLASS: Type[HandlerConfig] = SSHHandlerConfig
+    SNMP_DIR: Optional[str] = "auto_kcp"
+
+    def __init__(self, bot_logger: BotLogger, svc_mode: ServiceMode, kcp_config: KCPConfig, handler_config: HandlerConfig, settings: Optional[BotSettings] = None, name: Optional[str] = None):
         if not isinstance(handler_config, SSHHandlerConfig):
             raise HandlerConfigNotValid("Invalid handler config object for SSH handler")
 
-        super(SSHHandler, self).__init__(bot_logger, svc_mode, kcp_config, handler_config)
+        super(SSHHandler, self).__init__(bot_logger, svc_mode, kcp_config, handler_config, settings, name)
         self.__handler_config: SSHHandlerConfig = handler_config
         self._bot_logger: BotLogger = bot_logger
         self._kcp_file: Optional[str] = None
@@ -66,6 +83,7 @@ class SSHHandler(KCPHandler):
 
         self._ssh_client: Optional[SSHClient] = None
         self._bin_remote_path: Optional[str] = None
+        self._artifacts: ArtifactProvider = get_artifact_provider(bot_logger, self._settings)
 
     def _simple_command(self, command: str) -> str:
         stdin, stdout, stderr = self._ssh_client.exec_command(command)
@@ -77,55 +95,115 @@ class SSHHandler(KCPHandler):
         stderr.close()
         return output
 
-    def download_bin(self):
-        self._ssh_client: SSHClient = SSHClient()
-        self._ssh_client.set_missing_host_key_policy(AutoAddPolicy())
-        self._ssh_client.connect(hostname=self._ssh_host, port=self._ssh_port, username=self._ssh_user, password=self._ssh_pass)
+    def _get_remote_system(self, use_state: bool) -> (OS, Arch):
         detector: Detector = Detector()
+        system: Optional[dict] = self._state.get("system") if use_state else None
+        if system:
+            # the state holds enum values, not uname output
+            try:
+                return OS(system.get("os")), Arch(system.get("arch"))
+            except ValueError:
+                self._bot_logger.warning(f"Ignoring the saved system {system}, it is not a known os and arch")
         arch: Arch = detector.detect_arch(self._simple_command("uname -m"))
         os_: OS = detector.detect_os(self._simple_command("uname -s"))
         if not arch or not os_:
             raise InvalidSystemException(f"Unable to find a valid os or arch, information found: os={os_.value}, arch={arch.value}, report with your 'uname -s' and 'uname -m'")
-        self._bot_logger.info(f"Found {os_.value} with {arch.value}")
-        try:
-            r = requests.get(KCPTUN_URL)
-        except Exception as e:
-            self._bot_logger.error(f"Unable to get valid KCP assets {e}")
-            raise GithubDownloadException(f"Unable to get valid KCP assets {e}")
-        if r.status_code != 200:
-            raise GithubDownloadException(f"Unable to get a valid release, got status code {r.status_code}!")
-        data: dict = r.json()
-        assets: list[dict] = data.get("assets")
-        ver: str = rf"^kcptun-{os_.value}-{arch.value}-\d+.tar.gz$"
-        download_url: str = ""
-        for asset in assets:
-            asset_name: str = asset.get("name")
-            if re.search(ver, asset_name):
-                download_url = asset.get("browser_download_url")
-                break
-        if not download_url:
+        self._state.set(system={"os": os_.value, "arch": arch.value})
+        return os_, arch
+
+    def _get_remote_hash(self, path: str) -> str:
+        return self._simple_command(f"sha256sum {shlex.quote(path)} 2>/dev/null || shasum -a 256 {shlex.quote(path)} 2>/dev/null").split(" ")[0].strip()
+
+    def _measure_rtt(self) -> Optional[float]:
+        # kcptun runs on the remote host, its path to the remote is the one that counts
+        host: str = parse_address(self._kcp_config.remote)[0]
+        rtt: Optional[float] = parse_ping_rtt(self._simple_command(f"ping -c {self.RTT_SAMPLES} -q {shlex.quote(host)} 2>/dev/null | tail -n 1"))
+        return rtt if rtt is not None else super(SSHHandler, self)._measure_rtt()
+
+    def _read_snmp(self) -> Optional[TunnelSample]:
+        if not self._kcp_config.snmplog:
+            return None
+        path: str = shlex.quote(self._kcp_config.snmplog)
+        lines: list[str] = self._simple_command(f"head -n 1 {path} 2>/dev/null; tail -n 1 {path} 2>/dev/null").strip().splitlines()
+        return SnmpLog.parse(lines[0], lines[-1]) if len(lines) >= 2 else None
+
+    def get_probe_addresses(self) -> list[str]:
+        # kcptun listens on the ssh host, a wildcard listen is reached through the same address the bot connects to
+        host, _, port = self._kcp_config.listen.rpartition(":")
+        return [f"{self._ssh_host if host in ('', '0.0.0.0', '::') else host}:{port}"]
+
+    def _is_deployed(self, artifact: Artifact) -> bool:
+        binary: Optional[dict] = self._state.get("binary")
+        if not binary or binary.get("url") != artifact.url:
+            return False
+        path: str = binary.get("path", "")
+        if self._simple_command(f"test -x {shlex.quote(path)} && echo ok").strip() != "ok":
+            return False
+        remote_hash: str = self._get_remote_hash(path)
+        if remote_hash and binary.get("sha256") and remote_hash != binary.get("sha256"):
+            return False
+        self._bin_remote_path = path
+        return True
+
+    def download_bin(self):
+        self._ssh_client: SSHClient = SSHClient()
+        self._ssh_client.set_missing_host_key_policy(AutoAddPolicy())
+        with self._span("connect"):
+            self._ssh_client.connect(hostname=self._ssh_host, port=self._ssh_port, username=self._ssh_user, password=self._ssh_pass)
+        artifacts: CachedArtifactProvider = CachedArtifactProvider(self._artifacts, self._state, self._settings.state_config.artifact_ttl)
+        system_saved: bool = self._state.get("system") is not None
+        with self._span("detect"):
+            os_, arch = self._get_remote_system(True)
+        if os_ and arch:
+            self._bot_logger.info(f"Found {os_.value} with {arch.value}")
+        self._tune_kcp(CapabilityProbe(self._simple_command))
+        with self._span("release_lookup"):
+            artifact: Optional[Artifact] = artifacts.get_kcptun_artifact(os_, arch) if os_ and arch else None
+        with self._span("deployed_check"):
+            deployed: bool = artifact is not None and self._is_deployed(artifact)
+        if deployed:
+            self._bot_logger.info(f"{self._bin_remote_path} already in place!")
+            return
+        if system_saved:
+            # the saved facts did not hold, discover everything again
+            self._state.remove("system", "binary")
+            with self._span("detect"):
+                os_, arch = self._get_remote_system(False)
+            self._bot_logger.info(f"Found {os_.value} with {arch.value}")
+            with self._span("release_lookup"):
+                artifact = artifacts.get_kcptun_artifact(os_, arch)
+        if not artifact:
             raise InvalidSystemException(f"Couldn't find a valid version for this os and arch, information found: os={os_.value}, arch={arch.value}, report with your 'uname -s' and 'uname -m'")
         self._bot_logger.info("Found a valid release!")
-        self._bot_logger.info(f"Downloading {download_url}...")
+        expected_binary_format: str = "client" if self.is_client() else "server"
+        expected_binary_format += f"_{os_.value}_{arch.value}"
+        _ = self._simple_command("mkdir -p auto_kcp")
+        _ = self._simple_command("rm -rf auto_kcp/client*")
+        _ = self._simple_command("rm -rf auto_kcp/server*")
+        remote_url: Optional[str] = artifacts.get_remote_url(artifact)
+        with self._span("remote_fetch"):
+            fetched: bool = bool(remote_url) and self._remote_fetch(remote_url, expected_binary_format)
+        if fetched:
+            self._state.set(binary={"url": artifact.url, "path": self._bin_remote_path, "sha256": self._get_remote_hash(self._bin_remote_path)})
+            self._bot_logger.info(f"{self._bin_remote_path} ready!")
+            return
+        self._bot_logger.info(f"Downloading {artifact.url}...")
         resources_dir: str = self.get_unique_name()
         if os.path.isdir(resources_dir):
             shutil.rmtree(resources_dir)
         if not os.path.isdir(resources_dir):
             os.mkdir(resources_dir)
-        kcp_compressed = requests.get(download_url, stream=True)
-        with open(f"{resources_dir}/compressed.tar.gz", "wb") as f:
-            for chunk in kcp_compressed.iter_content(chunk_size=2048):
-                if chunk:
-                    f.write(chunk)
+        with self._span("download") as span:
+            artifacts.fetch(artifact, f"{resources_dir}/compressed.tar.gz")
+            span.add_bytes(os.path.getsize(f"{resources_dir}/compressed.tar.gz"))
         self._bot_logger.info(f"File downloaded")
-        file: tarfile.TarFile = tarfile.open(f"{resources_dir}/compressed.tar.gz")
-        file.extractall(path=resources_dir)
-        file.close()
+        with self._span("extract"):
+            file: tarfile.TarFile = tarfile.open(f"{resources_dir}/compressed.tar.gz")
+            file.extractall(path=resources_dir)
+            file.close()
         os.remove(f"{resources_dir}/compressed.tar.gz")
         self._bot_logger.info(f"Extracting a valid binary")
         files: list[str] = os.listdir(resources_dir)
-        expected_binary_format: str = "client" if self.is_client() else "server"
-        expected_binary_format += f"_{os_.value}_{arch.value}"
         kcp_file: str = ""
         for bin_file in files:
             if bin_file.startswith(expected_binary_format):
@@ -135,18 +213,33 @@ class SSHHandler(KCPHandler):
         bin_name: str = kcp_file.split('/')[-1]
         if not kcp_file:
             raise InvalidSystemException(f"Couldn't find a valid executable! information found: os={os_.value}, arch={arch.value}, report with your 'uname -s' and 'uname -m', files found: {', '.join(files)}!")
-        _ = self._simple_command("mkdir -p auto_kcp")
-        _ = self._simple_command("rm -rf auto_kcp/client*")
-        _ = self._simple_command("rm -rf auto_kcp/server*")
         self._bot_logger.info("Uploading bin file to the server")
         self._bin_remote_path: str = f"auto_kcp/{bin_name}"
-        ftp: SFTPClient = self._ssh_client.open_sftp()
-        ftp.put(localpath=kcp_file, remotepath=self._bin_remote_path)
-        ftp.close()
+        with self._span("sftp_put") as span:
+            ftp: SFTPClient = self._ssh_client.open_sftp()
+            ftp.put(localpath=kcp_file, remotepath=self._bin_remote_path)
+            ftp.close()
+            span.add_bytes(os.path.getsize(kcp_file))
+        bin_hash: str = sha256_file(kcp_file)
         shutil.rmtree(resources_dir)
         self._bot_logger.info("+x perms to the bin file")
         _ = self._simple_command(f"chmod +x {self._bin_remote_path}")
+        self._state.set(binary={"url": artifact.url, "path": self._bin_remote_path, "sha256": bin_hash})
         self._bot_logger.info(f"{self._bin_remote_path} ready!")
+
+    def _remote_fetch(self, url: str, expected_binary_format: str) -> bool:
+        self._bot_logger.info(f"Fetching {url} from the remote host...")
+        _ = self._simple_command(f"(curl -fsSL -o auto_kcp/compressed.tar.gz '{url}' || wget -q -O auto_kcp/compressed.tar.gz '{url}') && tar -xzf auto_kcp/compressed.tar.gz -C auto_kcp; rm -f auto_kcp/compressed.tar.gz")
+        bin_name: str = self._simple_command(f"ls auto_kcp | grep '^{expected_binary_format}' | head -n 1").strip()
+        _ = self._simple_command(f"cd auto_kcp && ls | grep -v '^{expected_binary_format}' | xargs rm -rf")
+        if not bin_name:
+            self._bot_logger.warning("Remote host could not fetch the mirror, falling back to an upload")
+            return False
+        self._bin_remote_path: str = f"auto_kcp/{bin_name}"
+        _ = self._simple_command(f"chmod +x {self._bin_remote_path}")
+        return True
+
     def run_kcp(self):
-        kcp_process: KCPSSHProcess = KCPSSHProcess(self._bot_logger, self.is_client(), self._kcp_config, self._ssh_client)
-        kcp_process.start(self._bin_remote_path)
+        self._kcp_process: KCPSSHProcess = KCPSSHProcess(self._bot_logger, self.is_client(), self._kcp_config, self._process_logger, self._ssh_client)
+        with self._span("run"):
+            self._kcp_process.start(self._bin_remote_path)
@@ -1,3 +1,4 @@
+from src.config.keys import get_key
 from src.handlers.handler_config import HandlerConfig
 
 
@@ -8,3 +9,15 @@ class SSHHandlerConfig(HandlerConfig):
         self.ssh_pass: str = ssh_pass
         self.ssh_port: int = ssh_port
         self.ssh_host: str = ssh_host
+
+    def get_identity(self) -> str:
+        return f"{self.ssh_user}@{self.ssh_host}:{self.ssh_port}"
+
+    @classmethod
+    def from_dict(cls, instance: dict) -> "SSHHandlerConfig":
+        conf: dict = get_key(instance, "config", dict)
+        ssh_user: str = get_key(conf, "ssh_user")
+        ssh_pass: str = get_key(conf, "ssh_pass")
+        ssh_host: str = get_key(conf, "ssh_host")
+        ssh_port: int = get_key(conf, "ssh_port", int)
+        return cls(ssh_user, ssh_pass, ssh_host, ssh_port)
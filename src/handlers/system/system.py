@@ -1,71 +1,203 @@
 import os.path
 import platform
-import re
 import shutil
 import tarfile
+import tempfile
+import threading
+import time
+from collections import deque
+from copy import copy
 from subprocess import PIPE, Popen, STDOUT
-from typing import Optional, Final
-
-import requests
+from typing import Optional, Final, Callable
 
+from src.config.settings import BotSettings
 from src.kcp.kcp_config import KCPConfig
-from src.constant import KCPTUN_URL
 from src.handlers.handler_config import HandlerConfig
-from src.kcp.kcp import KCPHandler, GithubDownloadException, InvalidSystemException
+from src.helpers.capabilities import CapabilityProbe
+from src.helpers.artifacts import ArtifactProvider, CachedArtifactProvider, get_artifact_provider
+from src.helpers.github import Artifact
+from src.helpers.network import parse_address, is_port_bound, count_established, check_bind, check_resolve
+from src.kcp.exec_image import ExecImage
+from src.kcp.exit_cause import ExitCause, ExitClassifier, PreflightException
+from src.kcp.kcp import KCPHandler, InvalidSystemException
 from src.kcp.process import KCPProcess
+from src.kcp.probe import EchoFront
+from src.kcp.proc_sampler import ProcessSampler, ResourceSeries
+from src.kcp.process_manager import ProcessManager
+from src.kcp.resources import ProcessResources
+from src.kcp.snmp import SnmpLog, TunnelSample
+from src.kcp.upgrade import UpgradeMonitor
 from src.helpers.detector import Detector, Arch, OS
 from src.logger.bot_logger import BotLogger
+from src.logger.process_logger import ProcessLogger
 from src.service.mode import ServiceMode
 
 
-class SystemProcessException(Exception):
-    def __init__(self):
-        super(SystemProcessException, self).__init__()
-
-
 class KCPSystemProcess(KCPProcess):
-    def __init__(self, bot_logger: BotLogger, is_client: bool, kcp_config: KCPConfig, resources_path: str):
-        super().__init__(bot_logger, is_client, kcp_config)
-        self._process: Optional[PIPE] = None
+    # output kept to classify why the process exited, the first lines hold the startup errors
+    EARLY_LINES: Final[int] = 20
+    TAIL_LINES: Final[int] = 20
+
+    def __init__(self, bot_logger: BotLogger, is_client: bool, kcp_config: KCPConfig, process_logger: ProcessLogger, resources_path: str, resources: ProcessResources, process_manager: Optional[ProcessManager] = None, image: Optional[ExecImage] = None, on_exit: Optional[Callable[["KCPSystemProcess"], None]] = None, series: Optional[ResourceSeries] = None):
+        """
+        @param image: in memory binary, closed once the process exits.
+        @param on_exit: called from the process manager thread once the process exited.
+        @param series: filled with /proc samples of the process while it runs.
+        """
+        super().__init__(bot_logger, is_client, kcp_config, process_logger)
+        self._process: Optional[Popen] = None
         self._resources_path: Final[str] = resources_path
+        self._resources: ProcessResources = resources
+        self._process_manager: ProcessManager = process_manager if process_manager else ProcessManager.get_default(bot_logger)
+        self._exited: threading.Event = threading.Event()
+        self._exit_code: Optional[int] = None
+        self._image: Optional[ExecImage] = image
+        self._on_exit_callback: Optional[Callable[[KCPSystemProcess], None]] = on_exit
+        self._early_output: list[str] = []
+        self._tail_output: deque[str] = deque(maxlen=self.TAIL_LINES)
+        self._lines: int = 0
+        self._started: Optional[float] = None
+        self._stopped: bool = False
+        self._series: Optional[ResourceSeries] = series
 
     def start(self, kcp_path: str):
-        self._start_kcp_process(kcp_path)
+        self.launch(kcp_path)
+        self.wait()
+
+    def launch(self, kcp_path: str):
+        """
+        Starts kcptun and returns, the process manager thread reads its output and reaps it.
+        """
         try:
-            self._kcp_listener()
-        except SystemProcessException:
-            self._bot_logger.warning("Process finished")
-        except Exception as e:
-            self._bot_logger.error(e)
+            self._start_kcp_process(kcp_path)
+        except Exception:
+            self._close_image()
+            self._exited.set()
+            raise
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._exited.wait(timeout)
+
+    def stop(self):
+        if self.is_running():
+            self._stopped = True
+            self._process.terminate()
+
+    def kill(self):
+        if self.is_running():
+            self._stopped = True
+            self._process.kill()
+
+    def was_stopped(self) -> bool:
+        return self._stopped
+
+    def get_uptime(self) -> float:
+        return time.monotonic() - self._started if self._started is not None else 0.0
+
+    def get_output(self) -> list[str]:
+        if self._lines <= self.EARLY_LINES:
+            return list(self._early_output)
+        return self._early_output + list(self._tail_output)
+
+    def is_running(self) -> bool:
+        return self._process is not None and not self._exited.is_set()
+
+    def get_exit_code(self) -> Optional[int]:
+        return self._exit_code
 
     def _start_kcp_process(self, kcp_path: str):
-        if self._is_client:
-            kcp_command: str = f"{kcp_path} -r {self._kcp_config.remote} -l {self._kcp_config.listen} -mode {self._kcp_config.mode} --crypt {self._kcp_config.crypt} --key {self._kcp_config.key}"
+        kcp_command: list[str] = self._resources.get_command_prefix() + self.build_command(kcp_path)
+        self._process = Popen(kcp_command, stdin=PIPE, stdout=PIPE, stderr=STDOUT, env=self._resources.get_env())
+        self._started = time.monotonic()
+        self._resources.apply(self._process.pid)
+        self._process_manager.register(self._process, self._on_output, self._on_exit)
+        if self._series and self._resources.get_sample_interval():
+            ProcessSampler.get_default(self._bot_logger).register(self._process.pid, self._series, self._resources.get_sample_interval())
+
+    def stop_sampling(self):
+        if self._series and self._process:
+            ProcessSampler.get_default(self._bot_logger).unregister(self._process.pid)
+
+    def _on_output(self, line: str):
+        if os.path.isdir(self._resources_path):
+            shutil.rmtree(self._resources_path)
+        self._lines += 1
+        if len(self._early_output) < self.EARLY_LINES:
+            self._early_output.append(line)
         else:
-            kcp_command: str = f"{kcp_path} -t {self._kcp_config.remote} -l {self._kcp_config.listen} -mode {self._kcp_config.mode} --crypt {self._kcp_config.crypt} --key {self._kcp_config.key}"
+            self._tail_output.append(line)
+        self._process_logger.write_line(line)
 
-        self._process = Popen(kcp_command, stdin=PIPE, stdout=PIPE, stderr=STDOUT, shell=True)
+    def _on_exit(self, exit_code: int):
+        self._exit_code = exit_code
+        try:
+            self.stop_sampling()
+            self._bot_logger.warning(f"Process finished with exit code {exit_code}")
+            self._log_last_output()
+            self._process_logger.close()
+            self._close_image()
+            if self._on_exit_callback:
+                # before the event, whoever sees the process gone also sees why it went
+                self._on_exit_callback(self)
+        finally:
+            # a failing cleanup must not leave the process running forever for the executors
+            self._exited.set()
 
-    def _kcp_listener(self):
-        while True:
-            try:
-                text: bytes = next(iter(self._process.stdout))
-            except StopIteration:
-                raise SystemProcessException
-            else:
-                _ = text
-                if os.path.isdir(self._resources_path):
-                    shutil.rmtree(self._resources_path)
-                # self._bot_logger.info(text.decode("utf8")[:-1])
+    def _close_image(self):
+        if self._image:
+            self._image.close()
 
 
 class SystemHandler(KCPHandler):
-    def __init__(self, bot_logger: BotLogger, svc_mode: ServiceMode, kcp_config: KCPConfig, handler_config: HandlerConfig):
-        super(SystemHandler, self).__init__(bot_logger, svc_mode, kcp_config, handler_config)
+    # a process that ran this long was healthy, its exit starts the backoff over
+    HEALTHY_UPTIME: Final[float] = 60.0
+    # seconds kcptun gets to exit after a SIGTERM before it is killed
+    STOP_TIMEOUT: Final[float] = 10.0
+    PROBE_FRONT: bool = True
+    UPGRADES: bool = True
+    SNMP_DIR: Optional[str] = ""
+
+    def __init__(self, bot_logger: BotLogger, svc_mode: ServiceMode, kcp_config: KCPConfig, handler_config: HandlerConfig, settings: Optional[BotSettings] = None, name: Optional[str] = None):
+        super(SystemHandler, self).__init__(bot_logger, svc_mode, kcp_config, handler_config, settings, name)
         self._bot_logger: BotLogger = bot_logger
         self._kcp_file: Optional[str] = None
         self._kcp_config: KCPConfig = kcp_config
         self._RESOURCES_DIR: Final[str] = self.get_unique_name()
+        self._artifacts: ArtifactProvider = get_artifact_provider(bot_logger, self._settings)
+        self._artifact: Optional[Artifact] = None
+        self._os: Optional[OS] = None
+        self._arch: Optional[Arch] = None
+        self._exec_mode: str = kcp_config.process.exec_mode if kcp_config.process else "disk"
+        # staged in memory by download_bin, owned by the process once launched
+        self._kcp_image: Optional[ExecImage] = None
+        self._upgrade_lock: threading.Lock = threading.Lock()
+        self._resources: ProcessResources = ProcessResources(bot_logger, kcp_config.process)
+        self._upgrade_monitor: Optional[UpgradeMonitor] = None
+        if self._kcp_config.upgrade and self._kcp_config.upgrade.enabled:
+            self._upgrade_monitor = UpgradeMonitor(self._bot_logger, self._name, self._kcp_config.upgrade.interval, self._check_upgrade)
+        self._echo_front: Optional[EchoFront] = None
+        self._resource_series: Optional[ResourceSeries] = None
+        if self._resources.get_sample_interval() and ProcessSampler.is_supported():
+            self._resource_series = ResourceSeries(self._name, self._resources.get_sample_history())
+
+    def prepare(self):
+        super(SystemHandler, self).prepare()
+        if self._upgrade_monitor:
+            self._upgrade_monitor.start()
+        if self.is_server() and self._kcp_config.probe and not self._echo_front:
+            self._echo_front = EchoFront(self._bot_logger, self._kcp_config.remote, peek_timeout=self._kcp_config.probe.peek_timeout / 1000)
+            self._echo_front.start()
+            self._bot_logger.info(f"{self._name} answering tunnel probes on {self._echo_front.get_address()} in front of {self._kcp_config.remote}, tunnel connections are relayed through it")
+
+    def _get_launch_config(self) -> KCPConfig:
+        """
+        With an echo front kcptun forwards to the front, which pipes everything but the probes to the configured target.
+        """
+        if not self._echo_front:
+            return self._kcp_config
+        kcp_config: KCPConfig = copy(self._kcp_config)
+        kcp_config.remote = self._echo_front.get_address()
+        return kcp_config
 
     def download_bin(self):
         detector: Detector = Detector()
@@ -74,53 +206,215 @@ class SystemHandler(KCPHandler):
         if not arch or not os_:
             raise InvalidSystemException(f"Unable to find a valid os or arch, information found: os={os_.value}, arch={arch.value}, information retrieved: os={platform.uname().system}, arch={platform.uname().machine}")
         self._bot_logger.info(f"Found {os_.value} with {arch.value}")
-        try:
-            r = requests.get(KCPTUN_URL)
-        except Exception as e:
-            self._bot_logger.error(f"Unable to get valid KCP assets {e}")
-            raise GithubDownloadException(f"Unable to get valid KCP assets {e}")
-        if r.status_code != 200:
-            raise GithubDownloadException(f"Unable to get a valid release, got status code {r.status_code}!")
-        data: dict = r.json()
-        assets: list[dict] = data.get("assets")
-        ver: str = rf"^kcptun-{os_.value}-{arch.value}-\d+.tar.gz$"
-        download_url: str = ""
-        for asset in assets:
-            asset_name: str = asset.get("name")
-            if re.search(ver, asset_name):
-                download_url = asset.get("browser_download_url")
-                break
-        if not download_url:
+        self._os, self._arch = os_, arch
+        self._tune_kcp(CapabilityProbe.local())
+        artifacts: CachedArtifactProvider = CachedArtifactProvider(self._artifacts, self._state, self._settings.state_config.artifact_ttl)
+        with self._span("release_lookup"):
+            artifact: Optional[Artifact] = artifacts.get_kcptun_artifact(os_, arch)
+        if not artifact:
             raise InvalidSystemException(f"Couldn't find a valid version for this os and arch, information found: os={os_.value}, arch={arch.value}, information retrieved: os={platform.uname().system}, arch={platform.uname().machine}, please report!")
         self._bot_logger.info("Found a valid release!")
-        self._bot_logger.info(f"Downloading {download_url}...")
-        if os.path.isdir(self._RESOURCES_DIR):
-            shutil.rmtree(self._RESOURCES_DIR)
-        if not os.path.isdir(self._RESOURCES_DIR):
-            os.mkdir(self._RESOURCES_DIR)
-        kcp_compressed = requests.get(download_url, stream=True)
-        with open(f"{self._RESOURCES_DIR}/compressed.tar.gz", "wb") as f:
-            for chunk in kcp_compressed.iter_content(chunk_size=2048):
-                if chunk:
-                    f.write(chunk)
+        if self._kcp_image:
+            self._kcp_image.close()
+        self._kcp_file, self._kcp_image = self._stage(artifact, self._RESOURCES_DIR, artifacts)
+        self._artifact = artifact
+        self._bot_logger.info(f"Found a valid binary! {self._kcp_file} ready!")
+
+    def _stage(self, artifact: Artifact, resources_dir: str, artifacts: Optional[ArtifactProvider] = None) -> (str, Optional[ExecImage]):
+        """
+        @return: the path to execute and the in memory image behind it, None when the binary is on disk.
+        """
+        if self._exec_mode == "memory":
+            image: ExecImage = self._install_image(artifact, artifacts)
+            return image.get_path(), image
+        return self._install(artifact, resources_dir, artifacts), None
+
+    def _get_binary_format(self) -> str:
+        expected_binary_format: str = "client" if self.is_client() else "server"
+        return expected_binary_format + f"_{self._os.value}_{self._arch.value}"
+
+    def _install_image(self, artifact: Artifact, artifacts: Optional[ArtifactProvider] = None) -> ExecImage:
+        self._bot_logger.info(f"Downloading {artifact.url} into memory...")
+        tmpfs: Optional[str] = ExecImage.get_tmpfs()
+        if not tmpfs:
+            self._bot_logger.warning("No exec tmpfs found, the release archive goes through the working directory")
+        staging_dir: str = tempfile.mkdtemp(prefix=f"{self._name}-", dir=tmpfs if tmpfs else ".")
+        try:
+            with self._span("download") as span:
+                (artifacts if artifacts else self._artifacts).fetch(artifact, f"{staging_dir}/compressed.tar.gz")
+                span.add_bytes(os.path.getsize(f"{staging_dir}/compressed.tar.gz"))
+            with self._span("extract"):
+                with tarfile.open(f"{staging_dir}/compressed.tar.gz") as file:
+                    names: list[str] = file.getnames()
+                    member: Optional[tarfile.TarInfo] = next((m for m in file.getmembers() if m.isfile() and os.path.basename(m.name).startswith(self._get_binary_format())), None)
+                    if not member:
+                        raise InvalidSystemException(f"Couldn't find a valid executable! information found: os={self._os.value}, arch={self._arch.value}, information retrieved: os={platform.uname().system}, arch={platform.uname().machine}, files found: {', '.join(names)}, please report")
+                    data: bytes = file.extractfile(member).read()
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        image: ExecImage = ExecImage.load(data, os.path.basename(member.name))
+        self._bot_logger.info(f"{os.path.basename(member.name)} loaded in {'a memfd' if image.is_memfd() else image.get_path()}")
+        return image
+
+    def _install(self, artifact: Artifact, resources_dir: str, artifacts: Optional[ArtifactProvider] = None) -> str:
+        self._bot_logger.info(f"Downloading {artifact.url}...")
+        if os.path.isdir(resources_dir):
+            shutil.rmtree(resources_dir)
+        if not os.path.isdir(resources_dir):
+            os.mkdir(resources_dir)
+        with self._span("download") as span:
+            (artifacts if artifacts else self._artifacts).fetch(artifact, f"{resources_dir}/compressed.tar.gz")
+            span.add_bytes(os.path.getsize(f"{resources_dir}/compressed.tar.gz"))
         self._bot_logger.info(f"File downloaded")
-        file: tarfile.TarFile = tarfile.open(f"{self._RESOURCES_DIR}/compressed.tar.gz")
-        file.extractall(path=self._RESOURCES_DIR)
-        file.close()
-        os.remove(f"{self._RESOURCES_DIR}/compressed.tar.gz")
+        with self._span("extract"):
+            file: tarfile.TarFile = tarfile.open(f"{resources_dir}/compressed.tar.gz")
+            file.extractall(path=resources_dir)
+            file.close()
+        os.remove(f"{resources_dir}/compressed.tar.gz")
         self._bot_logger.info(f"Extracting a valid binary")
-        files: list[str] = os.listdir(self._RESOURCES_DIR)
-        expected_binary_format: str = "client" if self.is_client() else "server"
-        expected_binary_format += f"_{os_.value}_{arch.value}"
+        files: list[str] = os.listdir(resources_dir)
+        expected_binary_format: str = self._get_binary_format()
+        kcp_file: str = ""
         for bin_file in files:
             if bin_file.startswith(expected_binary_format):
-                self._kcp_file = f"{self._RESOURCES_DIR}/{bin_file}"
+                kcp_file = f"{resources_dir}/{bin_file}"
             else:
-                os.remove(f"{self._RESOURCES_DIR}/{bin_file}")
-        if not self._kcp_file:
-            raise InvalidSystemException(f"Couldn't find a valid executable! information found: os={os_.value}, arch={arch.value}, information retrieved: os={platform.uname().system}, arch={platform.uname().machine}, files found: {', '.join(files)}, please report")
-        self._bot_logger.info(f"Found a valid binary! {self._kcp_file} ready!")
+                os.remove(f"{resources_dir}/{bin_file}")
+        if not kcp_file:
+            raise InvalidSystemException(f"Couldn't find a valid executable! information found: os={self._os.value}, arch={self._arch.value}, information retrieved: os={platform.uname().system}, arch={platform.uname().machine}, files found: {', '.join(files)}, please report")
+        return kcp_file
 
     def run_kcp(self):
-        kcp_process: KCPSystemProcess = KCPSystemProcess(self._bot_logger, self.is_client(), self._kcp_config, self._RESOURCES_DIR)
-        kcp_process.start(self._kcp_file)
+        # returns once kcptun is launched, the executors follow it through is_running
+        try:
+            with self._span("preflight"):
+                self._preflight()
+        except PreflightException as e:
+            self._record_exit(e.cause, str(e))
+            raise
+        process: KCPSystemProcess = KCPSystemProcess(self._bot_logger, self.is_client(), self._get_launch_config(), self._process_logger, self._RESOURCES_DIR, self._resources, image=self._kcp_image, on_exit=self._on_process_exit, series=self._resource_series)
+        self._kcp_image = None
+        self._kcp_process = process
+        with self._span("launch"):
+            process.launch(self._kcp_file)
+
+    def _preflight(self):
+        """
+        Catches what would make kcptun exit right away before it is launched.
+        """
+        try:
+            bind_error: Optional[str] = check_bind(self._kcp_config.listen, udp=self.is_server())
+            resolve_error: Optional[str] = check_resolve(self._kcp_config.remote)
+        except ValueError:
+            raise PreflightException(f"invalid address in listen={self._kcp_config.listen} or remote={self._kcp_config.remote}", ExitCause.BAD_ARGS)
+        if bind_error:
+            raise PreflightException(f"unable to bind {self._kcp_config.listen}: {bind_error}", ExitCause.BIND_CONFLICT)
+        if resolve_error:
+            raise PreflightException(f"unable to resolve {self._kcp_config.remote}: {resolve_error}", ExitCause.TRANSIENT)
+
+    def get_resource_series(self) -> Optional[ResourceSeries]:
+        return self._resource_series
+
+    def _read_snmp(self) -> Optional[TunnelSample]:
+        return SnmpLog.read_last(self._kcp_config.snmplog) if self._kcp_config.snmplog else None
+
+    def _on_process_exit(self, process: KCPSystemProcess):
+        if process is not self._kcp_process:
+            # replaced by an upgrade, its exit is expected
+            return
+        if process.get_uptime() >= self.HEALTHY_UPTIME:
+            self._exit_backoff.reset()
+        if process.was_stopped():
+            self._record_exit(ExitCause.TRANSIENT, "stopped by the bot")
+            return
+        cause, line = ExitClassifier.classify(process.get_output(), process.get_exit_code())
+        self._record_exit(cause, line if line else f"exit code {process.get_exit_code()}")
+
+    def is_running(self) -> bool:
+        # an upgrade swaps the process while holding the lock
+        return self._upgrade_lock.locked() or (self._kcp_process is not None and self._kcp_process.is_running())
+
+    def _check_upgrade(self):
+        with self._upgrade_lock:
+            old: Optional[KCPSystemProcess] = self._kcp_process
+            if not self._artifact or not old or not old.is_running():
+                return
+            artifact: Optional[Artifact] = self._artifacts.get_kcptun_artifact(self._os, self._arch)
+            if not artifact or artifact.url == self._artifact.url:
+                return
+            self._bot_logger.info(f"{self._name} found a new kcptun release {artifact.name}, staging it")
+            staging_dir: str = self.get_unique_name()
+            kcp_file, image = self._stage(artifact, staging_dir)
+            new_config: KCPConfig = copy(self._get_launch_config())
+            alt_listen: Optional[str] = self._kcp_config.upgrade.alt_listen if self.is_client() else None
+            if alt_listen:
+                new_config.listen = alt_listen
+            new: KCPSystemProcess = KCPSystemProcess(self._bot_logger, self.is_client(), new_config, self._process_logger, staging_dir, self._resources, image=image, on_exit=self._on_process_exit, series=self._resource_series)
+            if alt_listen:
+                new.launch(kcp_file)
+                if not self._wait_healthy(new, new_config):
+                    self._bot_logger.error(f"{self._name} upgraded kcptun failed its health probe, keeping the running one")
+                    new.stop()
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    return
+                old_listen: str = self._kcp_config.listen
+                self._kcp_process = new
+                # the draining process would restart the baseline on every sample
+                old.stop_sampling()
+                self._kcp_config.listen, self._kcp_config.upgrade.alt_listen = alt_listen, old_listen
+                # only a front following get_probe_addresses, like a fanin entry, moves its new connections over
+                self._bot_logger.info(f"{self._name} now listening on {alt_listen}, draining {old_listen}")
+                self._drain(old, parse_address(old_listen)[1])
+            else:
+                # no alternate port, the old process has to release it before the staged binary binds it
+                self._kcp_process = new
+                self._stop_and_wait(old)
+                new.launch(kcp_file)
+                if not self._wait_healthy(new, new_config):
+                    self._bot_logger.error(f"{self._name} upgraded kcptun failed its health probe, rolling back to {self._artifact.name}")
+                    self._stop_and_wait(new)
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    self._rollback(new_config)
+                    return
+            self._kcp_file = kcp_file
+            self._artifact = artifact
+            CachedArtifactProvider(self._artifacts, self._state, self._settings.state_config.artifact_ttl).set_kcptun_artifact(self._os, self._arch, artifact)
+            self._bot_logger.info(f"{self._name} upgraded to {artifact.name}")
+
+    def _stop_and_wait(self, process: KCPSystemProcess):
+        process.stop()
+        if not process.wait(self.STOP_TIMEOUT):
+            self._bot_logger.warning(f"{self._name} kcptun ignored SIGTERM for {self.STOP_TIMEOUT:.0f} seconds, killing it")
+            process.kill()
+            process.wait(self.STOP_TIMEOUT)
+
+    def _rollback(self, kcp_config: KCPConfig):
+        """
+        Stages the running release again, the binary of the stopped process is already gone.
+        A failure here leaves the handler down, the executor starts it over on its next cycle.
+        """
+        staging_dir: str = self.get_unique_name()
+        kcp_file, image = self._stage(self._artifact, staging_dir)
+        process: KCPSystemProcess = KCPSystemProcess(self._bot_logger, self.is_client(), kcp_config, self._process_logger, staging_dir, self._resources, image=image, on_exit=self._on_process_exit, series=self._resource_series)
+        self._kcp_process = process
+        process.launch(kcp_file)
+        self._kcp_file = kcp_file
+        if not self._wait_healthy(process, kcp_config):
+            self._bot_logger.error(f"{self._name} rolled back kcptun {self._artifact.name} is not healthy either")
+
+    def _wait_healthy(self, process: KCPSystemProcess, kcp_config: KCPConfig) -> bool:
+        port: int = parse_address(kcp_config.listen)[1]
+        deadline: float = time.time() + self._kcp_config.upgrade.health_timeout
+        while time.time() < deadline:
+            if not process.is_running():
+                return False
+            if is_port_bound(port, udp=not self.is_client()):
+                return True
+            time.sleep(0.5)
+        return False
+
+    def _drain(self, process: KCPSystemProcess, port: int):
+        deadline: float = time.time() + self._kcp_config.upgrade.drain_timeout
+        while process.is_running() and count_established(port) > 0 and time.time() < deadline:
+            time.sleep(1)
+        process.stop()
@@ -0,0 +1,111 @@
+import shutil
+from typing import Optional, Callable
+
+from src.config.settings import BotSettings
+from src.helpers.detector import Arch, OS
+from src.helpers.downloader import Downloader
+from src.helpers.github import Artifact, GithubReleaseClient
+from src.helpers.github_config import GithubConfig
+from src.logger.bot_logger import BotLogger
+from src.mirror.mirror import Mirror
+from src.state.state_store import HandlerState
+
+
+class ArtifactProvider:
+    def get_kcptun_artifact(self, os_: OS, arch: Arch) -> Optional[Artifact]:
+        raise NotImplementedError
+
+    def get_jar_artifact(self, java_version: str) -> Optional[Artifact]:
+        raise NotImplementedError
+
+    def fetch(self, artifact: Artifact, path: str):
+        raise NotImplementedError
+
+    def get_remote_url(self, artifact: Artifact) -> Optional[str]:
+        return None
+
+
+class GithubArtifactProvider(ArtifactProvider):
+    def __init__(self, bot_logger: BotLogger, github_config: Optional[GithubConfig] = None):
+        self._release_client: GithubReleaseClient = GithubReleaseClient(bot_logger, github_config)
+
+    def get_kcptun_artifact(self, os_: OS, arch: Arch) -> Optional[Artifact]:
+        return self._release_client.get_kcptun_artifact(os_, arch)
+
+    def get_jar_artifact(self, java_version: str) -> Optional[Artifact]:
+        return self._release_client.get_jar_artifact(java_version)
+
+    def fetch(self, artifact: Artifact, path: str):
+        Downloader().download(artifact.url, path, artifact.size, artifact.sha256)
+
+
+class MirrorArtifactProvider(ArtifactProvider):
+    def __init__(self, bot_logger: BotLogger, mirror_dir: str, public_url: Optional[str] = None):
+        self._mirror: Mirror = Mirror(bot_logger, mirror_dir)
+        self._public_url: Optional[str] = public_url
+
+    def get_kcptun_artifact(self, os_: OS, arch: Arch) -> Optional[Artifact]:
+        return self._mirror.get_kcptun_artifact(os_, arch)
+
+    def get_jar_artifact(self, java_version: str) -> Optional[Artifact]:
+        return self._mirror.get_jar_artifact(java_version)
+
+    def fetch(self, artifact: Artifact, path: str):
+        shutil.copyfile(self._mirror.get_local_path(artifact), path)
+
+    def get_remote_url(self, artifact: Artifact) -> Optional[str]:
+        if not self._public_url:
+            return None
+        return f"{self._public_url.rstrip('/')}/{artifact.url}"
+
+
+class CachedArtifactProvider(ArtifactProvider):
+    """
+    Trusts the releases a handler resolved before for a while, a failing fetch forgets them.
+    """
+    def __init__(self, provider: ArtifactProvider, state: HandlerState, ttl: int):
+        self._provider: ArtifactProvider = provider
+        self._state: HandlerState = state
+        self._ttl: int = ttl
+        self._keys: dict[str, str] = {}
+
+    def get_kcptun_artifact(self, os_: OS, arch: Arch) -> Optional[Artifact]:
+        return self._get_cached(f"kcptun-{GithubReleaseClient.get_kcptun_key(os_, arch)}", lambda: self._provider.get_kcptun_artifact(os_, arch))
+
+    def get_jar_artifact(self, java_version: str) -> Optional[Artifact]:
+        return self._get_cached(f"jar-{java_version}", lambda: self._provider.get_jar_artifact(java_version))
+
+    def set_kcptun_artifact(self, os_: OS, arch: Arch, artifact: Artifact):
+        self._state.set_fresh(self._get_key(f"kcptun-{GithubReleaseClient.get_kcptun_key(os_, arch)}"), artifact.to_dict())
+
+    def fetch(self, artifact: Artifact, path: str):
+        try:
+            self._provider.fetch(artifact, path)
+        except Exception:
+            if artifact.url in self._keys:
+                self._state.remove(self._keys[artifact.url])
+            raise
+
+    def get_remote_url(self, artifact: Artifact) -> Optional[str]:
+        return self._provider.get_remote_url(artifact)
+
+    def _get_key(self, name: str) -> str:
+        # a mirror and github name the same release differently
+        return f"artifact:{self._provider.__class__.__name__}:{name}"
+
+    def _get_cached(self, name: str, resolve: Callable[[], Optional[Artifact]]) -> Optional[Artifact]:
+        key: str = self._get_key(name)
+        cached: Optional[dict] = self._state.get_fresh(key, self._ttl)
+        artifact: Optional[Artifact] = Artifact.from_dict(cached) if cached else resolve()
+        if not artifact:
+            return None
+        if not cached:
+            self._state.set_fresh(key, artifact.to_dict())
+        self._keys[artifact.url] = key
+        return artifact
+
+
+def get_artifact_provider(bot_logger: BotLogger, settings: BotSettings) -> ArtifactProvider:
+    if settings.mirror_config.offline:
+        return MirrorArtifactProvider(bot_logger, settings.mirror_config.mirror_dir, settings.mirror_config.public_url)
+    return GithubArtifactProvider(bot_logger, settings.github_config)
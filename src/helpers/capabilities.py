@@ -0,0 +1,100 @@
+import re
+import subprocess
+from typing import Final, Optional, Callable
+
+
+class HostCapabilities:
+    def __init__(self, cpu_count: int, aes: bool, mem_available: int, crypt_throughput: Optional[float] = None, rmem_max: Optional[int] = None, wmem_max: Optional[int] = None):
+        self.cpu_count: int = cpu_count
+        self.aes: bool = aes
+        # bytes
+        self.mem_available: int = mem_available
+        # MB/s of aes-128 measured with openssl, None when not measured
+        self.crypt_throughput: Optional[float] = crypt_throughput
+        # socket buffer limits in bytes, None when /proc/sys is not readable
+        self.rmem_max: Optional[int] = rmem_max
+        self.wmem_max: Optional[int] = wmem_max
+
+    def __repr__(self):
+        return f"HostCapabilities[cpu_count={self.cpu_count}, aes={self.aes}, mem_available={self.mem_available}, crypt_throughput={self.crypt_throughput}, rmem_max={self.rmem_max}, wmem_max={self.wmem_max}]"
+
+
+class CapabilityProbe:
+    SEPARATOR: Final[str] = "---KCP-PROBE---"
+    PROBE_COMMAND: Final[str] = f"nproc 2>/dev/null; echo '{SEPARATOR}'; cat /proc/cpuinfo 2>/dev/null; echo '{SEPARATOR}'; cat /proc/meminfo 2>/dev/null; echo '{SEPARATOR}'; cat /proc/sys/net/core/rmem_max /proc/sys/net/core/wmem_max 2>/dev/null"
+    THROUGHPUT_COMMAND: Final[str] = "openssl speed -elapsed -seconds 1 -evp aes-128-cbc 2>/dev/null | tail -n 1"
+    # below this aes-128 throughput (MB/s) the host is considered crypto bound
+    MIN_AES_THROUGHPUT: Final[float] = 100.0
+    MAX_CONN: Final[int] = 4
+    LOW_MEMORY: Final[int] = 128 * 1024 * 1024
+
+    def __init__(self, runner: Callable[[str], str]):
+        """
+        @param runner: runs a shell command on the probed host and returns its stdout.
+        """
+        self._runner: Callable[[str], str] = runner
+
+    @classmethod
+    def local(cls) -> "CapabilityProbe":
+        return cls(lambda command: subprocess.run(command, shell=True, capture_output=True, text=True).stdout)
+
+    def probe(self, throughput_test: bool = False) -> HostCapabilities:
+        capabilities: HostCapabilities = self.parse(self._runner(self.PROBE_COMMAND))
+        if throughput_test:
+            capabilities.crypt_throughput = self.parse_openssl_speed(self._runner(self.THROUGHPUT_COMMAND))
+        return capabilities
+
+    @classmethod
+    def parse(cls, output: str) -> HostCapabilities:
+        parts: list[str] = output.split(cls.SEPARATOR)
+        parts += [""] * (4 - len(parts))
+        nproc, cpuinfo, meminfo, mem_max = parts[:4]
+        cpu_count, aes = cls.parse_cpuinfo(cpuinfo)
+        if nproc.strip().isnumeric():
+            cpu_count = int(nproc.strip())
+        limits: list[str] = mem_max.split()
+        rmem_max: Optional[int] = int(limits[0]) if len(limits) == 2 and all(limit.isnumeric() for limit in limits) else None
+        wmem_max: Optional[int] = int(limits[1]) if rmem_max is not None else None
+        return HostCapabilities(max(cpu_count, 1), aes, cls.parse_meminfo(meminfo), rmem_max=rmem_max, wmem_max=wmem_max)
+
+    @classmethod
+    def parse_cpuinfo(cls, cpuinfo: str) -> (int, bool):
+        cpu_count: int = 0
+        aes: bool = False
+        for line in cpuinfo.splitlines():
+            key, _, value = line.partition(":")
+            key = key.strip().lower()
+            if key == "processor":
+                cpu_count += 1
+            elif key in ("flags", "features") and "aes" in value.split():
+                aes = True
+        return cpu_count, aes
+
+    @classmethod
+    def parse_meminfo(cls, meminfo: str) -> int:
+        values: dict[str, int] = {}
+        for line in meminfo.splitlines():
+            match: Optional[re.Match] = re.match(r"^(\w+):\s+(\d+)\s*kB", line)
+            if match:
+                values[match.group(1)] = int(match.group(2)) * 1024
+        return values.get("MemAvailable", values.get("MemFree", 0))
+
+    @classmethod
+    def parse_openssl_speed(cls, output: str) -> Optional[float]:
+        # last column is the biggest block size, reported in 1000s of bytes per second
+        speeds: list[str] = re.findall(r"([\d.]+)k", output)
+        if not speeds:
+            return None
+        return float(speeds[-1]) / 1000
+
+    @classmethod
+    def select_crypt(cls, capabilities: HostCapabilities) -> str:
+        if capabilities.crypt_throughput is not None:
+            return "aes-128" if capabilities.crypt_throughput >= cls.MIN_AES_THROUGHPUT else "salsa20"
+        return "aes-128" if capabilities.aes else "salsa20"
+
+    @classmethod
+    def select_conn(cls, capabilities: HostCapabilities) -> int:
+        if capabilities.mem_available and capabilities.mem_available < cls.LOW_MEMORY:
+            return 1
+        return max(1, min(capabilities.cpu_count, cls.MAX_CONN))
@@ -0,0 +1,166 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Final
+
+import requests
+from requests import Response
+from urllib3.exceptions import HTTPError
+
+from src.helpers.files import sha256_file
+
+
+class DownloadException(Exception):
+    def __init__(self, msg: str):
+        super(DownloadException, self).__init__(msg)
+
+
+class RangeNotSupportedException(Exception):
+    def __init__(self, msg: str):
+        super(RangeNotSupportedException, self).__init__(msg)
+
+
+class Downloader:
+    """
+    Downloads into <path>.part and only renames it once the size and sha256 match what was published.
+    A dropped connection resumes with a Range request, big files are split in ranges downloaded in parallel.
+    """
+    MIN_CHUNK: Final[int] = 64 * 1024
+    MAX_CHUNK: Final[int] = 4 * 1024 * 1024
+    # files smaller than this are not worth more than one connection
+    PARALLEL_THRESHOLD: Final[int] = 8 * 1024 * 1024
+    # chunk reads faster than FAST_READ grow the chunk, slower than SLOW_READ shrink it
+    FAST_READ: Final[float] = 0.05
+    SLOW_READ: Final[float] = 1.0
+
+    def __init__(self, parts: int = 4, retries: int = 3, timeout: int = 30):
+        self._parts: int = max(1, parts)
+        self._retries: int = retries
+        self._timeout: int = timeout
+        self._headers: dict[str, str] = {"Accept-Encoding": "identity"}
+
+    def download(self, url: str, path: str, size: int = 0, sha256: Optional[str] = None) -> str:
+        """
+        @param size: expected size in bytes, 0 when unknown.
+        @param sha256: expected checksum, None when it is not published.
+        @return: the sha256 of the downloaded file.
+        """
+        part_path: str = f"{path}.part"
+        accept_ranges, remote_size = self._probe(url)
+        if size and remote_size and size != remote_size:
+            raise DownloadException(f"{url} is {remote_size} bytes but {size} were expected")
+        size = size or remote_size
+        if accept_ranges and size >= self.PARALLEL_THRESHOLD and self._parts > 1:
+            try:
+                self._download_ranges(url, part_path, size)
+            except RangeNotSupportedException:
+                self._download_single(url, part_path, accept_ranges, size)
+        else:
+            self._download_single(url, part_path, accept_ranges, size)
+        digest: str = self._verify(part_path, size, sha256)
+        os.replace(part_path, path)
+        return digest
+
+    def _probe(self, url: str) -> (bool, int):
+        try:
+            r: Response = requests.head(url, headers=self._headers, allow_redirects=True, timeout=self._timeout)
+        except requests.RequestException:
+            return False, 0
+        if r.status_code != 200:
+            return False, 0
+        length: str = r.headers.get("Content-Length", "")
+        return r.headers.get("Accept-Ranges", "").lower() == "bytes", int(length) if length.isdigit() else 0
+
+    def _download_single(self, url: str, part_path: str, accept_ranges: bool, size: int):
+        # a part file is only worth resuming when the server honours ranges and it is not from a bigger file
+        if os.path.isfile(part_path) and (not accept_ranges or (size and os.path.getsize(part_path) > size)):
+            os.remove(part_path)
+        self._with_retries(lambda: self._fetch_range(url, part_path, 0, None), url)
+
+    def _download_ranges(self, url: str, part_path: str, size: int):
+        step: int = -(-size // self._parts)
+        ranges: list[tuple[int, int]] = [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+        segments: list[str] = [f"{part_path}.{i}" for i in range(len(ranges))]
+        try:
+            # leaving the executor waits for every segment, none is still written when they are removed
+            with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="DOWNLOADER") as executor:
+                futures = [executor.submit(self._with_retries, lambda s=segment, r=range_: self._fetch_range(url, s, r[0], r[1]), url) for segment, range_ in zip(segments, ranges)]
+                for future in futures:
+                    future.result()
+            with open(part_path, "wb") as part:
+                for segment in segments:
+                    with open(segment, "rb") as f:
+                        while chunk := f.read(self.MAX_CHUNK):
+                            part.write(chunk)
+        finally:
+            # merged, or left behind by a failure or the single stream fallback
+            for segment in segments:
+                if os.path.isfile(segment):
+                    os.remove(segment)
+
+    def _with_retries(self, fetch, url: str):
+        for attempt in range(self._retries + 1):
+            try:
+                return fetch()
+            except (requests.RequestException, HTTPError, ConnectionError, TimeoutError) as e:
+                if attempt == self._retries:
+                    raise DownloadException(f"Unable to download {url}: {e}")
+                time.sleep(min(2 ** attempt, 10))
+
+    def _fetch_range(self, url: str, segment_path: str, start: int, end: Optional[int]):
+        """
+        Downloads bytes start..end (inclusive, None for the end of the file) into segment_path, resuming what is already there.
+        """
+        done: int = os.path.getsize(segment_path) if os.path.isfile(segment_path) else 0
+        if end is not None and done > end - start + 1:
+            os.remove(segment_path)
+            done = 0
+        if end is not None and done == end - start + 1:
+            return
+        headers: dict[str, str] = dict(self._headers)
+        if start + done > 0 or end is not None:
+            headers["Range"] = f"bytes={start + done}-{'' if end is None else end}"
+        with requests.get(url, headers=headers, stream=True, timeout=self._timeout) as r:
+            if r.status_code == 416 and end is None:
+                # the part file already holds the whole file
+                return
+            if r.status_code == 200 and "Range" in headers:
+                if end is not None:
+                    raise RangeNotSupportedException(f"{url} ignored the range request")
+                done = 0
+            elif r.status_code not in (200, 206):
+                raise DownloadException(f"Unable to download {url}, got status code {r.status_code}!")
+            with open(segment_path, "ab" if done else "wb") as f:
+                written: int = self._copy(r, f)
+            length: str = r.headers.get("Content-Length", "")
+            if length.isdigit() and written < int(length):
+                # retried by _with_retries, which resumes from what was written
+                raise ConnectionError(f"connection closed after {written} of {length} bytes")
+
+    def _copy(self, r: Response, f) -> int:
+        chunk_size: int = self.MIN_CHUNK
+        written: int = 0
+        while True:
+            started: float = time.perf_counter()
+            chunk: bytes = r.raw.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+            written += len(chunk)
+            elapsed: float = time.perf_counter() - started
+            if elapsed < self.FAST_READ:
+                chunk_size = min(chunk_size * 2, self.MAX_CHUNK)
+            elif elapsed > self.SLOW_READ:
+                chunk_size = max(chunk_size // 2, self.MIN_CHUNK)
+        return written
+
+    def _verify(self, part_path: str, size: int, sha256: Optional[str]) -> str:
+        actual_size: int = os.path.getsize(part_path)
+        if size and actual_size != size:
+            os.remove(part_path)
+            raise DownloadException(f"{part_path} is {actual_size} bytes but {size} were expected")
+        digest: str = sha256_file(part_path)
+        if sha256 and digest != sha256.lower():
+            os.remove(part_path)
+            raise DownloadException(f"Checksum mismatch for {part_path}, expected {sha256} got {digest}")
+        return digest
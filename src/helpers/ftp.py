@@ -1,4 +1,5 @@
 import ftplib
+from typing import Optional
 
 
 class FTPFile:
@@ -26,6 +27,9 @@ class FTPProcessor:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
         self._ftp.close()
 
     @classmethod
@@ -49,9 +53,60 @@ class FTPProcessor:
         self._ftp.storbinary(f"STOR {file_name}", open(file_path, "rb"))
         self._ftp.cwd("/")
 
+    def size(self, file_path: str) -> Optional[int]:
+        """
+        @return: None when the file does not exist.
+        """
+        self._ftp.voidcmd("TYPE I")
+        try:
+            return self._ftp.size(file_path)
+        except ftplib.error_perm:
+            return None
+
+    def read_from(self, file_path: str, offset: int) -> bytes:
+        """
+        Downloads the file from offset on, REST makes the server skip what was already read.
+        """
+        chunks: list[bytes] = []
+        self._ftp.retrbinary(f"RETR {file_path}", chunks.append, rest=offset if offset else None)
+        return b"".join(chunks)
+
     def list_files(self, base_path: str = "/") -> list[FTPFile]:
         data: list = []
         self._ftp.cwd(base_path)
         self._ftp.dir(data.append)
         self._ftp.cwd("/")
         return self.get_files(data)
+
+
+class FTPLogTail:
+    """
+    Follows a log file that is only appended to, every read downloads just the new bytes.
+    """
+    def __init__(self, ftp: FTPProcessor, file_path: str):
+        self._ftp: FTPProcessor = ftp
+        self._file_path: str = file_path
+        # lines already in the file belong to an older run
+        self._offset: int = ftp.size(file_path) or 0
+        self._partial: bytes = b""
+
+    def get_offset(self) -> int:
+        return self._offset
+
+    def read_lines(self) -> list[str]:
+        size: Optional[int] = self._ftp.size(self._file_path)
+        if size is None:
+            return []
+        if size < self._offset:
+            # truncated or replaced, start over
+            self._offset, self._partial = 0, b""
+        if size == self._offset:
+            return []
+        data: bytes = self._ftp.read_from(self._file_path, self._offset)
+        self._offset += len(data)
+        lines: list[bytes] = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        return [line.decode("utf-8", errors="replace").rstrip("\r") for line in lines]
+
+    def close(self):
+        self._ftp.close()
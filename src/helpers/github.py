@@ -0,0 +1,154 @@
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Any
+
+import requests
+from requests import Response
+
+from src.constant import KCPTUN_URL, KCP_JAR_URL
+from src.helpers.detector import Arch, OS
+from src.helpers.github_config import GithubConfig
+from src.kcp.kcp import GithubDownloadException
+from src.logger.bot_logger import BotLogger
+
+
+class Artifact:
+    def __init__(self, name: str, url: str, size: int = 0, sha256: Optional[str] = None):
+        self.name: str = name
+        self.url: str = url
+        self.size: int = size
+        self.sha256: Optional[str] = sha256
+
+    @classmethod
+    def from_asset(cls, asset: dict) -> "Artifact":
+        digest: str = asset.get("digest") or ""
+        sha256: Optional[str] = digest.split(":", 1)[1] if digest.startswith("sha256:") else None
+        return cls(asset.get("name"), asset.get("browser_download_url"), asset.get("size") or 0, sha256)
+
+    @classmethod
+    def from_dict(cls, instance: dict) -> "Artifact":
+        return cls(instance.get("name"), instance.get("url"), instance.get("size") or 0, instance.get("sha256"))
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "url": self.url, "size": self.size, "sha256": self.sha256}
+
+    def __repr__(self):
+        return f"Artifact[name={self.name}, url={self.url}, size={self.size}, sha256={self.sha256}]"
+
+
+class CachedResponse:
+    def __init__(self, etag: Optional[str], data: Any):
+        self.etag: Optional[str] = etag
+        self.data: Any = data
+        self.fetched: float = time.time()
+
+
+class GithubReleaseClient:
+    """
+    The api allows 60 unauthenticated calls per hour and ip, so every client shares what it learns about the quota.
+    Responses are revalidated with their ETag (a 304 does not count against the quota) and reused when the quota runs low.
+    """
+    _lock: threading.Lock = threading.Lock()
+    _remaining: Optional[int] = None
+    _reset: float = 0.0
+    _responses: dict[str, CachedResponse] = {}
+
+    def __init__(self, bot_logger: BotLogger, github_config: Optional[GithubConfig] = None):
+        self._bot_logger: BotLogger = bot_logger
+        self._config: GithubConfig = github_config if github_config else GithubConfig()
+
+    @classmethod
+    def get_rate_limit(cls) -> (Optional[int], float):
+        return cls._remaining, cls._reset
+
+    def _get_headers(self, cached: Optional[CachedResponse]) -> dict[str, str]:
+        headers: dict[str, str] = {"Accept": "application/vnd.github+json"}
+        if self._config.token:
+            headers["Authorization"] = f"Bearer {self._config.token}"
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        return headers
+
+    def _update_rate_limit(self, r: Response):
+        remaining: str = r.headers.get("X-RateLimit-Remaining", "")
+        reset: str = r.headers.get("X-RateLimit-Reset", "")
+        if remaining.isdigit():
+            GithubReleaseClient._remaining = int(remaining)
+        if reset.isdigit():
+            GithubReleaseClient._reset = float(reset)
+
+    def _is_limited(self) -> bool:
+        if time.time() >= GithubReleaseClient._reset:
+            return False
+        return GithubReleaseClient._remaining is not None and GithubReleaseClient._remaining <= self._config.min_remaining
+
+    def _use_cached(self, cached: Optional[CachedResponse], reason: str) -> Any:
+        reset: str = datetime.fromtimestamp(GithubReleaseClient._reset).strftime("%H:%M:%S")
+        if not cached:
+            raise GithubDownloadException(f"Unable to get a valid release, {reason} until {reset} and there is no known release yet!")
+        self._bot_logger.warning(f"Github {reason} until {reset}, using the last known release")
+        return cached.data
+
+    def _get_json(self, url: str) -> Any:
+        with GithubReleaseClient._lock:
+            cached: Optional[CachedResponse] = GithubReleaseClient._responses.get(url)
+            if cached and time.time() - cached.fetched < self._config.cache_ttl:
+                return cached.data
+            if self._is_limited():
+                return self._use_cached(cached, "api rate limit is almost exhausted")
+            try:
+                r: Response = requests.get(url, headers=self._get_headers(cached), timeout=30)
+            except Exception as e:
+                if cached:
+                    self._bot_logger.warning(f"Unable to reach github {e}, using the last known release")
+                    return cached.data
+                self._bot_logger.error(f"Unable to get valid KCP assets {e}")
+                raise GithubDownloadException(f"Unable to get valid KCP assets {e}")
+            self._update_rate_limit(r)
+            if r.status_code == 304 and cached:
+                cached.fetched = time.time()
+                return cached.data
+            if r.status_code == 429 or (r.status_code == 403 and GithubReleaseClient._remaining == 0):
+                retry_after: str = r.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    GithubReleaseClient._remaining, GithubReleaseClient._reset = 0, time.time() + int(retry_after)
+                return self._use_cached(cached, "api rate limit exhausted")
+            if r.status_code != 200:
+                raise GithubDownloadException(f"Unable to get a valid release, got status code {r.status_code}!")
+            data: Any = r.json()
+            GithubReleaseClient._responses[url] = CachedResponse(r.headers.get("ETag"), data)
+            return data
+
+    @classmethod
+    def get_kcptun_key(cls, os_: OS, arch: Arch) -> str:
+        return f"{os_.value}-{arch.value}"
+
+    def get_kcptun_artifacts(self) -> dict[str, Artifact]:
+        assets: list[dict] = self._get_json(KCPTUN_URL).get("assets")
+        artifacts: dict[str, Artifact] = {}
+        for os_ in OS:
+            for arch in Arch:
+                ver: str = rf"^kcptun-{os_.value}-{arch.value}-\d+.tar.gz$"
+                for asset in assets:
+                    if re.search(ver, asset.get("name")):
+                        artifacts[self.get_kcptun_key(os_, arch)] = Artifact.from_asset(asset)
+                        break
+        return artifacts
+
+    def get_kcptun_artifact(self, os_: OS, arch: Arch) -> Optional[Artifact]:
+        return self.get_kcptun_artifacts().get(self.get_kcptun_key(os_, arch))
+
+    def get_jar_artifacts(self) -> dict[str, Artifact]:
+        artifacts: dict[str, Artifact] = {}
+        for release in self._get_json(KCP_JAR_URL):
+            assets: list[dict] = release.get("assets")
+            if not release.get("name") or not assets or release.get("name") in artifacts:
+                continue
+            artifacts[release.get("name")] = Artifact.from_asset(assets[0])
+        return artifacts
+
+    def get_jar_artifact(self, java_version: str) -> Optional[Artifact]:
+        return self.get_jar_artifacts().get(f"java-{java_version}")
+
@@ -0,0 +1,12 @@
+import os
+from typing import Optional
+
+
+class GithubConfig:
+    def __init__(self, token: Optional[str] = None, min_remaining: int = 5, cache_ttl: int = 60):
+        # falls back to the GITHUB_TOKEN environment variable
+        self.token: Optional[str] = token if token else os.environ.get("GITHUB_TOKEN")
+        # below this many remaining api calls the last known releases are used instead
+        self.min_remaining: int = min_remaining
+        # seconds a release lookup is shared by every handler without asking github again
+        self.cache_ttl: int = cache_ttl
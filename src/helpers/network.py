@@ -0,0 +1,106 @@
+import errno
+import re
+import socket
+import time
+from typing import Optional
+
+
+def parse_address(address: str) -> (str, int):
+    host, _, port = address.rpartition(":")
+    return host.strip("[]"), int(port)
+
+
+def tcp_rtt(address: str, timeout: float) -> Optional[float]:
+    """
+    Measures a TCP handshake against address, a refused connection still answers so it counts as a sample.
+    @return: round trip time in ms or None when the host did not answer in time.
+    """
+    host, port = parse_address(address)
+    try:
+        family, type_, proto, _, sockaddr = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+    except socket.gaierror:
+        return None
+    s: socket.socket = socket.socket(family, type_, proto)
+    s.settimeout(timeout)
+    start: float = time.perf_counter()
+    try:
+        s.connect(sockaddr)
+    except ConnectionRefusedError:
+        pass
+    except OSError as e:
+        if e.errno != errno.ECONNREFUSED:
+            return None
+    finally:
+        s.close()
+    return (time.perf_counter() - start) * 1000
+
+
+def _read_proc_net(protocols: tuple[str, ...]) -> list[tuple[int, str]]:
+    entries: list[tuple[int, str]] = []
+    for protocol in protocols:
+        try:
+            with open(f"/proc/net/{protocol}") as f:
+                lines: list[str] = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields: list[str] = line.split()
+            if len(fields) < 4:
+                continue
+            entries.append((int(fields[1].rsplit(":", 1)[1], 16), fields[3]))
+    return entries
+
+
+def count_established(port: int) -> int:
+    return sum(1 for local_port, state in _read_proc_net(("tcp", "tcp6")) if local_port == port and state == "01")
+
+
+def is_port_bound(port: int, udp: bool = False) -> bool:
+    if udp:
+        return any(local_port == port for local_port, _ in _read_proc_net(("udp", "udp6")))
+    return any(local_port == port and state == "0A" for local_port, state in _read_proc_net(("tcp", "tcp6")))
+
+
+def check_bind(address: str, udp: bool = False) -> Optional[str]:
+    """
+    Binds address the way kcptun would and releases it at once.
+    @return: the error when the address can not be bound, None when it is free.
+    """
+    host, port = parse_address(address)
+    try:
+        family, type_, proto, _, sockaddr = socket.getaddrinfo(host or None, port, type=socket.SOCK_DGRAM if udp else socket.SOCK_STREAM, flags=socket.AI_PASSIVE)[0]
+    except socket.gaierror as e:
+        return str(e)
+    s: socket.socket = socket.socket(family, type_, proto)
+    try:
+        if not udp:
+            # go listeners set it as well, a port in TIME_WAIT is not a conflict
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(sockaddr)
+    except OSError as e:
+        return str(e)
+    finally:
+        s.close()
+    return None
+
+
+def check_resolve(address: str) -> Optional[str]:
+    """
+    @return: the error when the host of address does not resolve, None when it does.
+    """
+    host, port = parse_address(address)
+    if not host:
+        return None
+    try:
+        socket.getaddrinfo(host, port)
+    except socket.gaierror as e:
+        return str(e)
+    return None
+
+
+def parse_ping_rtt(output: str) -> Optional[float]:
+    """
+    @return: the average rtt in ms from the summary line of iputils or busybox ping.
+    """
+    match: Optional[re.Match] = re.search(r"= [\d.]+/([\d.]+)/", output)
+    return float(match.group(1)) if match else None
@@ -0,0 +1,99 @@
+import errno
+import os
+import socket
+import threading
+from typing import Final, Optional
+
+# bytes moved per call, the default capacity of a linux pipe
+CHUNK: Final[int] = 65536
+
+
+class RelayException(OSError):
+    def __init__(self, msg: str, moved: int):
+        super(RelayException, self).__init__(msg)
+        # bytes written to the destination before the connection broke
+        self.moved: int = moved
+
+
+def _can_splice() -> bool:
+    return hasattr(os, "splice")
+
+
+def _splice(source: socket.socket, destination: socket.socket) -> Optional[int]:
+    """
+    Moves bytes socket to pipe to socket inside the kernel, they are never copied into python.
+    @return: bytes moved until the source closed, None when the sockets can not be spliced and nothing was read yet.
+    """
+    read_fd, write_fd = os.pipe()
+    moved: int = 0
+    first: bool = True
+    try:
+        while True:
+            pending: int = os.splice(source.fileno(), write_fd, CHUNK, flags=os.SPLICE_F_MOVE | os.SPLICE_F_MORE)
+            first = False
+            if not pending:
+                return moved
+            while pending:
+                sent: int = os.splice(read_fd, destination.fileno(), pending, flags=os.SPLICE_F_MOVE | os.SPLICE_F_MORE)
+                pending -= sent
+                moved += sent
+    except OSError as e:
+        # only a refused first read can fall back, later the pipe may hold bytes closing it would drop
+        if first and e.errno == errno.EINVAL:
+            return None
+        raise RelayException(str(e), moved) from e
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def _copy(source: socket.socket, destination: socket.socket) -> int:
+    buffer: bytearray = bytearray(CHUNK)
+    view: memoryview = memoryview(buffer)
+    moved: int = 0
+    try:
+        while read := source.recv_into(buffer):
+            destination.sendall(view[:read])
+            moved += read
+    except OSError as e:
+        raise RelayException(str(e), moved) from e
+    return moved
+
+
+def pump(source: socket.socket, destination: socket.socket) -> int:
+    """
+    Forwards source to destination until source closes, then closes the write side of destination.
+    Spliced on linux, copied through a reused buffer where splice is missing or refuses the sockets.
+    @return: bytes forwarded, a reset keeps the count reached before it.
+    """
+    moved: int = 0
+    try:
+        spliced: Optional[int] = _splice(source, destination) if _can_splice() else None
+        moved = spliced if spliced is not None else _copy(source, destination)
+    except RelayException as e:
+        moved = e.moved
+        # a reset on one side, the other direction must not wait for a close that never comes
+        for s in (source, destination):
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    finally:
+        try:
+            destination.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+    return moved
+
+
+def relay(client: socket.socket, upstream: socket.socket) -> (int, int):
+    """
+    Forwards both directions until both sides closed, the sockets must be blocking.
+    @return: bytes sent upstream and bytes sent back to the client.
+    """
+    result: list[int] = [0]
+    back: threading.Thread = threading.Thread(target=lambda: result.__setitem__(0, pump(upstream, client)), name="RELAY", daemon=True)
+    back.start()
+    sent: int = pump(client, upstream)
+    back.join()
+    return sent, result[0]
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import deque
+from typing import Optional, Callable, Final
+
+from src.decorators.background import background
+from src.kcp.adapt_config import AdaptConfig, AdaptProfile
+from src.kcp.snmp import TunnelSample
+from src.logger.bot_logger import BotLogger
+
+
+class ProfileLadder:
+    """
+    Moves one profile up when the current one's limits are exceeded and one down once the link is well within the lighter profile's limits.
+    """
+    # the lighter profile is only taken back below this share of its limits
+    HYSTERESIS: Final[float] = 0.5
+
+    def __init__(self, profiles: list[AdaptProfile], rounds: int, current: int = 0):
+        self._profiles: list[AdaptProfile] = profiles
+        self._rounds: int = rounds
+        self._current: int = current
+        self._direction: int = 0
+        self._direction_rounds: int = 0
+
+    def get_current(self) -> int:
+        return self._current
+
+    def set_current(self, index: int):
+        self._current = index
+        self._direction, self._direction_rounds = 0, 0
+
+    @classmethod
+    def _exceeds(cls, profile: AdaptProfile, sample: TunnelSample, share: float) -> Optional[bool]:
+        """
+        @return: None when the sample does not have what the profile limits.
+        """
+        checks: list[bool] = []
+        loss: Optional[float] = sample.get_loss()
+        if profile.max_loss is not None and loss is not None:
+            checks.append(loss > profile.max_loss * share)
+        if profile.max_rtt is not None and sample.rtt is not None:
+            checks.append(sample.rtt > profile.max_rtt * share)
+        return any(checks) if checks else None
+
+    def evaluate(self, sample: TunnelSample) -> Optional[int]:
+        """
+        Called once per statistics window.
+        @return: the profile index to move to once the move was asked for enough windows in a row.
+        """
+        direction: int = 0
+        if self._current < len(self._profiles) - 1 and self._exceeds(self._profiles[self._current], sample, 1.0):
+            direction = 1
+        elif self._current > 0 and self._exceeds(self._profiles[self._current - 1], sample, self.HYSTERESIS) is False:
+            direction = -1
+        if direction == 0 or direction != self._direction:
+            self._direction, self._direction_rounds = direction, 0
+        if direction == 0:
+            return None
+        self._direction_rounds += 1
+        if self._direction_rounds < self._rounds:
+            return None
+        self.set_current(self._current + direction)
+        return self._current
+
+
+class AdaptiveController:
+    def __init__(self, bot_logger: BotLogger, name: str, config: AdaptConfig, get_sample: Callable[[], Optional[TunnelSample]], on_switch: Callable[[AdaptProfile], None], current: int = 0):
+        """
+        @param get_sample: statistics of the last window, None when there is no new window.
+        @param on_switch: applies the profile and restarts kcptun.
+        """
+        self._bot_logger: BotLogger = bot_logger
+        self._name: str = name
+        self._config: AdaptConfig = config
+        self._get_sample: Callable[[], Optional[TunnelSample]] = get_sample
+        self._on_switch: Callable[[AdaptProfile], None] = on_switch
+        self._ladder: ProfileLadder = ProfileLadder(config.profiles, config.rounds, current)
+        self._switched: Optional[float] = None
+        self._switches: deque[float] = deque()
+        self._last_unix: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop: threading.Event = threading.Event()
+
+    def get_profile(self) -> AdaptProfile:
+        return self._config.profiles[self._ladder.get_current()]
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = self._monitor()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_rate_limited(self, now: float) -> bool:
+        while self._switches and now - self._switches[0] > 3600:
+            self._switches.popleft()
+        if self._switched is not None and now - self._switched < self._config.dwell:
+            return True
+        return len(self._switches) >= self._config.max_switches
+
+    def evaluate(self, sample: TunnelSample, now: Optional[float] = None) -> Optional[AdaptProfile]:
+        """
+        @return: the profile to switch to, already counted against the rate limits.
+        """
+        now = now if now is not None else time.monotonic()
+        if sample.unix and sample.unix == self._last_unix:
+            # kcptun did not write a new window yet
+            return None
+        self._last_unix = sample.unix
+        if self.is_rate_limited(now):
+            return None
+        current: int = self._ladder.get_current()
+        target: Optional[int] = self._ladder.evaluate(sample)
+        if target is None:
+            return None
+        self._switched = now
+        self._switches.append(now)
+        profile: AdaptProfile = self._config.profiles[target]
+        self._bot_logger.warning(f"{self._name} {sample} moving from profile {self._config.profiles[current].name} to {profile.name}")
+        return profile
+
+    @background("ADAPT_CONTROLLER")
+    def _monitor(self):
+        while not self._stop.wait(self._config.interval):
+            try:
+                sample: Optional[TunnelSample] = self._get_sample()
+                profile: Optional[AdaptProfile] = self.evaluate(sample) if sample else None
+            except Exception as e:
+                self._bot_logger.error(f"{self._name} adaptive controller failed: {e}")
+                continue
+            if profile:
+                self._on_switch(profile)
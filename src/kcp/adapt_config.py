@@ -0,0 +1,31 @@
+from typing import Optional
+
+
+class AdaptProfile:
+    def __init__(self, name: str, mode: str = "fast3", datashard: Optional[int] = None, parityshard: Optional[int] = None, max_loss: Optional[float] = None, max_rtt: Optional[int] = None):
+        self.name: str = name
+        self.mode: str = mode
+        # the other end of the tunnel must use the same shards, a profile that changes them needs a server that follows
+        self.datashard: Optional[int] = datashard
+        self.parityshard: Optional[int] = parityshard
+        # % of the sent segments that were retransmitted, above it the next profile takes over
+        self.max_loss: Optional[float] = max_loss
+        # ms of probe rtt, above it the next profile takes over
+        self.max_rtt: Optional[int] = max_rtt
+
+    def __repr__(self):
+        return f"AdaptProfile[{self.name}: mode={self.mode}, datashard={self.datashard}, parityshard={self.parityshard}]"
+
+
+class AdaptConfig:
+    def __init__(self, profiles: list[AdaptProfile], interval: int = 60, rounds: int = 3, dwell: int = 600, max_switches: int = 4):
+        # lightest first, every profile is more robust than the one before
+        self.profiles: list[AdaptProfile] = profiles
+        # seconds per statistics window, also the kcptun snmp period
+        self.interval: int = interval
+        # consecutive windows a move has to be asked for
+        self.rounds: int = rounds
+        # seconds on a profile before the next move
+        self.dwell: int = dwell
+        # moves allowed in an hour
+        self.max_switches: int = max_switches
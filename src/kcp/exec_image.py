@@ -0,0 +1,84 @@
+import os
+import tempfile
+from typing import Optional, Final
+
+
+class ExecImageException(Exception):
+    def __init__(self, msg: str):
+        super(ExecImageException, self).__init__(msg)
+
+
+class ExecImage:
+    """
+    Executable that never touches the disk: a memfd when the kernel has memfd_create, a file on a tmpfs otherwise.
+    The memfd is executed through /proc/<pid>/fd so it stays valid while this process keeps it open.
+    """
+    TMPFS_DIRS: Final[tuple[str, ...]] = ("/dev/shm", "/run/shm")
+
+    def __init__(self, path: str, fd: Optional[int] = None):
+        self._path: str = path
+        self._fd: Optional[int] = fd
+        self._closed: bool = False
+
+    @classmethod
+    def load(cls, data: bytes, name: str, memfd: bool = True) -> "ExecImage":
+        """
+        @param memfd: False to go straight to the tmpfs staging.
+        """
+        if memfd and hasattr(os, "memfd_create") and os.path.isdir(f"/proc/{os.getpid()}/fd"):
+            try:
+                fd: int = os.memfd_create(name, os.MFD_CLOEXEC)
+            except OSError:
+                pass
+            else:
+                try:
+                    cls._write(fd, data)
+                    os.fchmod(fd, 0o700)
+                except OSError:
+                    os.close(fd)
+                    raise
+                return cls(f"/proc/{os.getpid()}/fd/{fd}", fd)
+        tmpfs: Optional[str] = cls.get_tmpfs()
+        if not tmpfs:
+            raise ExecImageException("Neither memfd_create nor an exec tmpfs are available for an in memory binary")
+        fd, path = tempfile.mkstemp(prefix=f"{name}-", dir=tmpfs)
+        try:
+            cls._write(fd, data)
+            os.fchmod(fd, 0o700)
+        except OSError:
+            os.remove(path)
+            raise
+        finally:
+            os.close(fd)
+        return cls(path)
+
+    @classmethod
+    def get_tmpfs(cls) -> Optional[str]:
+        for directory in cls.TMPFS_DIRS:
+            try:
+                if os.path.isdir(directory) and os.access(directory, os.W_OK) and not os.statvfs(directory).f_flag & os.ST_NOEXEC:
+                    return directory
+            except OSError:
+                continue
+        return None
+
+    @classmethod
+    def _write(cls, fd: int, data: bytes):
+        view: memoryview = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
+    def get_path(self) -> str:
+        return self._path
+
+    def is_memfd(self) -> bool:
+        return self._fd is not None
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._fd is not None:
+            os.close(self._fd)
+        elif os.path.isfile(self._path):
+            os.remove(self._path)
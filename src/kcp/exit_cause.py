@@ -0,0 +1,92 @@
+import re
+import threading
+from enum import Enum
+from typing import Optional, Final, Pattern
+
+
+class ExitCause(Enum):
+    BIND_CONFLICT = "bind conflict"
+    BAD_ARGS = "bad arguments"
+    CRYPT_MISMATCH = "crypt mismatch"
+    TRANSIENT = "transient network"
+    UNKNOWN = "unknown"
+
+    def is_permanent(self) -> bool:
+        # retrying the same command can not fix these, the config or the host has to change
+        return self in (ExitCause.BIND_CONFLICT, ExitCause.BAD_ARGS, ExitCause.CRYPT_MISMATCH)
+
+
+class PreflightException(Exception):
+    def __init__(self, msg: str, cause: ExitCause = ExitCause.UNKNOWN):
+        super(PreflightException, self).__init__(msg)
+        self.cause: ExitCause = cause
+
+
+class ExitClassifier:
+    """
+    Maps kcptun output (go net errors, urfave/cli and flag usage errors, smux and kcp-go errors) to an exit cause.
+    """
+    PATTERNS: Final[list[tuple[ExitCause, Pattern[str]]]] = [
+        (ExitCause.BIND_CONFLICT, re.compile(r"address already in use|bind: permission denied|cannot assign requested address|only one usage of each socket address", re.I)),
+        (ExitCause.BAD_ARGS, re.compile(r"incorrect usage|flag provided but not defined|invalid value .* for flag|unknown flag|missing port in address|invalid port|unknown crypt", re.I)),
+        (ExitCause.CRYPT_MISMATCH, re.compile(r"invalid protocol|checksum mismatch|cipher: message authentication failed|decrypt", re.I)),
+        (ExitCause.TRANSIENT, re.compile(r"connection refused|connection reset|network is unreachable|no route to host|i/o timeout|temporary failure in name resolution|no such host|broken pipe", re.I))
+    ]
+
+    @classmethod
+    def classify(cls, lines: list[str], exit_code: Optional[int]) -> (ExitCause, Optional[str]):
+        """
+        @param exit_code: negative when killed by a signal, a stop from the bot counts as transient.
+        @return: the cause and the output line that gave it away.
+        """
+        for cause, pattern in cls.PATTERNS:
+            for line in lines:
+                if pattern.search(line):
+                    return cause, line
+        if exit_code is not None and exit_code < 0:
+            return ExitCause.TRANSIENT, None
+        return ExitCause.UNKNOWN, None
+
+
+class ExitBackoff:
+    """
+    Quick retries for transient exits, exponential ones for exits that repeat for a permanent cause.
+    """
+    TRANSIENT_DELAY: Final[float] = 5.0
+    UNKNOWN_DELAY: Final[float] = 30.0
+    PERMANENT_BASE: Final[float] = 300.0
+    PERMANENT_MAX: Final[float] = 3600.0
+
+    def __init__(self):
+        self._lock: threading.Lock = threading.Lock()
+        self._cause: Optional[ExitCause] = None
+        self._strikes: int = 0
+        self._delay: Optional[float] = None
+
+    def record(self, cause: ExitCause) -> float:
+        with self._lock:
+            if cause.is_permanent():
+                self._strikes = self._strikes + 1 if cause == self._cause else 1
+                self._delay = min(self.PERMANENT_BASE * 2 ** (self._strikes - 1), self.PERMANENT_MAX)
+            else:
+                self._strikes = 0
+                self._delay = self.TRANSIENT_DELAY if cause == ExitCause.TRANSIENT else self.UNKNOWN_DELAY
+            self._cause = cause
+            return self._delay
+
+    def reset(self):
+        with self._lock:
+            self._cause = None
+            self._strikes = 0
+            self._delay = None
+
+    def get_cause(self) -> Optional[ExitCause]:
+        with self._lock:
+            return self._cause
+
+    def get_delay(self) -> Optional[float]:
+        """
+        @return: None when no exit was classified, the executor default applies.
+        """
+        with self._lock:
+            return self._delay
@@ -0,0 +1,144 @@
+import math
+import threading
+from typing import Optional, Callable, Final
+
+from src.decorators.background import background
+from src.helpers.network import tcp_rtt
+from src.kcp.failover_config import FailoverConfig
+from src.logger.bot_logger import BotLogger
+
+
+class RemoteStats:
+    # a lost probe weighs like this many ms of latency
+    LOSS_PENALTY: Final[float] = 1000.0
+    ALPHA: Final[float] = 0.3
+
+    def __init__(self):
+        self.rtt: Optional[float] = None
+        self.loss: float = 0.0
+
+    def update(self, samples: list[Optional[float]]):
+        answered: list[float] = [s for s in samples if s is not None]
+        loss: float = 1 - len(answered) / len(samples) if samples else 1.0
+        self.loss = loss if self.rtt is None else self.ALPHA * loss + (1 - self.ALPHA) * self.loss
+        if answered:
+            rtt: float = sum(answered) / len(answered)
+            self.rtt = rtt if self.rtt is None else self.ALPHA * rtt + (1 - self.ALPHA) * self.rtt
+
+    def score(self) -> float:
+        if self.rtt is None:
+            return float("inf")
+        return self.rtt + self.loss * self.LOSS_PENALTY
+
+    def __repr__(self):
+        return f"RemoteStats[rtt={self.rtt}, loss={self.loss}]"
+
+
+class RemoteSelector:
+    def __init__(self, remotes: list[str], margin: float, rounds: int):
+        self._stats: dict[str, RemoteStats] = {remote: RemoteStats() for remote in remotes}
+        self._margin: float = margin
+        self._rounds: int = rounds
+        self._candidate: Optional[str] = None
+        self._candidate_rounds: int = 0
+
+    def get_stats(self, remote: str) -> RemoteStats:
+        return self._stats[remote]
+
+    def has_samples(self) -> bool:
+        return any(stats.rtt is not None for stats in self._stats.values())
+
+    def update(self, remote: str, samples: list[Optional[float]]):
+        self._stats[remote].update(samples)
+
+    def get_best(self) -> str:
+        return min(self._stats.keys(), key=lambda remote: self._stats[remote].score())
+
+    def evaluate(self, current: str) -> Optional[str]:
+        """
+        Called once per probe round.
+        @return: the remote to switch to once it has beaten the current one by the margin for enough rounds.
+        """
+        best: str = self.get_best()
+        current_score, best_score = self._stats[current].score(), self._stats[best].score()
+        # a remote that never answered a handshake may only drop tcp, and two of them give inf - inf = nan
+        if best == current or not math.isfinite(current_score) or not math.isfinite(best_score) or current_score - best_score <= self._margin:
+            self._candidate, self._candidate_rounds = None, 0
+            return None
+        if best != self._candidate:
+            self._candidate, self._candidate_rounds = best, 0
+        self._candidate_rounds += 1
+        if self._candidate_rounds < self._rounds:
+            return None
+        self._candidate, self._candidate_rounds = None, 0
+        return best
+
+
+class FailoverMonitor:
+    def __init__(self, bot_logger: BotLogger, name: str, remotes: list[str], failover_config: FailoverConfig, get_current: Callable[[], str], on_switch: Callable[[str], None]):
+        self._bot_logger: BotLogger = bot_logger
+        self._name: str = name
+        self._remotes: list[str] = remotes
+        self._config: FailoverConfig = failover_config
+        self._selector: RemoteSelector = RemoteSelector(remotes, failover_config.margin, failover_config.rounds)
+        self._get_current: Callable[[], str] = get_current
+        self._on_switch: Callable[[str], None] = on_switch
+        self._lock: threading.Lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop: threading.Event = threading.Event()
+        self._silent_warned: set[str] = set()
+
+    def get_selector(self) -> RemoteSelector:
+        return self._selector
+
+    def probe_round(self):
+        """
+        kcptun speaks udp, the probes are tcp handshakes to the same port: the remote host has to accept or refuse them.
+        """
+        for remote in self._remotes:
+            samples: list[Optional[float]] = [tcp_rtt(remote, self._config.timeout) for _ in range(self._config.samples)]
+            with self._lock:
+                self._selector.update(remote, samples)
+                silent: bool = self._selector.get_stats(remote).rtt is None
+            if silent and remote not in self._silent_warned:
+                self._silent_warned.add(remote)
+                self._bot_logger.warning(f"{self._name} remote {remote} did not answer a tcp handshake, failover only scores hosts that accept or refuse tcp on the kcptun port")
+
+    def get_best(self) -> str:
+        if not self._selector.has_samples():
+            self.probe_round()
+        with self._lock:
+            return self._selector.get_best()
+
+    def get_alternative(self, current: str) -> Optional[str]:
+        """
+        @return: the best scored remote other than current, None when there is no other.
+        """
+        with self._lock:
+            others: list[str] = [remote for remote in self._remotes if remote != current]
+            return min(others, key=lambda remote: self._selector.get_stats(remote).score()) if others else None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = self._monitor()
+
+    def stop(self):
+        self._stop.set()
+
+    @background("FAILOVER_MONITOR")
+    def _monitor(self):
+        while not self._stop.wait(self._config.interval):
+            try:
+                self.probe_round()
+            except Exception as e:
+                self._bot_logger.error(f"{self._name} failover probe failed: {e}")
+                continue
+            current: str = self._get_current()
+            with self._lock:
+                switch_to: Optional[str] = self._selector.evaluate(current)
+                if switch_to:
+                    self._bot_logger.warning(f"{self._name} switching remote {current} {self._selector.get_stats(current)} -> {switch_to} {self._selector.get_stats(switch_to)}")
+            if switch_to:
+                self._on_switch(switch_to)
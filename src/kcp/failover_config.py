@@ -0,0 +1,13 @@
+class FailoverConfig:
+    """
+    The remotes are scored with tcp handshakes on their kcptun port, a host that drops tcp there is never scored.
+    """
+    def __init__(self, interval: int = 30, margin: int = 20, rounds: int = 3, samples: int = 3, timeout: int = 2):
+        # seconds between probe rounds
+        self.interval: int = interval
+        # ms a remote has to beat the current one by before switching
+        self.margin: int = margin
+        # consecutive rounds the candidate has to stay better
+        self.rounds: int = rounds
+        self.samples: int = samples
+        self.timeout: int = timeout
@@ -1,9 +1,26 @@
+import statistics
 from datetime import datetime
+from typing import Optional, Type, ContextManager, Final
 
+from src.config.settings import BotSettings
 from src.handlers.handler_config import HandlerConfig
+from src.helpers.capabilities import CapabilityProbe, HostCapabilities
+from src.helpers.network import tcp_rtt
+from src.kcp.adapt import AdaptiveController
+from src.kcp.adapt_config import AdaptProfile
+from src.kcp.exit_cause import ExitBackoff, ExitCause
+from src.kcp.failover import FailoverMonitor
+from src.kcp.failover_config import FailoverConfig
 from src.kcp.kcp_config import KCPConfig
+from src.kcp.probe import TunnelProbe
+from src.kcp.snmp import SnmpLog, TunnelSample
+from src.kcp.process import KCPProcess
+from src.kcp.window_sizing import WindowSizing
 from src.logger.bot_logger import BotLogger
+from src.logger.process_logger import ProcessLogger
+from src.logger.tracer import Tracer, Span
 from src.service.mode import ServiceMode
+from src.state.state_store import HandlerState
 
 
 class GithubDownloadException(Exception):
@@ -22,23 +39,229 @@ class HandlerConfigNotValid(Exception):
 
 
 class KCPHandler:
-    def __init__(self, bot_logger: BotLogger, svc_mode: ServiceMode, kcp_config: KCPConfig, handler_config: HandlerConfig):
+    CONFIG_CLASS: Type[HandlerConfig] = HandlerConfig
+    RTT_SAMPLES: Final[int] = 5
+    RTT_TIMEOUT: Final[float] = 2.0
+    # servers able to put the probe echo front between kcptun and the target
+    PROBE_FRONT: bool = False
+    # handlers able to replace a running kcptun with a newer release
+    UPGRADES: bool = False
+    # where kcptun writes its snmp log relative to where it runs, None when the handler can not read it back
+    SNMP_DIR: Optional[str] = None
+
+    def __init__(self, bot_logger: BotLogger, svc_mode: ServiceMode, kcp_config: KCPConfig, handler_config: HandlerConfig, settings: Optional[BotSettings] = None, name: Optional[str] = None):
         self._bot_logger: BotLogger = bot_logger
         self._svc_mode: ServiceMode = svc_mode
         self._kcp_config: KCPConfig = kcp_config
         self.__handler_config: HandlerConfig = handler_config
+        self._settings: BotSettings = settings if settings else BotSettings()
+        self._name: str = name if name else f"{self._svc_mode.value}_{self.__class__.__name__.lower()}"
+        self._process_logger: ProcessLogger = ProcessLogger(self._name, self._settings.log_config)
+        self._state: HandlerState = HandlerState.from_config(self._settings.state_config, self._name, f"{self.__class__.__name__}:{self._svc_mode.value}:{handler_config.get_identity()}")
+        self._tracer: Tracer = Tracer.open(self._settings.log_config)
+        self._kcp_process: Optional[KCPProcess] = None
+        self._failover: Optional[FailoverMonitor] = None
+        self._exit_backoff: ExitBackoff = ExitBackoff()
+        # windows the config left unset, sized again on every cycle when there is a bandwidth target
+        self._auto_windows: list[str] = [key for key in ("sndwnd", "rcvwnd", "sockbuf") if getattr(self._kcp_config, key) is None] if self._kcp_config.bandwidth else []
+        if self.is_client() and len(self._kcp_config.remotes) > 1:
+            failover_config: FailoverConfig = self._kcp_config.failover if self._kcp_config.failover else FailoverConfig()
+            self._failover = FailoverMonitor(self._bot_logger, self._name, self._kcp_config.remotes, failover_config, lambda: self._kcp_config.remote, self._switch_remote)
+        self._tunnel_probe: Optional[TunnelProbe] = None
+        if self.is_client() and self._kcp_config.probe:
+            self._tunnel_probe = TunnelProbe(self._bot_logger, self._name, self._kcp_config.probe, self.get_probe_addresses, self._on_bad_probe)
+        elif self.is_server() and self._kcp_config.probe and not self.PROBE_FRONT:
+            self._bot_logger.warning(f"{self._name} can not answer tunnel probes with {self.__class__.__name__}, the probe config is ignored")
+        if self._kcp_config.upgrade and self._kcp_config.upgrade.enabled and not self.UPGRADES:
+            self._bot_logger.warning(f"{self._name} can not upgrade kcptun in place with {self.__class__.__name__}, the upgrade config is ignored")
+        self._adapt_controller: Optional[AdaptiveController] = None
+        # shards an adapt profile leaves unset fall back to the kcp section
+        self._base_shards: tuple[Optional[int], Optional[int]] = (self._kcp_config.datashard, self._kcp_config.parityshard)
+        if self._kcp_config.adapt:
+            self._setup_adapt()
         self._bot_logger.info(f"Starting a {self._svc_mode.value} with {self.__class__.__name__}")
 
+    def prepare(self):
+        """
+        Runs before every download_bin and run_kcp cycle.
+        """
+        if self._failover:
+            self._failover.start()
+            with self._span("failover_probe"):
+                best: str = self._failover.get_best()
+            if best != self._kcp_config.remote:
+                self._bot_logger.info(f"{self._name} using remote {best}")
+                self._kcp_config.remote = best
+        if self._tunnel_probe:
+            self._tunnel_probe.start()
+        if self._adapt_controller:
+            self._adapt_controller.start()
+
     def download_bin(self):
         raise NotImplementedError
 
     def run_kcp(self):
         raise NotImplementedError
 
+    def is_running(self) -> bool:
+        """
+        True while a kcptun launched by a run_kcp that already returned is still alive.
+        """
+        return False
+
+    def stop_kcp(self):
+        if self._kcp_process:
+            self._kcp_process.stop()
+
+    def get_exit_cause(self) -> Optional[ExitCause]:
+        return self._exit_backoff.get_cause()
+
+    def get_retry_delay(self) -> Optional[float]:
+        """
+        Seconds the executors wait before the next cycle, None when the last exit was not classified.
+        """
+        return self._exit_backoff.get_delay()
+
+    def _record_exit(self, cause: ExitCause, detail: Optional[str] = None) -> float:
+        delay: float = self._exit_backoff.record(cause)
+        message: str = f"{self._name} kcptun stopped, cause: {cause.value}{f' ({detail})' if detail else ''}, next start in {delay:.0f} seconds"
+        if cause.is_permanent():
+            self._bot_logger.error(message)
+        else:
+            self._bot_logger.warning(message)
+        return delay
+
+    def _span(self, name: str) -> ContextManager[Span]:
+        return self._tracer.span(self.__class__.__name__, self._name, name)
+
+    def get_trace_summary(self) -> list[str]:
+        return self._tracer.summarize(self.__class__.__name__)
+
+    def _switch_remote(self, remote: str):
+        self._kcp_config.remote = remote
+        self.stop_kcp()
+
+    def get_probe_addresses(self) -> list[str]:
+        """
+        Where the client end of the tunnel accepts connections, as seen from the bot.
+        """
+        host, _, port = self._kcp_config.listen.rpartition(":")
+        return [f"{host or '127.0.0.1'}:{port}"]
+
+    def get_tunnel_probe(self) -> Optional[TunnelProbe]:
+        return self._tunnel_probe
+
+    def get_tunnel_rtt(self) -> Optional[float]:
+        """
+        @return: median ms through the tunnel, None without a tunnel probe.
+        """
+        return self._tunnel_probe.get_rtt_percentile(50) if self._tunnel_probe else None
+
+    def _on_bad_probe(self):
+        alternative: Optional[str] = self._failover.get_alternative(self._kcp_config.remote) if self._failover else None
+        if alternative:
+            self._bot_logger.warning(f"{self._name} failing over from {self._kcp_config.remote} to {alternative}")
+            self._switch_remote(alternative)
+        else:
+            self._bot_logger.warning(f"{self._name} restarting kcptun")
+            self.stop_kcp()
+
+    def _setup_adapt(self):
+        if self.SNMP_DIR is None and not self._tunnel_probe:
+            self._bot_logger.warning(f"{self._name} has neither kcptun statistics nor a tunnel probe with {self.__class__.__name__}, the adapt config is ignored")
+            return
+        profiles: list[AdaptProfile] = self._kcp_config.adapt.profiles
+        if any(profile.datashard is not None or profile.parityshard is not None for profile in profiles):
+            self._bot_logger.warning(f"{self._name} adapt profiles change the fec shards, the other end of the tunnel must switch with them")
+        if self.SNMP_DIR is not None:
+            self._kcp_config.snmplog = SnmpLog.get_path(self._name, self.SNMP_DIR)
+            self._kcp_config.snmpperiod = self._kcp_config.adapt.interval
+        names: list[str] = [profile.name for profile in profiles]
+        saved: Optional[str] = self._state.get("profile")
+        current: int = names.index(saved) if saved in names else 0
+        self._adapt_controller = AdaptiveController(self._bot_logger, self._name, self._kcp_config.adapt, self._get_tunnel_sample, self._switch_profile, current)
+        self._apply_profile(profiles[current])
+
+    def get_adapt_controller(self) -> Optional[AdaptiveController]:
+        return self._adapt_controller
+
+    def _read_snmp(self) -> Optional[TunnelSample]:
+        """
+        Counters of the last kcptun snmp period, handlers with a SNMP_DIR read their log back.
+        """
+        return None
+
+    def _get_tunnel_sample(self) -> Optional[TunnelSample]:
+        sample: Optional[TunnelSample] = self._read_snmp()
+        results: list = self._tunnel_probe.get_last_results() if self._tunnel_probe else []
+        rtts: list[float] = [result.get_percentile(95) for result in results if result.rtts]
+        if rtts:
+            sample = sample if sample else TunnelSample()
+            sample.rtt = max(rtts)
+        return sample
+
+    def _apply_profile(self, profile: AdaptProfile):
+        self._kcp_config.mode = profile.mode
+        self._kcp_config.datashard = profile.datashard if profile.datashard is not None else self._base_shards[0]
+        self._kcp_config.parityshard = profile.parityshard if profile.parityshard is not None else self._base_shards[1]
+        self._state.set(profile=profile.name)
+
+    def _switch_profile(self, profile: AdaptProfile):
+        self._apply_profile(profile)
+        self.stop_kcp()
+
+    def _tune_kcp(self, probe: CapabilityProbe):
+        auto_conn: bool = self._kcp_config.auto_conn and self.is_client()
+        sizing: bool = bool(self._kcp_config.bandwidth or self._kcp_config.sockbuf)
+        if not self._kcp_config.auto_crypt and not auto_conn and not sizing:
+            return
+        with self._span("capabilities"):
+            capabilities: HostCapabilities = probe.probe(self._kcp_config.throughput_test)
+        self._bot_logger.info(f"Found {capabilities}")
+        if self._kcp_config.auto_crypt:
+            self._kcp_config.crypt = CapabilityProbe.select_crypt(capabilities)
+            self._bot_logger.warning(f"Auto selected crypt {self._kcp_config.crypt}, the other end of the tunnel must use the same crypt!")
+        if auto_conn:
+            self._kcp_config.conn = CapabilityProbe.select_conn(capabilities)
+            self._bot_logger.info(f"Auto selected {self._kcp_config.conn} connections")
+        if sizing:
+            self._size_windows(capabilities)
+
+    def _measure_rtt(self) -> Optional[float]:
+        """
+        Median of a few handshakes against the remote, from where the bot runs.
+        @return: ms or None when the remote never answered.
+        """
+        samples: list[float] = [rtt for rtt in (tcp_rtt(self._kcp_config.remote, self.RTT_TIMEOUT) for _ in range(self.RTT_SAMPLES)) if rtt is not None]
+        return statistics.median(samples) if samples else None
+
+    def _size_windows(self, capabilities: HostCapabilities):
+        if self._auto_windows:
+            rtt: Optional[float] = self._kcp_config.rtt
+            if not rtt and self.is_client():
+                with self._span("rtt"):
+                    rtt = self._measure_rtt()
+            if not rtt:
+                self._bot_logger.warning(f"{self._name} has no rtt to {self._kcp_config.remote}, set kcp.rtt to size the windows, keeping the kcptun defaults")
+            else:
+                sizing: WindowSizing = WindowSizing.compute(self._kcp_config.bandwidth, rtt)
+                for key in self._auto_windows:
+                    setattr(self._kcp_config, key, getattr(sizing, key))
+                self._bot_logger.info(f"{self._name} sized for {self._kcp_config.bandwidth} Mbit/s at {rtt:.1f} ms: {sizing}")
+        if self._kcp_config.sockbuf:
+            for warning in WindowSizing.get_clamp_warnings(self._kcp_config.sockbuf, capabilities.rmem_max, capabilities.wmem_max):
+                self._bot_logger.warning(f"{self._name} {warning}")
+
     @classmethod
     def get_unique_name(cls) -> str:
         return datetime.now().strftime("%d%m%Y%H%M%S%f")
 
+    def get_name(self) -> str:
+        return self._name
+
+    def get_recent_output(self) -> list[str]:
+        return self._process_logger.get_recent_lines()
+
     def is_client(self) -> bool:
         return self._svc_mode == ServiceMode.CLIENT
 
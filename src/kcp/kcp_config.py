@@ -1,20 +1,55 @@
+from typing import Optional
+
+from src.kcp.adapt_config import AdaptConfig
+from src.kcp.failover_config import FailoverConfig
+from src.kcp.probe_config import ProbeConfig
+from src.kcp.process_config import ProcessConfig
+from src.kcp.upgrade_config import UpgradeConfig
+
+
 class KCPConfig:
-    def __init__(self, listen: str, password: str, remote: str):
+    def __init__(self, listen: str, password: str, remote: str | list[str], crypt: Optional[str] = None, conn: Optional[int] = None, throughput_test: bool = False):
         self.mode: str = "fast3"
-        self.crypt: str = "aes-192"
+        # crypt "auto" and an unset conn are picked from the host capabilities before launch
+        self.auto_crypt: bool = crypt == "auto"
+        self.crypt: str = crypt if crypt and not self.auto_crypt else "aes-192"
+        self.auto_conn: bool = conn is None
+        self.conn: int = conn if conn else 1
+        self.throughput_test: bool = throughput_test
         self.listen: str = listen
         self.key: str = password
-        self.remote: str = remote
+        self.remotes: list[str] = remote if isinstance(remote, list) else [remote]
+        self.remote: str = self.remotes[0]
+        self.failover: Optional[FailoverConfig] = None
+        self.upgrade: Optional[UpgradeConfig] = None
+        self.process: Optional[ProcessConfig] = None
+        # clients push timed payloads through the tunnel, servers answer them from an echo front before the target
+        self.probe: Optional[ProbeConfig] = None
+        # target Mbit/s, windows and socket buffers left unset are sized from it and the rtt to the remote
+        self.bandwidth: Optional[int] = None
+        # ms, skips the measurement
+        self.rtt: Optional[int] = None
+        self.sndwnd: Optional[int] = None
+        self.rcvwnd: Optional[int] = None
+        self.sockbuf: Optional[int] = None
+        # forward error correction, kcptun defaults when unset
+        self.datashard: Optional[int] = None
+        self.parityshard: Optional[int] = None
+        # csv of the kcp counters written every snmpperiod seconds
+        self.snmplog: Optional[str] = None
+        self.snmpperiod: Optional[int] = None
+        # profiles switched at runtime from the tunnel statistics
+        self.adapt: Optional[AdaptConfig] = None
 
     def __repr__(self):
-        return f"Config[mode={self.mode}, crypt={self.crypt}, listen={self.crypt}, key={self.key}, remote={self.remote}]"
+        return f"Config[mode={self.mode}, crypt={self.crypt}, conn={self.conn}, listen={self.listen}, key={self.key}, remote={self.remote}]"
 
 
 class KCPServerConfig(KCPConfig):
-    def __init__(self, target: str, listen: str, password: str):
-        super().__init__(listen, password, target)
+    def __init__(self, target: str, listen: str, password: str, crypt: Optional[str] = None, conn: Optional[int] = None, throughput_test: bool = False):
+        super().__init__(listen, password, target, crypt, conn, throughput_test)
 
 
 class KCPClientConfig(KCPConfig):
-    def __init__(self, remote: str, listen: str, password: str):
-        super().__init__(listen, password, remote)
+    def __init__(self, remote: str | list[str], listen: str, password: str, crypt: Optional[str] = None, conn: Optional[int] = None, throughput_test: bool = False):
+        super().__init__(listen, password, remote, crypt, conn, throughput_test)
@@ -0,0 +1,237 @@
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import Optional, Callable, Final
+
+from src.decorators.background import background
+from src.helpers.relay import relay
+from src.helpers.network import parse_address
+from src.kcp.probe_config import ProbeConfig
+from src.logger.bot_logger import BotLogger
+from src.logger.tracer import Tracer
+
+# first bytes of a probe connection, anything else is tunnel traffic for the real target
+PROBE_MAGIC: Final[bytes] = b"KCPBOT-PROBE\n"
+
+
+class ProbeResult:
+    def __init__(self, address: str, rtts: list[float], goodput: Optional[float], error: Optional[str] = None):
+        self.address: str = address
+        # ms of every answered round trip
+        self.rtts: list[float] = rtts
+        # KB/s echoed back during the burst, None when skipped or failed
+        self.goodput: Optional[float] = goodput
+        self.error: Optional[str] = error
+
+    def get_percentile(self, percentile: int) -> Optional[float]:
+        return Tracer.percentile(self.rtts, percentile) if self.rtts else None
+
+    def is_bad(self, config: ProbeConfig) -> bool:
+        if self.error or not self.rtts:
+            return True
+        if self.get_percentile(95) > config.max_rtt:
+            return True
+        return bool(config.min_goodput and config.burst and (self.goodput or 0) < config.min_goodput)
+
+    def __repr__(self):
+        if self.error:
+            return f"ProbeResult[{self.address} error={self.error}]"
+        goodput: str = f"{self.goodput:.0f}KB/s" if self.goodput is not None else "-"
+        return f"ProbeResult[{self.address} p50={self.get_percentile(50):.1f}ms p95={self.get_percentile(95):.1f}ms goodput={goodput}]"
+
+
+def _recv_exactly(s: socket.socket, size: int) -> bytes:
+    data: bytes = b""
+    while len(data) < size:
+        chunk: bytes = s.recv(min(size - len(data), 65536))
+        if not chunk:
+            raise ConnectionError(f"connection closed after {len(data)} of {size} bytes")
+        data += chunk
+    return data
+
+
+def probe_tunnel(address: str, config: ProbeConfig) -> ProbeResult:
+    """
+    Pushes timed payloads through the tunnel listening on address, the server end of the tunnel echoes them.
+    """
+    host, port = parse_address(address)
+    try:
+        with socket.create_connection((host or "127.0.0.1", port), timeout=config.timeout) as s:
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            s.sendall(PROBE_MAGIC)
+            rtts: list[float] = []
+            payload: bytes = b"p" * 64
+            for _ in range(config.samples):
+                started: float = time.perf_counter()
+                s.sendall(payload)
+                _recv_exactly(s, len(payload))
+                rtts.append((time.perf_counter() - started) * 1000)
+            goodput: Optional[float] = None
+            if config.burst:
+                started: float = time.perf_counter()
+                # written from another thread, a burst bigger than the socket buffers would block both ends otherwise
+                writer: threading.Thread = threading.Thread(target=s.sendall, args=(b"b" * config.burst,), daemon=True)
+                writer.start()
+                _recv_exactly(s, config.burst)
+                writer.join(config.timeout)
+                goodput = config.burst / 1024 / max(time.perf_counter() - started, 1e-6)
+            return ProbeResult(address, rtts, goodput)
+    except (OSError, ValueError) as e:
+        return ProbeResult(address, [], None, str(e) or e.__class__.__name__)
+
+
+class EchoFront:
+    """
+    Sits between the kcptun server and its target, connections opening with PROBE_MAGIC are echoed and every other one is piped to the target.
+    Tunnel traffic pays for it: every connection is relayed by a thread of the bot, and protocols where the server talks first
+    never send the magic, they reach the target only after peek_timeout.
+    """
+    BUFFER: Final[int] = 65536
+
+    def __init__(self, bot_logger: BotLogger, target: str, host: str = "127.0.0.1", peek_timeout: float = 1.0):
+        """
+        @param peek_timeout: seconds a silent connection waits before it is piped to the target.
+        """
+        self._bot_logger: BotLogger = bot_logger
+        self._target: str = target
+        self._peek_timeout: float = peek_timeout
+        self._server: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, 0))
+        self._server.listen(128)
+        self._thread: Optional[threading.Thread] = None
+
+    def get_address(self) -> str:
+        host, port = self._server.getsockname()
+        return f"{host}:{port}"
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = self._accept_loop()
+
+    def close(self):
+        self._server.close()
+
+    @background("PROBE_FRONT")
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client,), name="PROBE_FRONT_CONN", daemon=True).start()
+
+    def _handle(self, client: socket.socket):
+        try:
+            head: bytes = b""
+            deadline: float = time.monotonic() + self._peek_timeout
+            while len(head) < len(PROBE_MAGIC) and PROBE_MAGIC.startswith(head):
+                remaining: float = deadline - time.monotonic()
+                if remaining <= 0 or not select.select([client], [], [], remaining)[0]:
+                    break
+                head = client.recv(len(PROBE_MAGIC), socket.MSG_PEEK)
+                if not head:
+                    return
+                if len(head) < len(PROBE_MAGIC):
+                    time.sleep(0.01)
+            if head == PROBE_MAGIC:
+                _recv_exactly(client, len(PROBE_MAGIC))
+                self._echo(client)
+            else:
+                self._pipe(client)
+        except OSError:
+            pass
+        finally:
+            client.close()
+
+    def _echo(self, client: socket.socket):
+        while data := client.recv(self.BUFFER):
+            client.sendall(data)
+
+    def _pipe(self, client: socket.socket):
+        host, port = parse_address(self._target)
+        with socket.create_connection((host or "127.0.0.1", port)) as upstream:
+            relay(client, upstream)
+
+
+class TunnelProbe:
+    HISTORY: Final[int] = 100
+
+    def __init__(self, bot_logger: BotLogger, name: str, config: ProbeConfig, get_addresses: Callable[[], list[str]], on_bad: Callable[[], None]):
+        """
+        @param get_addresses: where the client end of the tunnel listens, as seen from the bot.
+        @param on_bad: called after failures consecutive bad rounds, restarts or fails the tunnel over.
+        """
+        self._bot_logger: BotLogger = bot_logger
+        self._name: str = name
+        self._config: ProbeConfig = config
+        self._get_addresses: Callable[[], list[str]] = get_addresses
+        self._on_bad: Callable[[], None] = on_bad
+        self._lock: threading.Lock = threading.Lock()
+        self._rtts: deque[float] = deque(maxlen=self.HISTORY)
+        self._last: list[ProbeResult] = []
+        self._bad_rounds: int = 0
+        self._grace_until: float = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop: threading.Event = threading.Event()
+
+    def start(self):
+        """
+        Called on every start of the tunnel, bad rounds are not counted during the grace period.
+        """
+        with self._lock:
+            self._grace_until = time.monotonic() + self._config.grace
+            self._bad_rounds = 0
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = self._monitor()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_last_results(self) -> list[ProbeResult]:
+        with self._lock:
+            return list(self._last)
+
+    def get_rtt_percentile(self, percentile: int) -> Optional[float]:
+        with self._lock:
+            return Tracer.percentile(list(self._rtts), percentile) if self._rtts else None
+
+    def probe_round(self) -> bool:
+        """
+        @return: True when the quality thresholds were met on every address.
+        """
+        results: list[ProbeResult] = [probe_tunnel(address, self._config) for address in self._get_addresses()]
+        with self._lock:
+            self._last = results
+            for result in results:
+                self._rtts.extend(result.rtts)
+        bad: list[ProbeResult] = [result for result in results if result.is_bad(self._config)]
+        for result in results:
+            (self._bot_logger.warning if result in bad else self._bot_logger.info)(f"{self._name} tunnel probe {result}")
+        return not bad
+
+    @background("TUNNEL_PROBE")
+    def _monitor(self):
+        while not self._stop.wait(self._config.interval):
+            try:
+                good: bool = self.probe_round()
+            except Exception as e:
+                self._bot_logger.error(f"{self._name} tunnel probe failed: {e}")
+                continue
+            with self._lock:
+                if good or time.monotonic() < self._grace_until:
+                    self._bad_rounds = 0
+                    continue
+                self._bad_rounds += 1
+                act: bool = self._bad_rounds >= self._config.failures
+                if act:
+                    self._bad_rounds = 0
+                    self._grace_until = time.monotonic() + self._config.grace
+            if act:
+                self._bot_logger.warning(f"{self._name} tunnel quality below the thresholds for {self._config.failures} rounds")
+                self._on_bad()
@@ -0,0 +1,20 @@
+class ProbeConfig:
+    def __init__(self, interval: int = 60, samples: int = 5, burst: int = 64 * 1024, max_rtt: int = 500, min_goodput: int = 0, failures: int = 3, grace: int = 300, timeout: int = 10, peek_timeout: int = 1000):
+        # seconds between probe rounds
+        self.interval: int = interval
+        # timed round trips per round
+        self.samples: int = samples
+        # bytes echoed back in the goodput burst, 0 to skip it
+        self.burst: int = burst
+        # ms, a round whose p95 is above it is a bad round
+        self.max_rtt: int = max_rtt
+        # KB/s, 0 disables the goodput threshold
+        self.min_goodput: int = min_goodput
+        # consecutive bad rounds before the tunnel is restarted or failed over
+        self.failures: int = failures
+        # seconds after every start where bad rounds are not counted
+        self.grace: int = grace
+        self.timeout: int = timeout
+        # servers only, ms the echo front waits for the probe magic before it pipes a silent connection to the target,
+        # every connection of a protocol where the server talks first is delayed this long
+        self.peek_timeout: int = peek_timeout
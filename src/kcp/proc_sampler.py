@@ -0,0 +1,240 @@
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Optional, Final
+
+from src.decorators.background import background
+from src.logger.bot_logger import BotLogger
+
+
+class ProcSnapshot:
+    def __init__(self, cpu_ticks: int, rss: int, threads: int, ctx_switches: int, fds: int, read_bytes: Optional[int], write_bytes: Optional[int]):
+        self.cpu_ticks: int = cpu_ticks
+        # bytes
+        self.rss: int = rss
+        self.threads: int = threads
+        # voluntary and involuntary
+        self.ctx_switches: int = ctx_switches
+        self.fds: int = fds
+        # None when /proc/<pid>/io is not readable, it needs ptrace rights on some kernels
+        self.read_bytes: Optional[int] = read_bytes
+        self.write_bytes: Optional[int] = write_bytes
+
+    @classmethod
+    def read(cls, pid: int, proc: str = "/proc") -> Optional["ProcSnapshot"]:
+        """
+        @return: None once the process is gone.
+        """
+        base: str = f"{proc}/{pid}"
+        try:
+            with open(f"{base}/stat") as f:
+                # the command name is between parentheses and may hold spaces
+                fields: list[str] = f.read().rpartition(")")[2].split()
+            status: dict[str, str] = {}
+            with open(f"{base}/status") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    status[key] = value.strip()
+            fds: int = len(os.listdir(f"{base}/fd"))
+        except (OSError, IndexError):
+            return None
+        io: dict[str, int] = {}
+        try:
+            with open(f"{base}/io") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    io[key] = int(value)
+        except (OSError, ValueError):
+            pass
+        return cls(
+            int(fields[11]) + int(fields[12]),
+            int(status.get("VmRSS", "0 kB").split()[0]) * 1024,
+            int(fields[17]),
+            int(status.get("voluntary_ctxt_switches", "0")) + int(status.get("nonvoluntary_ctxt_switches", "0")),
+            fds,
+            io.get("read_bytes"),
+            io.get("write_bytes")
+        )
+
+
+class ResourceSample:
+    def __init__(self, at: float, cpu: float, rss: int, ctx_rate: float, fds: int, threads: int):
+        self.at: float = at
+        # % of one core
+        self.cpu: float = cpu
+        self.rss: int = rss
+        # context switches per second
+        self.ctx_rate: float = ctx_rate
+        self.fds: int = fds
+        self.threads: int = threads
+
+    def __repr__(self):
+        return f"ResourceSample[cpu={self.cpu:.1f}%, rss={self.rss // 1024 // 1024}MiB, ctx={self.ctx_rate:.0f}/s, fds={self.fds}, threads={self.threads}]"
+
+
+class ResourceSeries:
+    """
+    Rolling samples of one handler's kcptun, the baseline is taken from the first samples of every process.
+    """
+    # the first samples of a process hold the startup, not its usual load
+    WARMUP: Final[int] = 2
+    BASELINE_SAMPLES: Final[int] = 10
+    # recent samples averaged before comparing the cpu with the baseline
+    CPU_WINDOW: Final[int] = 5
+    CPU_FACTOR: Final[float] = 2.0
+    CPU_MIN_DELTA: Final[float] = 10.0
+    RSS_FACTOR: Final[float] = 2.0
+    RSS_MIN_DELTA: Final[int] = 32 * 1024 * 1024
+
+    def __init__(self, name: str, history: int = 120):
+        self.name: str = name
+        self.samples: deque[ResourceSample] = deque(maxlen=history)
+        self._pid: Optional[int] = None
+        self._last: Optional[ProcSnapshot] = None
+        self._last_at: float = 0.0
+        self._baseline_cpu: list[float] = []
+        self._baseline_rss: list[int] = []
+        self._seen: int = 0
+        self._alerts: set[str] = set()
+
+    def get_baseline(self) -> Optional[tuple[float, int]]:
+        """
+        @return: median cpu % and rss of the baseline samples, None while it is being taken.
+        """
+        if len(self._baseline_rss) < self.BASELINE_SAMPLES:
+            return None
+        return statistics.median(self._baseline_cpu), int(statistics.median(self._baseline_rss))
+
+    def add(self, pid: int, snapshot: ProcSnapshot, now: Optional[float] = None) -> list[str]:
+        """
+        @return: warnings for the cpu or memory that just left the baseline.
+        """
+        now = now if now is not None else time.monotonic()
+        if pid != self._pid:
+            # a new process, its counters and its baseline start over
+            self._pid, self._last, self._seen = pid, None, 0
+            self._baseline_cpu, self._baseline_rss = [], []
+            self._alerts.clear()
+        last, last_at = self._last, self._last_at
+        self._last, self._last_at = snapshot, now
+        if not last or now <= last_at:
+            return []
+        elapsed: float = now - last_at
+        sample: ResourceSample = ResourceSample(
+            now,
+            (snapshot.cpu_ticks - last.cpu_ticks) / ProcessSampler.CLK_TCK / elapsed * 100,
+            snapshot.rss,
+            (snapshot.ctx_switches - last.ctx_switches) / elapsed,
+            snapshot.fds,
+            snapshot.threads
+        )
+        self.samples.append(sample)
+        self._seen += 1
+        if self._seen <= self.WARMUP:
+            return []
+        if len(self._baseline_rss) < self.BASELINE_SAMPLES:
+            self._baseline_cpu.append(sample.cpu)
+            self._baseline_rss.append(sample.rss)
+            return []
+        return self._check()
+
+    def _check(self) -> list[str]:
+        baseline_cpu, baseline_rss = self.get_baseline()
+        recent: list[ResourceSample] = list(self.samples)[-self.CPU_WINDOW:]
+        cpu: float = sum(sample.cpu for sample in recent) / len(recent)
+        rss: int = recent[-1].rss
+        warnings: list[str] = []
+        if self._excursion("cpu", cpu > max(baseline_cpu * self.CPU_FACTOR, baseline_cpu + self.CPU_MIN_DELTA)):
+            warnings.append(f"{self.name} kcptun cpu at {cpu:.1f}%, its baseline is {baseline_cpu:.1f}%")
+        if self._excursion("rss", rss > max(baseline_rss * self.RSS_FACTOR, baseline_rss + self.RSS_MIN_DELTA)):
+            warnings.append(f"{self.name} kcptun memory at {rss // 1024 // 1024}MiB, its baseline is {baseline_rss // 1024 // 1024}MiB")
+        return warnings
+
+    def _excursion(self, key: str, outside: bool) -> bool:
+        """
+        @return: True only for the first sample of an excursion, it is warned about again once it came back.
+        """
+        if not outside:
+            self._alerts.discard(key)
+            return False
+        if key in self._alerts:
+            return False
+        self._alerts.add(key)
+        return True
+
+
+class SampledProcess:
+    def __init__(self, pid: int, series: ResourceSeries, interval: int):
+        self.pid: int = pid
+        self.series: ResourceSeries = series
+        self.interval: int = interval
+        self.due: float = time.monotonic()
+
+
+class ProcessSampler:
+    """
+    Reads /proc for every kcptun child from a single thread, each one on its own interval.
+    """
+    CLK_TCK: Final[int] = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") and "SC_CLK_TCK" in os.sysconf_names else 100
+    _default: Optional["ProcessSampler"] = None
+    _default_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, bot_logger: BotLogger, proc: str = "/proc"):
+        self._bot_logger: BotLogger = bot_logger
+        self._proc: str = proc
+        self._lock: threading.Lock = threading.Lock()
+        self._processes: dict[int, SampledProcess] = {}
+        self._wakeup: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def get_default(cls, bot_logger: BotLogger) -> "ProcessSampler":
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(bot_logger)
+            return cls._default
+
+    @classmethod
+    def is_supported(cls, proc: str = "/proc") -> bool:
+        return os.path.isfile(f"{proc}/self/stat")
+
+    def register(self, pid: int, series: ResourceSeries, interval: int):
+        with self._lock:
+            self._processes[pid] = SampledProcess(pid, series, interval)
+            if not self._thread:
+                self._thread = self._loop()
+        self._wakeup.set()
+
+    def unregister(self, pid: int):
+        with self._lock:
+            self._processes.pop(pid, None)
+
+    def sample(self, process: SampledProcess, now: float):
+        snapshot: Optional[ProcSnapshot] = ProcSnapshot.read(process.pid, self._proc)
+        if not snapshot:
+            self.unregister(process.pid)
+            return
+        for warning in process.series.add(process.pid, snapshot, now):
+            self._bot_logger.warning(warning)
+
+    @background("PROCESS_SAMPLER")
+    def _loop(self):
+        while True:
+            with self._lock:
+                processes: list[SampledProcess] = list(self._processes.values())
+                if not processes:
+                    # under the lock, the next register starts a new thread
+                    self._thread = None
+                    return
+            now: float = time.monotonic()
+            for process in processes:
+                if process.due <= now:
+                    process.due = now + process.interval
+                    try:
+                        self.sample(process, now)
+                    except Exception as e:
+                        self._bot_logger.error(f"Unable to sample {process.series.name} kcptun: {e}")
+            self._wakeup.wait(max(0.0, min(process.due for process in processes) - time.monotonic()))
+            self._wakeup.clear()
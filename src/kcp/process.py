@@ -1,12 +1,35 @@
+from typing import Optional
+
 from src.kcp.kcp_config import KCPConfig
 from src.logger.bot_logger import BotLogger
+from src.logger.process_logger import ProcessLogger
 
 
 class KCPProcess:
-    def __init__(self, bot_logger: BotLogger, is_client: bool, kcp_config: KCPConfig):
+    def __init__(self, bot_logger: BotLogger, is_client: bool, kcp_config: KCPConfig, process_logger: ProcessLogger):
         self._bot_logger: BotLogger = bot_logger
         self._is_client: bool = is_client
         self._kcp_config: KCPConfig = kcp_config
+        self._process_logger: ProcessLogger = process_logger
 
     def start(self, kcp_path: str):
         raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def build_command(self, kcp_path: str) -> list[str]:
+        command: list[str] = [kcp_path, "-r" if self._is_client else "-t", self._kcp_config.remote, "-l", self._kcp_config.listen, "-mode", self._kcp_config.mode, "--crypt", self._kcp_config.crypt, "--key", self._kcp_config.key]
+        if self._is_client:
+            command += ["--conn", str(self._kcp_config.conn)]
+        for flag in ("sndwnd", "rcvwnd", "sockbuf", "datashard", "parityshard", "snmplog", "snmpperiod"):
+            value: Optional[int | str] = getattr(self._kcp_config, flag)
+            if value is not None:
+                command += [f"--{flag}", str(value)]
+        return command
+
+    def _log_last_output(self, lines: int = 10):
+        recent_lines: list[str] = self._process_logger.get_recent_lines()[-lines:]
+        if not recent_lines:
+            return
+        self._bot_logger.warning("Last KCP output:\n" + "\n".join(recent_lines))
@@ -0,0 +1,20 @@
+from typing import Optional
+
+
+class ProcessConfig:
+    def __init__(self, affinity: Optional[list[int] | str] = None, reserved: Optional[list[int]] = None, nice: Optional[int] = None, ionice_class: Optional[int] = None, ionice_level: Optional[int] = None, gomaxprocs: Optional[int] = None, gogc: Optional[int] = None, nofile: Optional[int] = None, exec_mode: str = "disk", sample_interval: int = 30, sample_history: int = 120):
+        # list of cores or "auto" to spread the tunnels over the cores that are not reserved
+        self.affinity: Optional[list[int] | str] = affinity
+        self.reserved: list[int] = reserved if reserved else []
+        self.nice: Optional[int] = nice
+        self.ionice_class: Optional[int] = ionice_class
+        self.ionice_level: Optional[int] = ionice_level
+        self.gomaxprocs: Optional[int] = gomaxprocs
+        self.gogc: Optional[int] = gogc
+        self.nofile: Optional[int] = nofile
+        # "memory" runs kcptun from a memfd or a tmpfs instead of the resources directory
+        self.exec_mode: str = exec_mode
+        # seconds between /proc samples of kcptun, 0 to not sample it
+        self.sample_interval: int = sample_interval
+        # samples kept per handler
+        self.sample_history: int = sample_history
@@ -0,0 +1,189 @@
+import os
+import selectors
+import signal
+import threading
+import traceback
+from subprocess import Popen
+from typing import Optional, Callable, Final
+
+from src.decorators.background import background
+from src.logger.bot_logger import BotLogger
+
+
+class ManagedProcess:
+    def __init__(self, process: Popen, on_line: Callable[[str], None], on_exit: Callable[[int], None]):
+        self.process: Popen = process
+        self.on_line: Callable[[str], None] = on_line
+        self.on_exit: Callable[[int], None] = on_exit
+        self.pidfd: Optional[int] = None
+        self.buffer: bytes = b""
+        self.pipe_open: bool = True
+
+
+class ProcessManager:
+    """
+    Watches every kcptun child from a single thread, pipes and pidfds share one selector.
+    Without pidfd (old kernels or other platforms) exits are noticed through SIGCHLD or polling.
+    """
+    POLL_INTERVAL: Final[float] = 1.0
+    READ_SIZE: Final[int] = 65536
+    _default: Optional["ProcessManager"] = None
+    _default_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, bot_logger: BotLogger):
+        self._bot_logger: BotLogger = bot_logger
+        self._selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self._lock: threading.Lock = threading.Lock()
+        self._processes: dict[int, ManagedProcess] = {}
+        self._pending: list[ManagedProcess] = []
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._use_pidfd: bool = self.has_pidfd()
+        self._thread: Optional[threading.Thread] = None
+        if not self._use_pidfd:
+            self.install_signal()
+
+    @classmethod
+    def has_pidfd(cls) -> bool:
+        """
+        os.pidfd_open exists on every linux build, the kernel may still be older than 5.3.
+        """
+        if not hasattr(os, "pidfd_open"):
+            return False
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+        except OSError:
+            return False
+        return True
+
+    def install_signal(self) -> bool:
+        """
+        Wakes the loop on SIGCHLD, python only lets the main thread set signal handlers.
+        @return: False when the exits are only noticed by polling.
+        """
+        if not hasattr(signal, "SIGCHLD") or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signal.SIGCHLD, lambda signum, frame: self._wakeup())
+        return True
+
+    @classmethod
+    def get_default(cls, bot_logger: BotLogger) -> "ProcessManager":
+        """
+        Built by main() at startup, on the main thread, so the SIGCHLD fallback can be installed.
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls(bot_logger)
+            return cls._default
+
+    def register(self, process: Popen, on_line: Callable[[str], None], on_exit: Callable[[int], None]):
+        managed: ManagedProcess = ManagedProcess(process, on_line, on_exit)
+        if self._use_pidfd:
+            try:
+                managed.pidfd = os.pidfd_open(process.pid)
+            except OSError:
+                # too late for SIGCHLD unless this is the main thread, the poll interval catches the exits
+                self._use_pidfd = False
+                self.install_signal()
+        os.set_blocking(process.stdout.fileno(), False)
+        with self._lock:
+            self._pending.append(managed)
+            if not self._thread or not self._thread.is_alive():
+                self._thread = self._loop()
+        self._wakeup()
+
+    def get_count(self) -> int:
+        with self._lock:
+            return len(self._processes) + len(self._pending)
+
+    def _wakeup(self):
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _add_pending(self):
+        with self._lock:
+            pending: list[ManagedProcess] = self._pending
+            self._pending = []
+        for managed in pending:
+            self._processes[managed.process.pid] = managed
+            self._selector.register(managed.process.stdout.fileno(), selectors.EVENT_READ, (managed, "pipe"))
+            if managed.pidfd is not None:
+                self._selector.register(managed.pidfd, selectors.EVENT_READ, (managed, "exit"))
+
+    @background("PROCESS_MANAGER")
+    def _loop(self):
+        while True:
+            self._add_pending()
+            for key, _ in self._selector.select(self.POLL_INTERVAL):
+                if key.data is None:
+                    self._drain_wakeup()
+                    continue
+                managed, kind = key.data
+                if managed.process.pid not in self._processes:
+                    continue
+                if kind == "pipe":
+                    self._read(managed)
+                else:
+                    self._reap(managed)
+            # processes without a pidfd are checked on every wakeup or poll interval
+            for managed in list(self._processes.values()):
+                if managed.pidfd is None:
+                    self._reap(managed)
+
+    def _drain_wakeup(self):
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _read(self, managed: ManagedProcess):
+        while managed.pipe_open:
+            try:
+                data: bytes = os.read(managed.process.stdout.fileno(), self.READ_SIZE)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:
+                managed.pipe_open = False
+                self._selector.unregister(managed.process.stdout.fileno())
+                break
+            managed.buffer += data
+            *lines, managed.buffer = managed.buffer.split(b"\n")
+            for line in lines:
+                self._emit(managed, line)
+
+    def _emit(self, managed: ManagedProcess, line: bytes):
+        try:
+            managed.on_line(line.decode("utf8", errors="replace").rstrip("\r"))
+        except Exception as e:
+            self._bot_logger.error(f"Output handler of process {managed.process.pid} failed: {e}")
+            traceback.print_exception(e)
+
+    def _reap(self, managed: ManagedProcess):
+        exit_code: Optional[int] = managed.process.poll()
+        if exit_code is None:
+            return
+        self._read(managed)
+        if managed.buffer:
+            self._emit(managed, managed.buffer)
+            managed.buffer = b""
+        if managed.pipe_open:
+            self._selector.unregister(managed.process.stdout.fileno())
+            managed.pipe_open = False
+        if managed.pidfd is not None:
+            self._selector.unregister(managed.pidfd)
+            os.close(managed.pidfd)
+            managed.pidfd = None
+        managed.process.stdout.close()
+        self._processes.pop(managed.process.pid, None)
+        try:
+            managed.on_exit(exit_code)
+        except Exception as e:
+            self._bot_logger.error(f"Exit handler of process {managed.process.pid} failed: {e}")
+            traceback.print_exception(e)
@@ -0,0 +1,89 @@
+import os
+import shutil
+import threading
+from typing import Optional
+
+from src.kcp.process_config import ProcessConfig
+from src.logger.bot_logger import BotLogger
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class AffinityAllocator:
+    _lock: threading.Lock = threading.Lock()
+    _next: int = 0
+
+    @classmethod
+    def allocate(cls, count: int, reserved: list[int]) -> list[int]:
+        """
+        Hands out cores round robin so every auto spread tunnel lands on the next free ones.
+        """
+        available: list[int] = sorted(set(os.sched_getaffinity(0)) - set(reserved)) if hasattr(os, "sched_getaffinity") else []
+        if not available:
+            return []
+        with cls._lock:
+            cores: list[int] = [available[(cls._next + i) % len(available)] for i in range(min(count, len(available)))]
+            cls._next += len(cores)
+        return cores
+
+
+class ProcessResources:
+    def __init__(self, bot_logger: BotLogger, process_config: Optional[ProcessConfig]):
+        self._bot_logger: BotLogger = bot_logger
+        self._config: ProcessConfig = process_config if process_config else ProcessConfig()
+        self._affinity: list[int] = []
+        if self._config.affinity == "auto":
+            self._affinity = AffinityAllocator.allocate(self._config.gomaxprocs or 1, self._config.reserved)
+        elif isinstance(self._config.affinity, list):
+            self._affinity = self._config.affinity
+
+    def get_sample_interval(self) -> int:
+        return self._config.sample_interval
+
+    def get_sample_history(self) -> int:
+        return self._config.sample_history
+
+    def get_affinity(self) -> list[int]:
+        return self._affinity
+
+    def get_env(self) -> dict[str, str]:
+        env: dict[str, str] = dict(os.environ)
+        # the go runtime sizes itself from the affinity, pinned explicitly in case taskset is missing
+        gomaxprocs: Optional[int] = self._config.gomaxprocs or (len(self._affinity) if self._affinity else None)
+        if gomaxprocs:
+            env["GOMAXPROCS"] = str(gomaxprocs)
+        if self._config.gogc is not None:
+            env["GOGC"] = str(self._config.gogc)
+        return env
+
+    def get_command_prefix(self) -> list[str]:
+        """
+        Affinity and niceness are per thread on linux, they are set before the exec so every go runtime thread inherits them.
+        """
+        prefix: list[str] = []
+        if self._config.ionice_class is not None:
+            prefix += self._get_tool("ionice", "the io priority", ["-c", str(self._config.ionice_class)] + (["-n", str(self._config.ionice_level)] if self._config.ionice_level is not None else []))
+        if self._affinity:
+            prefix += self._get_tool("taskset", "the cpu affinity", ["-c", ",".join(str(core) for core in self._affinity)])
+        if self._config.nice is not None:
+            prefix += self._get_tool("nice", "the niceness", ["-n", str(self._config.nice)])
+        return prefix
+
+    def _get_tool(self, name: str, setting: str, args: list[str]) -> list[str]:
+        path: Optional[str] = shutil.which(name)
+        if not path:
+            self._bot_logger.warning(f"{name} not found, ignoring {setting}")
+            return []
+        return [path] + args
+
+    def apply(self, pid: int):
+        # the open files limit is per process, it can follow the exec
+        try:
+            if self._config.nofile is not None and resource:
+                _, hard = resource.prlimit(pid, resource.RLIMIT_NOFILE)
+                resource.prlimit(pid, resource.RLIMIT_NOFILE, (self._config.nofile, max(self._config.nofile, hard)))
+        except (OSError, AttributeError) as e:
+            self._bot_logger.warning(f"Unable to apply process resources to {pid}: {e}")
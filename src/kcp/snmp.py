@@ -0,0 +1,69 @@
+import hashlib
+import os
+from typing import Optional, Final
+
+
+class TunnelSample:
+    def __init__(self, out_segs: int = 0, retrans_segs: int = 0, lost_segs: int = 0, fec_recovered: int = 0, rtt: Optional[float] = None, unix: int = 0):
+        # counters of a single kcptun snmp period, kcptun resets them after every log line
+        self.out_segs: int = out_segs
+        self.retrans_segs: int = retrans_segs
+        self.lost_segs: int = lost_segs
+        self.fec_recovered: int = fec_recovered
+        # ms, from the tunnel probe
+        self.rtt: Optional[float] = rtt
+        self.unix: int = unix
+
+    def get_loss(self) -> Optional[float]:
+        """
+        @return: % of the sent segments that were retransmitted, None when too few went out to tell.
+        """
+        if self.out_segs < SnmpLog.MIN_SEGS:
+            return None
+        return self.retrans_segs / self.out_segs * 100
+
+    def __repr__(self):
+        loss: Optional[float] = self.get_loss()
+        return f"TunnelSample[loss={'-' if loss is None else f'{loss:.2f}%'}, rtt={'-' if self.rtt is None else f'{self.rtt:.1f}ms'}, out={self.out_segs}, lost={self.lost_segs}, fec={self.fec_recovered}]"
+
+
+class SnmpLog:
+    """
+    Reads the csv written by kcptun -snmplog, a header line and one line of counters per -snmpperiod.
+    """
+    # fewer segments in a period say nothing about the link
+    MIN_SEGS: Final[int] = 200
+    TAIL_BYTES: Final[int] = 4096
+    # hex digits spelled with letters that are not part of a go time layout, kcptun formats the path with time.Format
+    LETTERS: Final[str] = "abcdefghijklnoqr"
+
+    @classmethod
+    def get_path(cls, name: str, directory: str = "") -> str:
+        """
+        @param directory: relative to where kcptun runs, must not contain digits or layout words.
+        """
+        spelled: str = "".join(cls.LETTERS[int(c, 16)] for c in hashlib.sha1(name.encode("utf-8")).hexdigest()[:12])
+        return os.path.join(directory, f"kcpbot-snmp-{spelled}.csv")
+
+    @classmethod
+    def parse(cls, header: str, line: str) -> Optional[TunnelSample]:
+        keys: list[str] = header.strip().split(",")
+        values: list[str] = line.strip().split(",")
+        if len(keys) != len(values) or keys[0] != "Unix" or values[0] == "Unix":
+            return None
+        try:
+            counters: dict[str, int] = {key: int(value) for key, value in zip(keys, values)}
+        except ValueError:
+            return None
+        return TunnelSample(counters.get("OutSegs", 0), counters.get("RetransSegs", 0), counters.get("LostSegs", 0), counters.get("FECRecovered", 0), unix=counters["Unix"])
+
+    @classmethod
+    def read_last(cls, path: str) -> Optional[TunnelSample]:
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            header: str = f.readline().decode("utf-8", errors="replace")
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - cls.TAIL_BYTES))
+            lines: list[str] = [line for line in f.read().decode("utf-8", errors="replace").splitlines() if line.strip()]
+        return cls.parse(header, lines[-1]) if lines else None
@@ -0,0 +1,32 @@
+import threading
+from typing import Callable, Optional
+
+from src.decorators.background import background
+from src.logger.bot_logger import BotLogger
+
+
+class UpgradeMonitor:
+    def __init__(self, bot_logger: BotLogger, name: str, interval: int, check: Callable[[], None]):
+        self._bot_logger: BotLogger = bot_logger
+        self._name: str = name
+        self._interval: int = interval
+        self._check: Callable[[], None] = check
+        self._thread: Optional[threading.Thread] = None
+        self._stop: threading.Event = threading.Event()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = self._monitor()
+
+    def stop(self):
+        self._stop.set()
+
+    @background("UPGRADE_MONITOR")
+    def _monitor(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self._check()
+            except Exception as e:
+                self._bot_logger.error(f"{self._name} upgrade check failed: {e}")
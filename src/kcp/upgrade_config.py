@@ -0,0 +1,13 @@
+from typing import Optional
+
+
+class UpgradeConfig:
+    def __init__(self, enabled: bool = False, interval: int = 3600, alt_listen: Optional[str] = None, health_timeout: int = 15, drain_timeout: int = 300):
+        self.enabled: bool = enabled
+        # seconds between release checks
+        self.interval: int = interval
+        # clients only, the new instance starts here next to the old one and both ports swap on every upgrade,
+        # applications only keep working through a front that follows the current port, a fanin entry naming the client
+        self.alt_listen: Optional[str] = alt_listen
+        self.health_timeout: int = health_timeout
+        self.drain_timeout: int = drain_timeout
@@ -0,0 +1,48 @@
+import math
+from typing import Final, Optional
+
+
+class WindowSizing:
+    """
+    kcptun windows (in packets) and socket buffers (in bytes) sized from the bandwidth-delay product of the path.
+    """
+    MTU: Final[int] = 1350
+    # kcp fast modes keep retransmissions in flight next to new data
+    HEADROOM: Final[float] = 2.0
+    # never below the kcptun server defaults, short paths keep what they had
+    MIN_WND: Final[int] = 1024
+    MAX_WND: Final[int] = 32768
+    MIN_SOCKBUF: Final[int] = 4 * 1024 * 1024
+    MAX_SOCKBUF: Final[int] = 64 * 1024 * 1024
+
+    def __init__(self, bdp: int, sndwnd: int, rcvwnd: int, sockbuf: int):
+        # bytes in flight to fill the path
+        self.bdp: int = bdp
+        self.sndwnd: int = sndwnd
+        self.rcvwnd: int = rcvwnd
+        self.sockbuf: int = sockbuf
+
+    @classmethod
+    def compute(cls, bandwidth: int, rtt: float) -> "WindowSizing":
+        """
+        @param bandwidth: target in Mbit/s.
+        @param rtt: round trip time to the remote in ms.
+        """
+        bdp: int = int(bandwidth * 1_000_000 / 8 * rtt / 1000)
+        wnd: int = min(max(math.ceil(bdp * cls.HEADROOM / cls.MTU), cls.MIN_WND), cls.MAX_WND)
+        sockbuf: int = min(max(int(bdp * cls.HEADROOM), cls.MIN_SOCKBUF), cls.MAX_SOCKBUF)
+        return cls(bdp, wnd, wnd, sockbuf)
+
+    @classmethod
+    def get_clamp_warnings(cls, sockbuf: int, rmem_max: Optional[int], wmem_max: Optional[int]) -> list[str]:
+        """
+        The kernel silently caps SO_RCVBUF and SO_SNDBUF to these limits.
+        """
+        warnings: list[str] = []
+        for name, limit in (("net.core.rmem_max", rmem_max), ("net.core.wmem_max", wmem_max)):
+            if limit is not None and limit < sockbuf:
+                warnings.append(f"{name}={limit} clamps sockbuf={sockbuf}, raise it with 'sysctl -w {name}={sockbuf}'")
+        return warnings
+
+    def __repr__(self):
+        return f"WindowSizing[bdp={self.bdp}, sndwnd={self.sndwnd}, rcvwnd={self.rcvwnd}, sockbuf={self.sockbuf}]"
@@ -0,0 +1,9 @@
+class LogConfig:
+    def __init__(self, enabled: bool = True, log_dir: str = "logs", max_size: int = 1024 * 1024, max_total_size: int = 20 * 1024 * 1024, memory_lines: int = 200, trace: bool = True):
+        self.enabled: bool = enabled
+        self.log_dir: str = log_dir
+        self.max_size: int = max_size
+        self.max_total_size: int = max_total_size
+        self.memory_lines: int = memory_lines
+        # phase timings of the handlers, written next to the process logs
+        self.trace: bool = trace
@@ -0,0 +1,90 @@
+import gzip
+import os
+import shutil
+import threading
+from collections import deque
+from datetime import datetime
+from threading import Thread
+from typing import Optional, BinaryIO
+
+from src.decorators.background import background
+from src.logger.log_config import LogConfig
+
+
+class ProcessLogger:
+    def __init__(self, name: str, log_config: LogConfig):
+        self._name: str = name
+        self._config: LogConfig = log_config
+        self._lock: threading.Lock = threading.Lock()
+        self._budget_lock: threading.Lock = threading.Lock()
+        self._recent_lines: deque[str] = deque(maxlen=log_config.memory_lines)
+        self._file: Optional[BinaryIO] = None
+        self._size: int = 0
+        self._compressors: list[Thread] = []
+
+    def get_log_path(self) -> str:
+        return os.path.join(self._config.log_dir, f"{self._name}.log")
+
+    def get_recent_lines(self) -> list[str]:
+        with self._lock:
+            return list(self._recent_lines)
+
+    def write_line(self, line: str):
+        with self._lock:
+            self._recent_lines.append(line)
+            if not self._config.enabled:
+                return
+            data: bytes = f"{line}\n".encode("utf-8", errors="replace")
+            if self._file is None:
+                self._open()
+            if self._size > 0 and self._size + len(data) > self._config.max_size:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def wait_compression(self):
+        for compressor in self._compressors.copy():
+            compressor.join()
+
+    def _open(self):
+        os.makedirs(self._config.log_dir, exist_ok=True)
+        self._file = open(self.get_log_path(), "ab")
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        rotated_path: str = f"{self.get_log_path()}.{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        os.replace(self.get_log_path(), rotated_path)
+        self._open()
+        self._compressors = [t for t in self._compressors if t.is_alive()]
+        self._compressors.append(self._compress(rotated_path))
+
+    @background("LOG_COMPRESSOR")
+    def _compress(self, path: str):
+        with open(path, "rb") as src, gzip.open(f"{path}.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+        self._enforce_budget()
+
+    def _get_segments(self) -> list[str]:
+        prefix: str = f"{self._name}.log."
+        segments: list[str] = [f for f in os.listdir(self._config.log_dir) if f.startswith(prefix) and f.endswith(".gz")]
+        return [os.path.join(self._config.log_dir, f) for f in sorted(segments)]
+
+    def _enforce_budget(self):
+        with self._budget_lock:
+            segments: list[str] = self._get_segments()
+            # the active file can still grow up to max_size until the next rotation
+            total: int = sum(os.path.getsize(f) for f in segments) + self._config.max_size
+            while segments and total > self._config.max_total_size:
+                oldest: str = segments.pop(0)
+                total -= os.path.getsize(oldest)
+                os.remove(oldest)
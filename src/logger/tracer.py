@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Iterator, Final
+
+from src.logger.log_config import LogConfig
+
+
+class Span:
+    def __init__(self, handler_type: str, handler_name: str, name: str):
+        self.handler_type: str = handler_type
+        self.handler_name: str = handler_name
+        self.name: str = name
+        self.start: float = time.time()
+        self.duration: Optional[float] = None
+        self.bytes: int = 0
+        self.outcome: str = "ok"
+        self._perf_start: float = time.perf_counter()
+
+    def add_bytes(self, size: int):
+        self.bytes += size
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._perf_start
+
+    def to_dict(self) -> dict:
+        return {
+            "handler_type": self.handler_type,
+            "handler": self.handler_name,
+            "span": self.name,
+            "start": round(self.start, 3),
+            "duration": round(self.duration, 4) if self.duration is not None else None,
+            "bytes": self.bytes,
+            "outcome": self.outcome
+        }
+
+
+class Tracer:
+    """
+    Records how long every phase of a handler took, spans go to a json lines file and percentiles are kept in memory.
+    """
+    FILE_NAME: Final[str] = "spans.jsonl"
+    # durations kept per handler type and span for the percentiles
+    HISTORY: Final[int] = 100
+    PERCENTILES: Final[tuple[int, ...]] = (50, 90, 99)
+    _tracers: dict[str, "Tracer"] = {}
+    _tracers_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, log_config: LogConfig):
+        self._config: LogConfig = log_config
+        self._lock: threading.Lock = threading.Lock()
+        self._durations: dict[tuple[str, str], deque[float]] = {}
+        self._failures: dict[tuple[str, str], int] = {}
+
+    @classmethod
+    def open(cls, log_config: LogConfig) -> "Tracer":
+        with cls._tracers_lock:
+            path: str = os.path.abspath(log_config.log_dir)
+            if path not in cls._tracers:
+                cls._tracers[path] = cls(log_config)
+            return cls._tracers[path]
+
+    def get_path(self) -> str:
+        return os.path.join(self._config.log_dir, self.FILE_NAME)
+
+    @contextmanager
+    def span(self, handler_type: str, handler_name: str, name: str) -> Iterator[Span]:
+        span: Span = Span(handler_type, handler_name, name)
+        try:
+            yield span
+        except BaseException as e:
+            span.outcome = f"error: {e.__class__.__name__}"
+            raise
+        finally:
+            span.finish()
+            self.record(span)
+
+    def record(self, span: Span):
+        key: tuple[str, str] = (span.handler_type, span.name)
+        with self._lock:
+            self._durations.setdefault(key, deque(maxlen=self.HISTORY)).append(span.duration)
+            if span.outcome != "ok":
+                self._failures[key] = self._failures.get(key, 0) + 1
+            if self._config.enabled and self._config.trace:
+                try:
+                    self._write(span)
+                except OSError:
+                    # a full disk or an unwritable log dir must not fail the phase that was measured
+                    pass
+
+    def _write(self, span: Span):
+        os.makedirs(self._config.log_dir, exist_ok=True)
+        path: str = self.get_path()
+        # a single old generation is kept, spans are only useful while they are recent
+        if os.path.isfile(path) and os.path.getsize(path) > self._config.max_size:
+            os.replace(path, f"{path}.1")
+        with open(path, "a") as f:
+            f.write(json.dumps(span.to_dict()) + "\n")
+
+    @classmethod
+    def percentile(cls, values: list[float], percentile: int) -> float:
+        ordered: list[float] = sorted(values)
+        index: int = max(0, min(len(ordered) - 1, -(-percentile * len(ordered) // 100) - 1))
+        return ordered[index]
+
+    def summarize(self, handler_type: Optional[str] = None) -> list[str]:
+        lines: list[str] = []
+        with self._lock:
+            for (type_, name), durations in sorted(self._durations.items()):
+                if handler_type and type_ != handler_type:
+                    continue
+                values: list[float] = list(durations)
+                percentiles: str = " ".join(f"p{p}={self.percentile(values, p):.2f}s" for p in self.PERCENTILES)
+                lines.append(f"{type_} {name}: n={len(values)} {percentiles} failed={self._failures.get((type_, name), 0)}")
+        return lines
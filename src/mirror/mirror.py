@@ -0,0 +1,121 @@
+import functools
+import json
+import os
+from datetime import datetime
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from typing import Final, Optional
+
+from src.decorators.background import background
+from src.helpers.detector import Arch, OS
+from src.helpers.files import sha256_file
+from src.helpers.downloader import Downloader, DownloadException
+from src.helpers.github import Artifact, GithubReleaseClient
+from src.logger.bot_logger import BotLogger
+
+
+class MirrorException(Exception):
+    def __init__(self, msg: str):
+        super(MirrorException, self).__init__(msg)
+
+
+class Mirror:
+    MANIFEST_NAME: Final[str] = "manifest.json"
+
+    def __init__(self, bot_logger: BotLogger, mirror_dir: str):
+        self._bot_logger: BotLogger = bot_logger
+        self._mirror_dir: str = mirror_dir
+        self._manifest: Optional[dict] = None
+
+    def get_mirror_dir(self) -> str:
+        return self._mirror_dir
+
+    def get_manifest_path(self) -> str:
+        return os.path.join(self._mirror_dir, self.MANIFEST_NAME)
+
+    def load_manifest(self) -> dict:
+        if self._manifest is None:
+            if not os.path.isfile(self.get_manifest_path()):
+                raise MirrorException(f"Mirror manifest {self.get_manifest_path()} not found, run the mirror command first!")
+            with open(self.get_manifest_path()) as f:
+                self._manifest = json.loads(f.read())
+        return self._manifest
+
+    def get_kcptun_artifact(self, os_: OS, arch: Arch) -> Optional[Artifact]:
+        return self._get_artifact("kcptun", GithubReleaseClient.get_kcptun_key(os_, arch))
+
+    def get_jar_artifact(self, java_version: str) -> Optional[Artifact]:
+        return self._get_artifact("jar", f"java-{java_version}")
+
+    def get_local_path(self, artifact: Artifact) -> str:
+        return os.path.join(self._mirror_dir, artifact.url)
+
+    def _get_artifact(self, section: str, key: str) -> Optional[Artifact]:
+        entry: Optional[dict] = self.load_manifest().get(section, {}).get(key)
+        if not entry:
+            return None
+        return Artifact(entry.get("name"), entry.get("file"), entry.get("size"), entry.get("sha256"))
+
+    def prefetch(self, release_client: GithubReleaseClient) -> dict:
+        """
+        Resolves the kcptun and jar releases once and downloads every os/arch asset into the mirror directory.
+        @return: the written manifest.
+        """
+        previous: dict = {}
+        if os.path.isfile(self.get_manifest_path()):
+            previous = self.load_manifest()
+        manifest: dict = {"created": datetime.now().isoformat(), "kcptun": {}, "jar": {}}
+        for section, artifacts in (("kcptun", release_client.get_kcptun_artifacts()), ("jar", release_client.get_jar_artifacts())):
+            os.makedirs(os.path.join(self._mirror_dir, section), exist_ok=True)
+            for key, artifact in artifacts.items():
+                manifest[section][key] = self._fetch(section, artifact, previous.get(section, {}).get(key))
+        missing: list[str] = [GithubReleaseClient.get_kcptun_key(o, a) for o in OS for a in Arch if GithubReleaseClient.get_kcptun_key(o, a) not in manifest["kcptun"]]
+        if missing:
+            self._bot_logger.warning(f"No kcptun release asset for: {', '.join(missing)}")
+        tmp_path: str = f"{self.get_manifest_path()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps(manifest, indent=2))
+        os.replace(tmp_path, self.get_manifest_path())
+        self._manifest = manifest
+        self._bot_logger.info(f"Mirror ready with {len(manifest['kcptun'])} kcptun and {len(manifest['jar'])} jar artifacts")
+        return manifest
+
+    def _fetch(self, section: str, artifact: Artifact, previous: Optional[dict]) -> dict:
+        file: str = f"{section}/{artifact.name}"
+        path: str = os.path.join(self._mirror_dir, file)
+        if previous and previous.get("url") == artifact.url and os.path.isfile(path) and sha256_file(path) == previous.get("sha256"):
+            self._bot_logger.info(f"{file} already mirrored")
+            return previous
+        self._bot_logger.info(f"Mirroring {artifact.url}...")
+        try:
+            sha256: str = Downloader().download(artifact.url, path, artifact.size, artifact.sha256)
+        except DownloadException as e:
+            raise MirrorException(f"Unable to mirror {artifact.name}: {e}")
+        return {"name": artifact.name, "file": file, "url": artifact.url, "size": os.path.getsize(path), "sha256": sha256}
+
+
+class MirrorServer:
+    def __init__(self, bot_logger: BotLogger, mirror_dir: str, listen: str):
+        self._bot_logger: BotLogger = bot_logger
+        host, port = listen.rsplit(":", 1)
+        handler = functools.partial(_QuietRequestHandler, directory=os.path.abspath(mirror_dir))
+        self._server: ThreadingHTTPServer = ThreadingHTTPServer((host, int(port)), handler)
+
+    def get_port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._bot_logger.info(f"Serving the artifact mirror on port {self.get_port()}")
+        self._serve()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @background("MIRROR_SERVER")
+    def _serve(self):
+        self._server.serve_forever()
+
+
+class _QuietRequestHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format_: str, *args):
+        pass
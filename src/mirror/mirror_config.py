@@ -0,0 +1,9 @@
+from typing import Optional
+
+
+class MirrorConfig:
+    def __init__(self, mirror_dir: str = "mirror", offline: bool = False, serve: Optional[str] = None, public_url: Optional[str] = None):
+        self.mirror_dir: str = mirror_dir
+        self.offline: bool = offline
+        self.serve: Optional[str] = serve
+        self.public_url: Optional[str] = public_url
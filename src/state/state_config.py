@@ -0,0 +1,6 @@
+class StateConfig:
+    def __init__(self, enabled: bool = True, state_file: str = "state.json", artifact_ttl: int = 86400):
+        self.enabled: bool = enabled
+        self.state_file: str = state_file
+        # seconds a resolved release is trusted before asking github again
+        self.artifact_ttl: int = artifact_ttl
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from typing import Optional, Any, Final
+
+from src.state.state_config import StateConfig
+
+
+class StateStore:
+    """
+    Facts discovered by the handlers (releases, remote arch, panel sessions, deployed binaries) saved in one json file.
+    Every write replaces the whole file atomically, the file holds session cookies so it is only readable by its owner.
+    """
+    VERSION: Final[int] = 1
+    _stores: dict[str, "StateStore"] = {}
+    _stores_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self._path: str = path
+        self._lock: threading.Lock = threading.Lock()
+        self._data: dict = self._read()
+
+    @classmethod
+    def open(cls, path: str) -> "StateStore":
+        with cls._stores_lock:
+            path = os.path.abspath(path)
+            if path not in cls._stores:
+                cls._stores[path] = cls(path)
+            return cls._stores[path]
+
+    def get_path(self) -> str:
+        return self._path
+
+    def get_entry(self, name: str, identity: str) -> dict:
+        with self._lock:
+            entry: Optional[dict] = self._data["handlers"].get(name)
+            if not entry or entry.get("identity") != identity:
+                return {}
+            return dict(entry.get("values", {}))
+
+    def update_entry(self, name: str, identity: str, values: dict, removed: tuple = ()):
+        with self._lock:
+            entry: Optional[dict] = self._data["handlers"].get(name)
+            if not entry or entry.get("identity") != identity:
+                entry = {"identity": identity, "values": {}}
+                self._data["handlers"][name] = entry
+            entry["values"].update(values)
+            for key in removed:
+                entry["values"].pop(key, None)
+            entry["updated"] = time.time()
+            self._write()
+
+    def _read(self) -> dict:
+        try:
+            with open(self._path) as f:
+                data: dict = json.loads(f.read())
+        except (OSError, ValueError):
+            return {"version": self.VERSION, "handlers": {}}
+        if not isinstance(data, dict) or data.get("version") != self.VERSION or not isinstance(data.get("handlers"), dict):
+            return {"version": self.VERSION, "handlers": {}}
+        return data
+
+    def _write(self):
+        directory: str = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path: str = f"{self._path}.tmp"
+        fd: int = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps(self._data, indent=2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+
+
+class HandlerState:
+    """
+    State of a single handler, values are dropped when the identity (host, user...) of the handler changes.
+    Without a store every get returns the default, so handlers always rediscover.
+    """
+    def __init__(self, store: Optional[StateStore], name: str, identity: str):
+        self._store: Optional[StateStore] = store
+        self._name: str = name
+        self._identity: str = identity
+
+    @classmethod
+    def from_config(cls, state_config: StateConfig, name: str, identity: str) -> "HandlerState":
+        return cls(StateStore.open(state_config.state_file) if state_config.enabled else None, name, identity)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if not self._store:
+            return default
+        return self._store.get_entry(self._name, self._identity).get(key, default)
+
+    def set(self, **values: Any):
+        if self._store:
+            self._store.update_entry(self._name, self._identity, values)
+
+    def remove(self, *keys: str):
+        if self._store:
+            self._store.update_entry(self._name, self._identity, {}, keys)
+
+    def get_fresh(self, key: str, max_age: int) -> Optional[dict]:
+        """
+        @return: a value saved with set_fresh, None once it is older than max_age seconds.
+        """
+        entry: Optional[dict] = self.get(key)
+        if not entry or time.time() - entry.get("saved", 0) > max_age:
+            return None
+        return entry.get("value")
+
+    def set_fresh(self, key: str, value: dict):
+        self.set(**{key: {"value": value, "saved": time.time()}})
@@ -1,7 +1,10 @@
 import time
 import traceback
 from threading import Thread
+from typing import Optional
 
+from src.cluster.cluster import ClusterCoordinator
+from src.config.handler_spec import HandlerSpec
 from src.decorators.background import background
 from src.kcp.kcp import KCPHandler
 from src.logger.bot_logger import BotLogger
@@ -9,38 +12,94 @@ from src.thread_executor.executor import ThreadExecutor
 
 
 class ClientExecutor(ThreadExecutor):
-    def __init__(self, bot_logger: BotLogger):
+    TICK_INTERVAL: float = 10.0
+
+    def __init__(self, bot_logger: BotLogger, coordinator: Optional[ClusterCoordinator] = None):
+        """
+        @param coordinator: in cluster mode only the handlers whose lease this node holds are run.
+        """
         super(ClientExecutor, self).__init__()
         self._bot_logger: BotLogger = bot_logger
-        self._client_handlers: list[KCPHandler] = []
-        self._running_handlers: dict[Thread, KCPHandler] = {}
+        self._coordinator: Optional[ClusterCoordinator] = coordinator
+        self._client_handlers: list[HandlerSpec] = []
+        self._known_handlers: set[int] = set()
+        self._running_handlers: dict[Thread, HandlerSpec] = {}
+        # specs between the ownership check and their thread start, by spec id
+        self._starting: set[int] = set()
+        # handlers whose last exit asked for a delay, by spec id
+        self._next_start: dict[int, float] = {}
 
     def add_handler(self, handler: KCPHandler):
-        if handler not in self._client_handlers:
-            self._client_handlers.append(handler)
+        self.add_spec(HandlerSpec.of(handler))
+
+    def add_spec(self, spec: HandlerSpec):
+        """
+        The handler of the spec is only built when it is scheduled for the first time.
+        """
+        key: int = id(spec.get_handler()) if spec.is_built() else id(spec)
+        if key not in self._known_handlers:
+            self._known_handlers.add(key)
+            self._client_handlers.append(spec)
+            if self._coordinator:
+                self._coordinator.add_key(spec.name, lambda: self._is_active(spec))
+
+    def _is_owned(self, spec: HandlerSpec) -> bool:
+        return not self._coordinator or self._coordinator.is_owner(spec.name)
+
+    def _is_active(self, spec: HandlerSpec) -> bool:
+        """
+        True while the handler thread or its kcptun runs, the cluster keeps the lease until then.
+        """
+        if id(spec) in self._starting or any(running is spec and t.is_alive() for t, running in self._running_handlers.copy().items()):
+            return True
+        return spec.is_built() and spec.get_handler().is_running()
 
     def tick(self) -> None:
-        time.sleep(10)
+        time.sleep(self.TICK_INTERVAL)
         self._handler_checker()
         if len(self._running_handlers) >= len(self._client_handlers):
             return
-        active_clients: list[KCPHandler] = list(self._running_handlers.copy().values())
-        for handler in self._client_handlers:
-            if handler not in active_clients:
-                self._running_handlers[self._run_handler(handler)] = handler
-                return
+        active_clients: set[int] = {id(spec) for spec in self._running_handlers.copy().values()}
+        now: float = time.time()
+        for spec in self._client_handlers:
+            if id(spec) in active_clients or self._next_start.get(id(spec), 0.0) > now:
+                continue
+            # marked before the ownership check, the cluster either keeps the lease or this node does not start
+            self._starting.add(id(spec))
+            try:
+                if self._is_owned(spec):
+                    self._next_start.pop(id(spec), None)
+                    self._running_handlers[self._run_handler(spec)] = spec
+                    return
+            finally:
+                self._starting.discard(id(spec))
 
     @background("CLIENT_HANDLER")
-    def _run_handler(self, handler: KCPHandler):
+    def _run_handler(self, spec: HandlerSpec):
         try:
+            handler: KCPHandler = spec.get_handler()
+            handler.prepare()
             handler.download_bin()
             handler.run_kcp()
         except Exception as e:
             traceback.print_exception(e)
             self._bot_logger.error(str(e))
+        if spec.is_built():
+            self._log_trace_summary(spec.get_handler())
+
+    def _log_trace_summary(self, handler: KCPHandler):
+        summary: list[str] = handler.get_trace_summary()
+        if summary:
+            self._bot_logger.info("Phase timings:\n" + "\n".join(summary))
 
     def _handler_checker(self):
-        for t in self._running_handlers.copy().keys():
-            if t.is_alive():
+        for t, spec in self._running_handlers.copy().items():
+            if not self._is_owned(spec) and spec.is_built():
+                # the key went to another node, the lease is released and the handler started there once this one is down
+                spec.get_handler().stop_kcp()
+            if t.is_alive() or (spec.is_built() and spec.get_handler().is_running()):
                 continue
             self._running_handlers.pop(t)
+            delay: Optional[float] = spec.get_handler().get_retry_delay() if spec.is_built() else None
+            if delay:
+                self._next_start[id(spec)] = time.time() + delay
@@ -1,7 +1,7 @@
 import time
 import traceback
 from threading import Thread
-from typing import Optional
+from typing import Optional, Final
 
 from src.decorators.background import background
 from src.kcp.kcp import KCPHandler
@@ -10,26 +10,38 @@ from src.thread_executor.executor import ThreadExecutor
 
 
 class ServerExecutor(ThreadExecutor):
+    RETRY_DELAY: Final[float] = 30.0
+
     def __init__(self, bot_logger: BotLogger, kcp_handler: KCPHandler):
         super(ServerExecutor, self).__init__()
         self._bot_logger: BotLogger = bot_logger
         self._kcp_handler: KCPHandler = kcp_handler
         self._kcp_handler_thread: Optional[Thread] = None
+        # None while the server is running, otherwise when it may start again
+        self._next_start: Optional[float] = 0.0
 
     def tick(self) -> None:
-        if not self._kcp_handler_thread or not self._kcp_handler_thread.is_alive():
-            self._kcp_handler_thread: Optional[Thread] = self._run_server()
+        if (not self._kcp_handler_thread or not self._kcp_handler_thread.is_alive()) and not self._kcp_handler.is_running():
+            if self._next_start is None:
+                delay: Optional[float] = self._kcp_handler.get_retry_delay()
+                delay = self.RETRY_DELAY if delay is None else delay
+                self._bot_logger.warning(f"Process finished! retrying in {delay:.0f} seconds")
+                self._next_start = time.time() + delay
+            if time.time() >= self._next_start:
+                self._next_start = None
+                self._kcp_handler_thread = self._run_server()
 
         time.sleep(10)
 
     @background("SERVER_HANDLER")
     def _run_server(self):
         try:
+            self._kcp_handler.prepare()
             self._kcp_handler.download_bin()
             self._kcp_handler.run_kcp()
         except Exception as e:
             self._bot_logger.error(e)
             traceback.print_exception(e)
-        self._bot_logger.warning("Process finished! retrying in 30 seconds")
-        time.sleep(30)
-        self._kcp_handler_thread: Optional[Thread] = None
+        summary: list[str] = self._kcp_handler.get_trace_summary()
+        if summary:
+            self._bot_logger.info("Phase timings:\n" + "\n".join(summary))
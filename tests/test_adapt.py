@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+from src.config.config import Config, KCPConfigException
+from src.config.settings import BotSettings
+from src.handlers.system.system import SystemHandler
+from src.handlers.handler_config import HandlerConfig
+from src.kcp.adapt import ProfileLadder, AdaptiveController
+from src.kcp.adapt_config import AdaptProfile, AdaptConfig
+from src.kcp.kcp_config import KCPConfig, KCPClientConfig
+from src.kcp.process import KCPProcess
+from src.kcp.snmp import SnmpLog, TunnelSample
+from src.logger.bot_logger import BotLogger
+from src.logger.log_config import LogConfig
+from src.service.mode import ServiceMode
+from src.state.state_config import StateConfig
+
+HEADER: str = "Unix,BytesSent,BytesReceived,OutSegs,RetransSegs,LostSegs,FECRecovered"
+
+
+def profiles() -> list[AdaptProfile]:
+    return [
+        AdaptProfile("clean", "fast2", 0, 0, max_loss=1.0, max_rtt=200),
+        AdaptProfile("lossy", "fast3", 10, 3)
+    ]
+
+
+class AdaptTest(unittest.TestCase):
+    def test_0_snmp(self):
+        sample: TunnelSample = SnmpLog.parse(HEADER, "1700000000,1,1,1000,50,10,5")
+        self.assertEqual(sample.unix, 1700000000)
+        self.assertEqual(sample.get_loss(), 5.0)
+        self.assertIsNone(SnmpLog.parse(HEADER, "1700000000,1,1,10,5,1,0").get_loss())
+        self.assertIsNone(SnmpLog.parse(HEADER, HEADER))
+        path: str = SnmpLog.get_path("client_systemhandler")
+        self.assertFalse(any(c.isdigit() for c in path) or "pm" in path)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log: str = os.path.join(tmp_dir, "snmp.csv")
+            with open(log, "w") as f:
+                f.write(f"{HEADER}\n1,0,0,1000,1,0,0\n2,0,0,1000,90,0,0\n")
+            self.assertEqual(SnmpLog.read_last(log).unix, 2)
+
+    def test_1_ladder(self):
+        ladder: ProfileLadder = ProfileLadder(profiles(), 2)
+        lossy: TunnelSample = TunnelSample(1000, 50)
+        self.assertIsNone(ladder.evaluate(lossy))
+        self.assertEqual(ladder.evaluate(lossy), 1)
+        # within the limits of the clean profile but not by the hysteresis
+        self.assertIsNone(ladder.evaluate(TunnelSample(1000, 8)))
+        self.assertIsNone(ladder.evaluate(TunnelSample(1000, 8)))
+        self.assertIsNone(ladder.evaluate(TunnelSample(1000, 1, rtt=20)))
+        self.assertEqual(ladder.evaluate(TunnelSample(1000, 1, rtt=20)), 0)
+        # an idle link says nothing
+        self.assertIsNone(ladder.evaluate(TunnelSample(10, 10)))
+        self.assertIsNone(ladder.evaluate(TunnelSample(10, 10)))
+
+    def test_2_rate_limits(self):
+        controller: AdaptiveController = AdaptiveController(BotLogger(), "adapt_test", AdaptConfig(profiles(), rounds=1, dwell=600, max_switches=2), lambda: None, lambda profile: None)
+        self.assertEqual(controller.evaluate(TunnelSample(1000, 50, unix=1), 0).name, "lossy")
+        # same snmp window twice
+        self.assertIsNone(controller.evaluate(TunnelSample(1000, 0, rtt=1, unix=1), 700))
+        self.assertIsNone(controller.evaluate(TunnelSample(1000, 0, rtt=1, unix=2), 100))
+        self.assertEqual(controller.evaluate(TunnelSample(1000, 0, rtt=1, unix=3), 700).name, "clean")
+        # dwell passed but two moves were made in the hour
+        self.assertIsNone(controller.evaluate(TunnelSample(1000, 50, unix=4), 1400))
+        self.assertEqual(controller.evaluate(TunnelSample(1000, 50, unix=5), 3700).name, "lossy")
+
+    def test_3_handler(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            settings: BotSettings = BotSettings(LogConfig(False), state_config=StateConfig(True, os.path.join(tmp_dir, "state.json")))
+            kcp_config: KCPConfig = KCPClientConfig("127.0.0.1:1", "127.0.0.1:2", "key", conn=1)
+            kcp_config.adapt = AdaptConfig(profiles(), interval=30)
+            handler: SystemHandler = SystemHandler(BotLogger(), ServiceMode.CLIENT, kcp_config, HandlerConfig(), settings, "adapt_test")
+            self.assertEqual((kcp_config.mode, kcp_config.datashard, kcp_config.parityshard), ("fast2", 0, 0))
+            command: list[str] = KCPProcess(BotLogger(), True, kcp_config, None).build_command("kcptun")
+            self.assertIn("--snmplog", command)
+            self.assertEqual(command[command.index("--snmpperiod") + 1], "30")
+            handler._switch_profile(kcp_config.adapt.profiles[1])
+            self.assertEqual((kcp_config.mode, kcp_config.datashard, kcp_config.parityshard), ("fast3", 10, 3))
+            # the profile survives a restart of the bot
+            restarted: SystemHandler = SystemHandler(BotLogger(), ServiceMode.CLIENT, kcp_config, HandlerConfig(), settings, "adapt_test")
+            self.assertEqual(restarted.get_adapt_controller().get_profile().name, "lossy")
+
+    def test_4_config(self):
+        config: Config = Config(BotLogger())
+        kcp: dict = {"remote": "1.2.3.4:1", "listen": ":25566", "password": "test123", "datashard": 0}
+        adapt: dict = {"profiles": [{"name": "clean", "mode": "fast2", "max_loss": 1.5}, {"name": "lossy", "datashard": 10, "parityshard": 3}]}
+        client: KCPConfig = config.get_kcp_config({"kcp": kcp, "adapt": adapt}, "client")
+        self.assertEqual(client.datashard, 0)
+        self.assertEqual(client.adapt.profiles[0].max_loss, 1.5)
+        self.assertEqual(client.adapt.profiles[1].parityshard, 3)
+        self.assertRaises(KCPConfigException, config.get_kcp_config, {"kcp": kcp, "adapt": {"profiles": adapt["profiles"][1:]}}, "client")
+        self.assertRaises(KCPConfigException, config.get_kcp_config, {"kcp": kcp, "adapt": {"profiles": [{"name": "a"}, {"name": "b"}]}}, "client")
+
+
+if __name__ == "__main__":
+    unittest.main()
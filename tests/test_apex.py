@@ -0,0 +1,185 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from typing import Optional
+
+from requests import Response
+from requests.cookies import cookiejar_from_dict
+
+from src.config.keys import KeyNotValidTypeException
+from src.config.settings import BotSettings
+from src.handlers.apex.apex import ApexHandler, ApexStartException
+from src.handlers.apex.apex_config import ApexHandlerConfig
+from src.handlers.apex.apex_server import ApexServer
+from src.helpers.artifacts import ArtifactProvider
+from src.helpers.ftp import FTPLogTail
+from src.helpers.github import Artifact
+from src.kcp.exit_cause import ExitCause
+from src.kcp.kcp_config import KCPClientConfig
+from src.logger.bot_logger import BotLogger
+from src.logger.log_config import LogConfig
+from src.service.mode import ServiceMode
+from src.state.state_config import StateConfig
+
+
+class FakeJarProvider(ArtifactProvider):
+    def get_jar_artifact(self, java_version: str) -> Optional[Artifact]:
+        return Artifact(f"apex_java-{java_version}.jar", "fake://jar")
+
+    def fetch(self, artifact: Artifact, path: str):
+        with open(path, "wb") as f:
+            f.write(b"jar")
+
+
+class FakeFTP:
+    def __init__(self, data: bytes = b""):
+        self.data: bytes = data
+        self.reads: list[int] = []
+        self.closed: bool = False
+
+    def size(self, file_path: str) -> Optional[int]:
+        return len(self.data)
+
+    def read_from(self, file_path: str, offset: int) -> bytes:
+        self.reads.append(offset)
+        return self.data[offset:]
+
+    def close(self):
+        self.closed = True
+
+
+class ApexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd: str = os.getcwd()
+        self.tmp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def _handler(self, servers=None) -> ApexHandler:
+        settings: BotSettings = BotSettings(LogConfig(False), state_config=StateConfig(True, os.path.join(self.tmp_dir.name, "state.json")))
+        kcp_config: KCPClientConfig = KCPClientConfig("1.2.3.4:25566", ":25566", "key", conn=1)
+        handler: ApexHandler = ApexHandler(BotLogger(), ServiceMode.CLIENT, kcp_config, ApexHandlerConfig("user", "pass", servers), settings, "apex_test")
+        handler._artifacts = FakeJarProvider()
+        return handler
+
+    def test_0_server_ids(self):
+        r: Response = Response()
+        r._content = b'<a href="/server/12">a</a><a href="/server/index/12"></a><a href="/server/7">b</a><a href="/server/12/files"></a>'
+        self.assertEqual(ApexHandler._get_server_ids(r), ["12", "7"])
+
+    def test_1_select_servers(self):
+        self.assertEqual(ApexHandlerConfig("u", "p").select_servers(["12", "7"]), ["12"])
+        self.assertEqual(ApexHandlerConfig("u", "p", "all").select_servers(["12", "7"]), ["12", "7"])
+        self.assertEqual(ApexHandlerConfig("u", "p", ["7", "99"]).select_servers(["12", "7"]), ["7"])
+
+    def test_2_servers_key(self):
+        base: dict = {"panel_user": "u", "panel_pass": "p"}
+        self.assertIsNone(ApexHandlerConfig.from_dict({"config": base}).servers)
+        self.assertEqual(ApexHandlerConfig.from_dict({"config": {**base, "servers": "all"}}).servers, "all")
+        self.assertEqual(ApexHandlerConfig.from_dict({"config": {**base, "servers": [12, "7"]}}).servers, ["12", "7"])
+        self.assertEqual(ApexHandlerConfig.from_dict({"config": {**base, "servers": 12}}).servers, ["12"])
+        self.assertRaises(KeyNotValidTypeException, ApexHandlerConfig.from_dict, {"config": {**base, "servers": {"id": 1}}})
+
+    def test_3_session_follows_selection(self):
+        handler: ApexHandler = self._handler()
+        handler._servers = [ApexServer("12", "1.1.1.1", "25565")]
+        handler._cookies = cookiejar_from_dict({"session": "1"})
+        handler._save_session()
+
+        other: ApexHandler = self._handler("all")
+        other._request = lambda *args, **kwargs: self.fail("an outdated session should not reach the panel")
+        self.assertFalse(other._restore_session())
+        self.assertIsNone(other._state.get("session"))
+
+    def test_4_parallel_deploy(self):
+        handler: ApexHandler = self._handler("all")
+        servers: list[ApexServer] = [ApexServer(str(i)) for i in range(3)]
+        active: list[int] = []
+        overlaps: list[int] = []
+        applied: list[str] = []
+        lock: threading.Lock = threading.Lock()
+
+        def upload(server: ApexServer):
+            self.assertTrue(os.path.isfile(f"{handler._RESOURCES_DIR}/apex_java-8.jar"))
+            with lock:
+                active.append(1)
+                overlaps.append(len(active))
+            time.sleep(0.1)
+            with lock:
+                active.pop()
+
+        def restore() -> bool:
+            handler._servers = servers
+            return True
+
+        handler._restore_session = restore
+        handler._save_session = lambda: None
+        handler._ftp_upload = upload
+        handler._apply_changes = lambda server: applied.append(server.server_id)
+        handler.download_bin()
+        self.assertEqual(applied, ["0", "1", "2"])
+        self.assertGreater(max(overlaps), 1)
+        self.assertFalse(os.path.isdir(handler._RESOURCES_DIR))
+
+        # already deployed everywhere but on the new server
+        servers.append(ApexServer("3"))
+        applied.clear()
+        handler.download_bin()
+        self.assertEqual(applied, ["3"])
+
+    def test_5_log_tail(self):
+        ftp: FakeFTP = FakeFTP(b"old run\n")
+        tail: FTPLogTail = FTPLogTail(ftp, "data/kcp.log")
+        self.assertEqual(tail.read_lines(), [])
+        ftp.data += b"version: 1\r\nlisten"
+        self.assertEqual(tail.read_lines(), ["version: 1"])
+        ftp.data += b"ing on: 1.2.3.4:25566\n"
+        self.assertEqual(tail.read_lines(), ["listening on: 1.2.3.4:25566"])
+        self.assertEqual(ftp.reads, [8, 26])
+        # a truncated log is read again from the start
+        ftp.data = b"fresh\n"
+        self.assertEqual(tail.read_lines(), ["fresh"])
+        self.assertEqual(tail.get_offset(), 6)
+
+    def _run_handler(self, lines: list[bytes]) -> (ApexHandler, FakeFTP):
+        handler: ApexHandler = self._handler()
+        handler._servers = [ApexServer("12", "1.1.1.1", "25565")]
+        handler._csrf_token = "token"
+        handler.LOG_POLL = 0.01
+        ftp: FakeFTP = FakeFTP()
+        handler._open_tails = lambda: {"12": FTPLogTail(ftp, handler.KCP_LOG)}
+        handler._set_ajax_headers = lambda: None
+        handler._probe = lambda server: self.fail("a followed server should not be probed")
+        posts: list[str] = []
+
+        def request(method: str, url: str, **kwargs) -> Response:
+            posts.append(url)
+            ftp.data += b"\n".join(lines) + b"\n"
+            return Response()
+
+        handler._request = request
+        return handler, ftp
+
+    def test_6_ready_from_log(self):
+        handler, ftp = self._run_handler([b"2024/01/01 version: 20240101", b"2024/01/01 listening on: [::]:25566"])
+        # stopped right after the listener was seen, before the first health probe
+        handler.PROBE_INTERVAL = 5.0
+        threading.Timer(0.5, handler._stop_event.set).start()
+        handler.run_kcp()
+        self.assertTrue(ftp.closed)
+        self.assertEqual(len(handler._tracer._durations[("ApexHandler", "ready_wait")]), 1)
+
+    def test_7_permanent_error_from_log(self):
+        handler, ftp = self._run_handler([b"2024/01/01 listen udp :25566: bind: address already in use"])
+        self.assertRaises(ApexStartException, handler.run_kcp)
+        self.assertTrue(ftp.closed)
+        self.assertEqual(handler.get_exit_cause(), ExitCause.BIND_CONFLICT)
+
+
+if __name__ == "__main__":
+    unittest.main()
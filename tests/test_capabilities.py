@@ -0,0 +1,96 @@
+import unittest
+
+from src.config.config import Config
+from src.helpers.capabilities import CapabilityProbe, HostCapabilities
+from src.helpers.network import parse_ping_rtt
+from src.kcp.kcp_config import KCPConfig
+from src.kcp.process import KCPProcess
+from src.kcp.window_sizing import WindowSizing
+from src.logger.bot_logger import BotLogger
+
+X86_CPUINFO: str = """processor\t: 0
+model name\t: Intel(R) Xeon(R)
+flags\t\t: fpu vme sse2 aes avx
+processor\t: 1
+model name\t: Intel(R) Xeon(R)
+flags\t\t: fpu vme sse2 aes avx
+"""
+
+ARM_CPUINFO: str = """processor\t: 0
+BogoMIPS\t: 38.40
+Features\t: half thumb fastmult vfp edsp neon vfpv3 tls vfpv4 idiva idivt
+CPU architecture: 7
+"""
+
+MEMINFO: str = """MemTotal:        1000000 kB
+MemFree:          200000 kB
+MemAvailable:     500000 kB
+"""
+
+
+class CapabilitiesTest(unittest.TestCase):
+    def test_0_parse(self):
+        output: str = f"2\n{CapabilityProbe.SEPARATOR}\n{X86_CPUINFO}{CapabilityProbe.SEPARATOR}\n{MEMINFO}"
+        capabilities: HostCapabilities = CapabilityProbe.parse(output)
+        self.assertEqual(capabilities.cpu_count, 2)
+        self.assertTrue(capabilities.aes)
+        self.assertEqual(capabilities.mem_available, 500000 * 1024)
+        self.assertEqual(CapabilityProbe.parse_cpuinfo(ARM_CPUINFO), (1, False))
+        self.assertEqual(CapabilityProbe.parse("").cpu_count, 1)
+
+    def test_1_openssl_speed(self):
+        line: str = "aes-128-cbc     180563.49k   380105.41k   588032.51k   714451.90k   761069.25k   765788.16k"
+        self.assertAlmostEqual(CapabilityProbe.parse_openssl_speed(line), 765.78816)
+        self.assertIsNone(CapabilityProbe.parse_openssl_speed(""))
+
+    def test_2_selection(self):
+        self.assertEqual(CapabilityProbe.select_crypt(HostCapabilities(8, True, 0)), "aes-128")
+        self.assertEqual(CapabilityProbe.select_crypt(HostCapabilities(1, False, 0)), "salsa20")
+        self.assertEqual(CapabilityProbe.select_crypt(HostCapabilities(1, False, 0, 400.0)), "aes-128")
+        self.assertEqual(CapabilityProbe.select_crypt(HostCapabilities(8, True, 0, 20.0)), "salsa20")
+        self.assertEqual(CapabilityProbe.select_conn(HostCapabilities(1, False, 0)), 1)
+        self.assertEqual(CapabilityProbe.select_conn(HostCapabilities(16, True, 1024 ** 3)), CapabilityProbe.MAX_CONN)
+        self.assertEqual(CapabilityProbe.select_conn(HostCapabilities(16, True, 1024 ** 2)), 1)
+
+    def test_3_pinned_config(self):
+        config: Config = Config(BotLogger())
+        kcp_data: dict = {"remote": "1.2.3.4:25566", "listen": ":25566", "password": "test123"}
+        default: KCPConfig = config.get_kcp_config({"kcp": kcp_data}, "client")
+        self.assertEqual((default.crypt, default.auto_crypt, default.auto_conn), ("aes-192", False, True))
+        auto: KCPConfig = config.get_kcp_config({"kcp": {**kcp_data, "crypt": "auto"}}, "client")
+        self.assertTrue(auto.auto_crypt)
+        pinned: KCPConfig = config.get_kcp_config({"kcp": {**kcp_data, "crypt": "salsa20", "conn": 3}}, "client")
+        self.assertEqual((pinned.crypt, pinned.auto_crypt, pinned.conn, pinned.auto_conn), ("salsa20", False, 3, False))
+
+
+    def test_4_window_sizing(self):
+        # 100 Mbit/s over 200 ms is 2.5 MB in flight
+        sizing: WindowSizing = WindowSizing.compute(100, 200)
+        self.assertEqual(sizing.bdp, 2_500_000)
+        self.assertEqual(sizing.sndwnd, 3704)
+        self.assertEqual(sizing.sockbuf, 5_000_000)
+        short: WindowSizing = WindowSizing.compute(10, 5)
+        self.assertEqual((short.sndwnd, short.sockbuf), (WindowSizing.MIN_WND, WindowSizing.MIN_SOCKBUF))
+        self.assertEqual(WindowSizing.compute(10000, 1000).sndwnd, WindowSizing.MAX_WND)
+        self.assertEqual(len(WindowSizing.get_clamp_warnings(5_000_000, 212992, 8_000_000)), 1)
+        self.assertEqual(WindowSizing.get_clamp_warnings(5_000_000, None, None), [])
+
+        output: str = f"1\n{CapabilityProbe.SEPARATOR}\n{CapabilityProbe.SEPARATOR}\n{CapabilityProbe.SEPARATOR}\n212992\n425984\n"
+        capabilities: HostCapabilities = CapabilityProbe.parse(output)
+        self.assertEqual((capabilities.rmem_max, capabilities.wmem_max), (212992, 425984))
+        self.assertIsNone(CapabilityProbe.parse("").rmem_max)
+        self.assertEqual(parse_ping_rtt("rtt min/avg/max/mdev = 10.1/12.5/15.0/1.2 ms"), 12.5)
+        self.assertEqual(parse_ping_rtt("round-trip min/avg/max = 0.05/0.07/0.1 ms"), 0.07)
+
+    def test_5_window_flags(self):
+        config: Config = Config(BotLogger())
+        kcp_data: dict = {"remote": "1.2.3.4:25566", "listen": ":25566", "password": "test123", "bandwidth": 100, "sndwnd": 2048}
+        kcp_config: KCPConfig = config.get_kcp_config({"kcp": kcp_data}, "client")
+        self.assertEqual((kcp_config.bandwidth, kcp_config.sndwnd, kcp_config.rcvwnd), (100, 2048, None))
+        command: list[str] = KCPProcess(BotLogger(), True, kcp_config, None).build_command("kcptun")
+        self.assertEqual(command[command.index("--sndwnd") + 1], "2048")
+        self.assertNotIn("--rcvwnd", command)
+
+
+if __name__ == "__main__":
+    unittest.main()
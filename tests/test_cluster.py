@@ -0,0 +1,160 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from src.cluster.cluster import ClusterCoordinator, rendezvous_owner
+from src.cluster.cluster_config import ClusterConfig
+from src.cluster.lease import LeaseBackend, MemoryLeaseBackend, SqliteLeaseBackend
+from src.config.handler_spec import HandlerSpec
+from src.kcp.kcp import KCPHandler
+from src.kcp.kcp_config import KCPClientConfig
+from src.handlers.handler_config import HandlerConfig
+from src.logger.bot_logger import BotLogger
+from src.service.mode import ServiceMode
+from src.thread_executor.client_executor import ClientExecutor
+
+KEYS: list[str] = [f"client_{i}" for i in range(20)]
+
+
+class CountingHandler(KCPHandler):
+    def __init__(self, name: str):
+        super().__init__(BotLogger(), ServiceMode.CLIENT, KCPClientConfig("127.0.0.1:1", ":2", "key", conn=1), HandlerConfig(), name=name)
+        self.runs: int = 0
+
+    def download_bin(self):
+        pass
+
+    def run_kcp(self):
+        self.runs += 1
+
+
+class ClusterTest(unittest.TestCase):
+    def _node(self, backend: LeaseBackend, node: str) -> ClusterCoordinator:
+        coordinator: ClusterCoordinator = ClusterCoordinator(BotLogger(), ClusterConfig(True, node, lease_ttl=2, renew_interval=1), backend)
+        for key in KEYS:
+            coordinator.add_key(key)
+        return coordinator
+
+    def test_0_rendezvous(self):
+        nodes: list[str] = ["a", "b", "c"]
+        owners: dict[str, str] = {key: rendezvous_owner(key, nodes) for key in KEYS}
+        self.assertEqual(set(owners.values()), set(nodes))
+        # only the keys of the node that left move
+        after: dict[str, str] = {key: rendezvous_owner(key, ["a", "c"]) for key in KEYS}
+        self.assertTrue(all(after[key] == owner for key, owner in owners.items() if owner != "b"))
+        self.assertIsNone(rendezvous_owner("key", []))
+
+    def _backend_leases(self, backend: LeaseBackend):
+        self.assertTrue(backend.acquire("k", "a", 10))
+        self.assertFalse(backend.acquire("k", "b", 10))
+        self.assertTrue(backend.acquire("k", "a", 10))
+        backend.release("k", "b")
+        self.assertEqual(backend.get_owner("k"), "a")
+        # an expired lease is free
+        self.assertTrue(backend.acquire("x", "a", -1))
+        self.assertTrue(backend.acquire("x", "b", 10))
+        backend.heartbeat("a", 10)
+        backend.heartbeat("b", -1)
+        self.assertEqual(backend.get_nodes(), ["a"])
+        backend.leave("a")
+        self.assertEqual(backend.get_nodes(), [])
+        self.assertIsNone(backend.get_owner("k"))
+
+    def test_1_memory_backend(self):
+        self._backend_leases(MemoryLeaseBackend())
+
+    def test_2_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._backend_leases(SqliteLeaseBackend(os.path.join(tmp_dir, "cluster.db")))
+
+    def test_3_rebalance(self):
+        backend: MemoryLeaseBackend = MemoryLeaseBackend()
+        a: ClusterCoordinator = self._node(backend, "a")
+        b: ClusterCoordinator = self._node(backend, "b")
+        a.rebalance()
+        self.assertEqual(a.get_owned(), set(KEYS))
+        # b joins, a hands over its keys and b picks them up on its next round
+        b.rebalance()
+        a.rebalance()
+        b.rebalance()
+        self.assertEqual(a.get_owned() | b.get_owned(), set(KEYS))
+        self.assertFalse(a.get_owned() & b.get_owned())
+        self.assertTrue(b.get_owned())
+        # a stops renewing, b takes over once its heartbeat and its leases expired
+        time.sleep(2.1)
+        b.rebalance()
+        self.assertEqual(b.get_owned(), set(KEYS))
+        # a leaving cleanly is taken over right away
+        a.rebalance()
+        a.stop()
+        b.rebalance()
+        self.assertEqual(b.get_owned(), set(KEYS))
+
+    def test_4_executor(self):
+        backend: MemoryLeaseBackend = MemoryLeaseBackend()
+        coordinator: ClusterCoordinator = ClusterCoordinator(BotLogger(), ClusterConfig(True, "a", lease_ttl=2, renew_interval=1), backend)
+        executor: ClientExecutor = ClientExecutor(BotLogger(), coordinator)
+        executor.TICK_INTERVAL = 0
+        handlers: list[CountingHandler] = [CountingHandler(key) for key in KEYS[:2]]
+        for handler in handlers:
+            executor.add_spec(HandlerSpec.of(handler))
+        # another node holds the lease of the first client
+        other: str = next(node for node in (f"node_{i}" for i in range(100)) if rendezvous_owner(KEYS[0], [node, "a"]) == node and rendezvous_owner(KEYS[1], [node, "a"]) == "a")
+        backend.heartbeat(other, 10)
+        backend.acquire(KEYS[0], other, 10)
+        coordinator.rebalance()
+        for _ in range(4):
+            executor.tick()
+            time.sleep(0.05)
+        self.assertEqual([handler.runs > 0 for handler in handlers], [False, True])
+
+    def test_5_handover_waits_for_handler(self):
+        backend: MemoryLeaseBackend = MemoryLeaseBackend()
+        a: ClusterCoordinator = self._node(backend, "a")
+        running: set[str] = set(KEYS)
+        for key in KEYS:
+            a.add_key(key, lambda k=key: k in running)
+        a.rebalance()
+        b: ClusterCoordinator = self._node(backend, "b")
+        b.rebalance()
+        a.rebalance()
+        moved: set[str] = set(KEYS) - a.get_owned()
+        self.assertTrue(moved)
+        # a still runs the handlers, so it keeps renewing their leases
+        self.assertEqual(a.get_draining(), moved)
+        self.assertFalse(any(a.is_owner(key) for key in moved))
+        b.rebalance()
+        self.assertFalse(b.get_owned())
+        # once they stopped the leases go to b
+        running.clear()
+        a.rebalance()
+        self.assertFalse(a.get_draining())
+        b.rebalance()
+        self.assertEqual(b.get_owned(), moved)
+
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc/self/fd")
+    def test_6_sqlite_locked(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path: str = os.path.join(tmp_dir, "cluster.db")
+            backend: SqliteLeaseBackend = SqliteLeaseBackend(path)
+            backend.TIMEOUT = 0.1
+            opened: int = len(os.listdir("/proc/self/fd"))
+            # another node holding the write lock past the timeout
+            other: sqlite3.Connection = sqlite3.connect(path, isolation_level=None)
+            other.execute("BEGIN IMMEDIATE")
+            try:
+                for _ in range(5):
+                    self.assertRaises(sqlite3.OperationalError, backend.heartbeat, "a", 10)
+            finally:
+                other.execute("ROLLBACK")
+                other.close()
+            # sqlite defers closing a file another connection of the process holds locks on
+            self.assertEqual(len(os.listdir("/proc/self/fd")), opened)
+            backend.heartbeat("a", 10)
+            self.assertEqual(backend.get_nodes(), ["a"])
+
+if __name__ == "__main__":
+    unittest.main()
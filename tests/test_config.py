@@ -1,6 +1,9 @@
+import os
+import tempfile
 import unittest
 
 from src.config.config import Config, KCPConfigException, KeyNotFoundException, KeyNotValidTypeException, InvalidHandlerException
+from src.config.handler_spec import HandlerSpec
 from src.handlers.apex.apex import ApexHandler
 from src.handlers.apex.apex_config import ApexHandlerConfig
 from src.handlers.handler_config import HandlerConfig
@@ -118,6 +121,36 @@ class ConfigTest(unittest.TestCase):
         instance: dict = {"handler": "idk"}
         self.assertRaises(InvalidHandlerException, self.config.get_handler_config, instance)
 
+    def test_8_compiled_specs(self):
+        client: str = "  - handler: system\n    kcp: {remote: 1.2.3.4:25566, listen: ':25566', password: test123}\n"
+        content: str = "state: {enabled: false}\nserver:\n  handler: system\n  kcp: {target: 1.2.3.4:25566, listen: ':25566', password: test123}\nclients:\n" + client * 50
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path: str = os.path.join(tmp_dir, "config.yml")
+            cache_path: str = os.path.join(tmp_dir, "config.cache")
+            with open(config_path, "w") as f:
+                f.write(content)
+            config: Config = Config(BotLogger(), cache_path=cache_path)
+            server, clients = config.read_specs(open(config_path))  # type: HandlerSpec, list[HandlerSpec]
+            self.assertEqual(len(clients), 50)
+            self.assertEqual(clients[49].name, "client_49")
+            self.assertFalse(any(spec.is_built() for spec in [server, *clients]))
+            self.assertFalse(hasattr(server, "__dict__"))
+            self.assertFalse(config.get_settings().state_config.enabled)
+            self.assertTrue(os.path.isfile(cache_path))
+
+            # an unchanged file is served from the compiled cache
+            cached: Config = Config(BotLogger(), cache_path=cache_path)
+            cached._parse = lambda *args: self.fail("the compiled config should have been used")
+            server, clients = cached.read_specs(open(config_path))  # type: HandlerSpec, list[HandlerSpec]
+            self.assertEqual(len(clients), 50)
+            self.assertIsInstance(clients[0].get_handler(), SystemHandler)
+            self.assertFalse(clients[1].is_built())
+            self.assertEqual(clients[0].get_handler().get_name(), "client_0")
+
+            with open(config_path, "a") as f:
+                f.write("  - handler: idk\n    kcp: {remote: 1.2.3.4:25566, listen: ':25566', password: test123}\n")
+            self.assertRaises(InvalidHandlerException, Config(BotLogger(), cache_path=cache_path).read_specs, open(config_path))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,120 @@
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+from src.config.config import Config, ConfigException
+from src.diagnostics.diagnostics import Diagnostics, SamplingProfiler, MemoryTracer, DiagnosticsException, dump_stacks
+from src.diagnostics.diagnostics_config import DiagnosticsConfig
+from src.logger.bot_logger import BotLogger
+
+
+def busy(stop: threading.Event):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+class DiagnosticsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.stop: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(target=busy, args=(self.stop,), name="BUSY_TEST", daemon=True)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        self.stop.set()
+        self.thread.join()
+        self.tmp_dir.cleanup()
+
+    def _diagnostics(self, control_socket: str = "") -> Diagnostics:
+        return Diagnostics(BotLogger(), DiagnosticsConfig(False, control_socket, os.path.join(self.tmp_dir.name, "diag"), 1, 5, 10))
+
+    def test_0_stacks(self):
+        stacks: str = dump_stacks()
+        self.assertIn("Thread BUSY_TEST", stacks)
+        self.assertIn("in busy", stacks)
+
+    def test_1_profiler(self):
+        profiler: SamplingProfiler = SamplingProfiler(0.005)
+        profiler.run(0.3)
+        self.assertGreater(profiler.get_samples(), 10)
+        self.assertTrue(any(line.startswith("BUSY_TEST;") and "busy (test_diagnostics.py" in line for line in profiler.get_collapsed().splitlines()))
+        report: str = profiler.get_report(5)
+        self.assertIn("BUSY_TEST", report)
+        if os.path.isdir("/proc/self/task"):
+            self.assertIn("cpu seconds per thread", report)
+
+    def test_2_memory_diff(self):
+        tracer: MemoryTracer = MemoryTracer()
+        self.assertRaises(DiagnosticsException, tracer.diff, 10)
+        tracer.start()
+        try:
+            self.assertRaises(DiagnosticsException, tracer.start)
+            kept: list[bytes] = [bytes(1024) for _ in range(2000)]
+            diff: str = tracer.diff(5)
+            self.assertIn("test_diagnostics.py", diff.splitlines()[1])
+            self.assertTrue(kept)
+        finally:
+            tracer.stop()
+        self.assertFalse(tracer.is_tracing())
+
+    def test_3_commands(self):
+        diagnostics: Diagnostics = self._diagnostics()
+        reply: str = diagnostics.execute("stacks")
+        self.assertTrue(os.path.isfile(reply.rpartition(" ")[2]))
+        reply = diagnostics.execute("profile 0.2")
+        self.assertIn("collapsed stacks in", reply)
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp_dir.name, "diag"))), 3)
+        self.assertIn("failed", diagnostics.execute("profile 1000"))
+        self.assertIn("failed", diagnostics.execute("trace diff"))
+        self.assertIn("unknown command", diagnostics.execute("heap"))
+
+    def test_4_control_socket(self):
+        path: str = os.path.join(self.tmp_dir.name, "diag.sock")
+        diagnostics: Diagnostics = self._diagnostics(path)
+        diagnostics.open_control_socket()
+        try:
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            self.assertIn("memory tracing started", Diagnostics.send(path, "trace start", 5))
+            self.assertIn("memory diff written to", Diagnostics.send(path, "trace diff", 5))
+            self.assertIn("memory tracing stopped", Diagnostics.send(path, "trace stop", 5))
+            # a second bot on the same socket is refused
+            self.assertRaises(DiagnosticsException, self._diagnostics(path).open_control_socket)
+        finally:
+            diagnostics.close()
+        self.assertFalse(os.path.exists(path))
+
+        # a stale socket file is replaced
+        open(path, "w").close()
+        diagnostics.open_control_socket()
+        diagnostics.close()
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "no SIGUSR1")
+    def test_5_signal(self):
+        diagnostics: Diagnostics = self._diagnostics()
+        previous = signal.getsignal(signal.SIGUSR1)
+        diagnostics.install_signals()
+        try:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            diag_dir: str = os.path.join(self.tmp_dir.name, "diag")
+            deadline: float = time.monotonic() + 10
+            while time.monotonic() < deadline and len(os.listdir(diag_dir) if os.path.isdir(diag_dir) else []) < 3:
+                time.sleep(0.1)
+            self.assertEqual(sorted(name.split("-")[0] for name in os.listdir(diag_dir)), ["profile", "profile", "stacks"])
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+            signal.signal(signal.SIGUSR2, signal.SIG_DFL)
+
+    def test_6_config(self):
+        config: Config = Config(BotLogger())
+        settings = config.get_settings_config({"diagnostics": {"socket": "", "profile_seconds": 30}})
+        self.assertEqual(settings.diagnostics_config.control_socket, "")
+        self.assertEqual(settings.diagnostics_config.profile_seconds, 30)
+        self.assertTrue(settings.diagnostics_config.signals)
+        self.assertRaises(ConfigException, config.get_settings_config, {"diagnostics": {"profile_interval": 0}})
+
+
+if __name__ == "__main__":
+    unittest.main()
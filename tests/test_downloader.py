@@ -0,0 +1,158 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+
+from src.helpers.downloader import Downloader, DownloadException
+
+
+class RangeServer(ThreadingHTTPServer):
+    def __init__(self, payload: bytes, ranges: bool = True):
+        super(RangeServer, self).__init__(("127.0.0.1", 0), RangeRequestHandler)
+        self.payload: bytes = payload
+        self.ranges: bool = ranges
+        # the first full response is cut after this many bytes
+        self.drop_after: Optional[int] = None
+        self.requests: list[Optional[str]] = []
+        # status answered to range requests past the first byte instead of a 206, 200 ignores the range
+        self.range_status: Optional[int] = None
+
+    def get_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/asset.tar.gz"
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    server: RangeServer
+
+    def log_message(self, format_: str, *args):
+        pass
+
+    def _send_headers(self, status: int, length: int, content_range: Optional[str] = None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._send_headers(200, len(self.server.payload))
+
+    def do_GET(self):
+        payload: bytes = self.server.payload
+        range_header: Optional[str] = self.headers.get("Range")
+        self.server.requests.append(range_header)
+        match = re.match(r"bytes=(\d+)-(\d*)", range_header or "")
+        status: Optional[int] = self.server.range_status if match and int(match.group(1)) else None
+        if status not in (None, 200):
+            self._send_headers(status, 0)
+            return
+        if match and self.server.ranges and status is None:
+            start: int = int(match.group(1))
+            end: int = int(match.group(2)) if match.group(2) else len(payload) - 1
+            if start >= len(payload):
+                self._send_headers(416, 0)
+                return
+            body: bytes = payload[start:end + 1]
+            self._send_headers(206, len(body), f"bytes {start}-{end}/{len(payload)}")
+        else:
+            body = payload
+            self._send_headers(200, len(body))
+        if self.server.drop_after is not None and not range_header:
+            self.wfile.write(body[:self.server.drop_after])
+            self.server.drop_after = None
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class DownloaderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.path: str = os.path.join(self.tmp_dir.name, "asset.tar.gz")
+        self.payload: bytes = os.urandom(300 * 1024)
+        self.sha256: str = hashlib.sha256(self.payload).hexdigest()
+        self.server: Optional[RangeServer] = None
+
+    def tearDown(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def _serve(self, ranges: bool = True) -> RangeServer:
+        self.server = RangeServer(self.payload, ranges)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def _read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_0_single(self):
+        server: RangeServer = self._serve()
+        self.assertEqual(Downloader().download(server.get_url(), self.path, len(self.payload), self.sha256), self.sha256)
+        self.assertEqual(self._read(), self.payload)
+        self.assertFalse(os.path.exists(f"{self.path}.part"))
+
+    def test_1_parallel_ranges(self):
+        server: RangeServer = self._serve()
+        downloader: Downloader = Downloader(parts=3)
+        downloader.PARALLEL_THRESHOLD = 1024
+        downloader.download(server.get_url(), self.path, sha256=self.sha256)
+        self.assertEqual(self._read(), self.payload)
+        self.assertEqual(len([r for r in server.requests if r]), 3)
+
+    def test_2_resume_dropped_connection(self):
+        server: RangeServer = self._serve()
+        server.drop_after = 100 * 1024
+        Downloader().download(server.get_url(), self.path, len(self.payload), self.sha256)
+        self.assertEqual(self._read(), self.payload)
+        self.assertEqual(server.requests, [None, f"bytes={100 * 1024}-"])
+
+    def test_3_resume_part_file(self):
+        server: RangeServer = self._serve()
+        with open(f"{self.path}.part", "wb") as f:
+            f.write(self.payload[:1000])
+        Downloader().download(server.get_url(), self.path, len(self.payload), self.sha256)
+        self.assertEqual(self._read(), self.payload)
+        self.assertEqual(server.requests, ["bytes=1000-"])
+
+    def test_4_no_range_support(self):
+        server: RangeServer = self._serve(False)
+        with open(f"{self.path}.part", "wb") as f:
+            f.write(b"garbage")
+        downloader: Downloader = Downloader()
+        downloader.PARALLEL_THRESHOLD = 1024
+        downloader.download(server.get_url(), self.path, sha256=self.sha256)
+        self.assertEqual(self._read(), self.payload)
+
+    def test_5_verification(self):
+        server: RangeServer = self._serve()
+        self.assertRaises(DownloadException, Downloader().download, server.get_url(), self.path, sha256="0" * 64)
+        self.assertFalse(os.path.exists(f"{self.path}.part"))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertRaises(DownloadException, Downloader().download, server.get_url(), self.path, len(self.payload) + 1)
+
+
+    def test_6_segments_removed(self):
+        server: RangeServer = self._serve()
+        server.range_status = 200
+        downloader: Downloader = Downloader(parts=3, retries=0)
+        downloader.PARALLEL_THRESHOLD = 1024
+        downloader.download(server.get_url(), self.path, sha256=self.sha256)
+        self.assertEqual(self._read(), self.payload)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["asset.tar.gz"])
+
+        os.remove(self.path)
+        server.range_status = 500
+        self.assertRaises(DownloadException, downloader.download, server.get_url(), self.path, sha256=self.sha256)
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from src.kcp.exec_image import ExecImage
+
+SCRIPT: bytes = f"#!{sys.executable}\nprint('running from', __file__)\n".encode()
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "needs memfd or /dev/shm")
+class ExecImageTest(unittest.TestCase):
+    def _run(self, image: ExecImage) -> str:
+        return subprocess.run([image.get_path()], capture_output=True, timeout=10).stdout.decode()
+
+    @unittest.skipUnless(hasattr(os, "memfd_create"), "needs memfd_create")
+    def test_0_memfd(self):
+        image: ExecImage = ExecImage.load(SCRIPT, "kcptun_test")
+        self.assertTrue(image.is_memfd())
+        self.assertIn("running from", self._run(image))
+        image.close()
+        image.close()
+        self.assertFalse(os.path.exists(image.get_path()))
+
+    def test_1_tmpfs_fallback(self):
+        if not ExecImage.get_tmpfs():
+            self.skipTest("no exec tmpfs")
+        image: ExecImage = ExecImage.load(SCRIPT, "kcptun_test", memfd=False)
+        self.assertFalse(image.is_memfd())
+        self.assertTrue(image.get_path().startswith(ExecImage.get_tmpfs()))
+        self.assertIn("running from", self._run(image))
+        image.close()
+        self.assertFalse(os.path.exists(image.get_path()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import socket
+import sys
+import tarfile
+import tempfile
+import unittest
+
+from src.config.settings import BotSettings
+from src.handlers.handler_config import HandlerConfig
+from src.handlers.system.system import SystemHandler
+from src.helpers.detector import Detector
+from src.helpers.network import check_bind
+from src.kcp.exit_cause import ExitCause, ExitClassifier, ExitBackoff, PreflightException
+from src.kcp.kcp_config import KCPClientConfig
+from src.logger.bot_logger import BotLogger
+from src.logger.log_config import LogConfig
+from src.service.mode import ServiceMode
+from tests.test_upgrade import FakeArtifactProvider, free_port
+
+BAD_ARGS_KCPTUN: str = f"""#!{sys.executable}
+import sys
+print("flag provided but not defined: -bogus", flush=True)
+sys.exit(2)
+"""
+
+
+class ExitCauseTest(unittest.TestCase):
+    def test_0_classify(self):
+        self.assertEqual(ExitClassifier.classify(["listen tcp :25566: bind: address already in use"], 1)[0], ExitCause.BIND_CONFLICT)
+        self.assertEqual(ExitClassifier.classify(["Incorrect Usage. flag provided but not defined: -x"], 1)[0], ExitCause.BAD_ARGS)
+        self.assertEqual(ExitClassifier.classify(["smux: invalid protocol"], 0)[0], ExitCause.CRYPT_MISMATCH)
+        self.assertEqual(ExitClassifier.classify(["dial udp 1.2.3.4:25566: connect: network is unreachable"], 1)[0], ExitCause.TRANSIENT)
+        self.assertEqual(ExitClassifier.classify([], -15)[0], ExitCause.TRANSIENT)
+        self.assertEqual(ExitClassifier.classify(["panic: runtime error"], 2)[0], ExitCause.UNKNOWN)
+
+    def test_1_backoff(self):
+        backoff: ExitBackoff = ExitBackoff()
+        self.assertIsNone(backoff.get_delay())
+        self.assertEqual(backoff.record(ExitCause.TRANSIENT), ExitBackoff.TRANSIENT_DELAY)
+        self.assertEqual(backoff.record(ExitCause.BIND_CONFLICT), ExitBackoff.PERMANENT_BASE)
+        self.assertEqual(backoff.record(ExitCause.BIND_CONFLICT), ExitBackoff.PERMANENT_BASE * 2)
+        for _ in range(10):
+            backoff.record(ExitCause.BIND_CONFLICT)
+        self.assertEqual(backoff.get_delay(), ExitBackoff.PERMANENT_MAX)
+        self.assertEqual(backoff.record(ExitCause.BAD_ARGS), ExitBackoff.PERMANENT_BASE)
+        self.assertEqual(backoff.record(ExitCause.UNKNOWN), ExitBackoff.UNKNOWN_DELAY)
+
+    def test_2_check_bind(self):
+        s: socket.socket = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        s.listen()
+        port: int = s.getsockname()[1]
+        try:
+            error: str = check_bind(f"127.0.0.1:{port}")
+            self.assertIsNotNone(error)
+            self.assertEqual(ExitClassifier.classify([error], None)[0], ExitCause.BIND_CONFLICT)
+        finally:
+            s.close()
+        self.assertIsNone(check_bind(f"127.0.0.1:{port}"))
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "needs /proc")
+class SystemExitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd: str = os.getcwd()
+        self.tmp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        import platform
+        detector: Detector = Detector()
+        binary_name: str = f"client_{detector.detect_os(platform.uname().system).value}_{detector.detect_arch(platform.uname().machine).value}"
+        with open(binary_name, "w") as f:
+            f.write(BAD_ARGS_KCPTUN)
+        os.chmod(binary_name, 0o755)
+        with tarfile.open("fake.tar.gz", "w:gz") as tar:
+            tar.add(binary_name)
+        os.remove(binary_name)
+        self.port: int = free_port()
+        kcp_config: KCPClientConfig = KCPClientConfig("127.0.0.1:1", f"127.0.0.1:{self.port}", "key", conn=1)
+        self.handler: SystemHandler = SystemHandler(BotLogger(), ServiceMode.CLIENT, kcp_config, HandlerConfig(), BotSettings(LogConfig(False)), "exit_test")
+        self.handler._artifacts = FakeArtifactProvider(os.path.abspath("fake.tar.gz"))
+
+    def tearDown(self) -> None:
+        self.handler.stop_kcp()
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_0_bad_args_exit(self):
+        self.handler.download_bin()
+        self.handler.run_kcp()
+        self.assertTrue(self.handler._kcp_process.wait(10))
+        self.assertFalse(self.handler.is_running())
+        self.assertEqual(self.handler.get_exit_cause(), ExitCause.BAD_ARGS)
+        self.assertEqual(self.handler.get_retry_delay(), ExitBackoff.PERMANENT_BASE)
+
+    def test_1_preflight_bind_conflict(self):
+        s: socket.socket = socket.socket()
+        s.bind(("127.0.0.1", self.port))
+        s.listen()
+        try:
+            self.handler.download_bin()
+            self.assertRaises(PreflightException, self.handler.run_kcp)
+        finally:
+            s.close()
+        self.assertIsNone(self.handler._kcp_process)
+        self.assertEqual(self.handler.get_exit_cause(), ExitCause.BIND_CONFLICT)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import socket
+import unittest
+
+from src.config.config import Config, KCPConfigException
+from src.helpers.network import tcp_rtt, parse_address
+from src.kcp.failover import RemoteSelector, RemoteStats
+from src.kcp.kcp_config import KCPConfig
+from src.logger.bot_logger import BotLogger
+
+
+class FailoverTest(unittest.TestCase):
+    def test_0_stats(self):
+        stats: RemoteStats = RemoteStats()
+        self.assertEqual(stats.score(), float("inf"))
+        stats.update([10.0, 20.0, None, None])
+        self.assertEqual(stats.rtt, 15.0)
+        self.assertEqual(stats.loss, 0.5)
+        self.assertEqual(stats.score(), 15.0 + 0.5 * RemoteStats.LOSS_PENALTY)
+
+    def test_1_hysteresis(self):
+        selector: RemoteSelector = RemoteSelector(["a:1", "b:1"], 20, 3)
+        selector.update("a:1", [100.0])
+        selector.update("b:1", [90.0])
+        self.assertEqual(selector.get_best(), "b:1")
+        # better but not by the margin
+        self.assertIsNone(selector.evaluate("a:1"))
+        selector.update("b:1", [10.0])
+        selector.update("b:1", [10.0])
+        self.assertIsNone(selector.evaluate("a:1"))
+        self.assertIsNone(selector.evaluate("a:1"))
+        self.assertEqual(selector.evaluate("a:1"), "b:1")
+        self.assertIsNone(selector.evaluate("b:1"))
+
+    def test_2_probe(self):
+        self.assertEqual(parse_address("[::1]:80"), ("::1", 80))
+        server: socket.socket = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port: int = server.getsockname()[1]
+        self.assertIsNotNone(tcp_rtt(f"127.0.0.1:{port}", 1))
+        server.close()
+        # refused connections still answer
+        self.assertIsNotNone(tcp_rtt(f"127.0.0.1:{port}", 1))
+
+    def test_3_config(self):
+        config: Config = Config(BotLogger())
+        kcp: dict = {"remote": ["1.2.3.4:1", "5.6.7.8:1"], "listen": ":25566", "password": "test123"}
+        client: KCPConfig = config.get_kcp_config({"kcp": kcp, "failover": {"margin": 50}}, "client")
+        self.assertEqual(client.remotes, kcp["remote"])
+        self.assertEqual(client.remote, "1.2.3.4:1")
+        self.assertEqual(client.failover.margin, 50)
+        self.assertRaises(KCPConfigException, config.get_kcp_config, {"kcp": kcp}, "server")
+
+    def test_4_unscored_remotes(self):
+        # neither remote answered tcp, nothing to compare
+        selector: RemoteSelector = RemoteSelector(["a:1", "b:1"], 20, 1)
+        selector.update("a:1", [None])
+        selector.update("b:1", [None])
+        self.assertIsNone(selector.evaluate("a:1"))
+        self.assertIsNone(selector.evaluate("b:1"))
+        # the current one may only drop tcp while its udp tunnel works
+        selector.update("b:1", [10.0])
+        self.assertIsNone(selector.evaluate("a:1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import socket
+import threading
+import unittest
+
+from src.config.config import Config, ConfigException
+from src.fanin.fanin import FanInBackend, FanInBalancer, FanInProxy
+from src.fanin.fanin_config import FanInConfig
+from src.helpers import relay
+from src.logger.bot_logger import BotLogger
+from tests.test_upgrade import free_port
+
+
+class NamedTarget:
+    """
+    Stands for a kcptun client, answers every line with its name.
+    """
+    def __init__(self, name: bytes):
+        self.name: bytes = name
+        self.server: socket.socket = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def get_address(self) -> str:
+        return f"127.0.0.1:{self.server.getsockname()[1]}"
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._answer, args=(client,), daemon=True).start()
+
+    def _answer(self, client: socket.socket):
+        with client:
+            while data := client.recv(65536):
+                client.sendall(self.name + b":" + data)
+
+
+class FanInTest(unittest.TestCase):
+    def test_0_balancer(self):
+        a: FanInBackend = FanInBackend("a", lambda: "127.0.0.1:1")
+        b: FanInBackend = FanInBackend("b", lambda: "127.0.0.1:2", lambda: 5.0)
+        balancer: FanInBalancer = FanInBalancer([a, b])
+        self.assertIs(balancer.pick(now=0), a)
+        self.assertIs(balancer.pick(now=0), b)
+        self.assertIs(balancer.pick(now=0), a)
+        self.assertEqual((a.active, b.active), (2, 1))
+        balancer.failed(a, 10, now=0)
+        self.assertEqual((a.active, a.failures), (1, 1))
+        # a is cooling down
+        self.assertIs(balancer.pick(now=5), b)
+        self.assertIsNone(balancer.pick((b,), now=5))
+        a.add_connect_time(50.0)
+        rtt: FanInBalancer = FanInBalancer([a, b], "rtt")
+        self.assertIs(rtt.pick(now=20), b)
+
+    def test_1_proxy(self):
+        targets: list[NamedTarget] = [NamedTarget(b"a"), NamedTarget(b"b")]
+        dead: FanInBackend = FanInBackend("dead", lambda: f"127.0.0.1:{free_port()}")
+        backends: list[FanInBackend] = [dead] + [FanInBackend(t.name.decode(), t.get_address) for t in targets]
+        proxy: FanInProxy = FanInProxy(BotLogger(), FanInConfig("127.0.0.1:0", cooldown=60), backends)
+        proxy.start()
+        host, port = proxy.get_address().split(":")
+        answers: list[bytes] = []
+        connections: list[socket.socket] = []
+        for _ in range(2):
+            s: socket.socket = socket.create_connection((host, int(port)), timeout=5)
+            connections.append(s)
+            s.sendall(b"x" * 10000)
+            expected: int = 2 + 10000
+            data: bytes = b""
+            while len(data) < expected:
+                data += s.recv(65536)
+            answers.append(data[:2])
+        # the dead backend was skipped, the open connections were spread
+        self.assertEqual(sorted(answers), [b"a:", b"b:"])
+        self.assertEqual(dead.failures, 1)
+        self.assertEqual([backend.active for backend in backends[1:]], [1, 1])
+        for s in connections:
+            s.close()
+        proxy.close()
+
+    def test_2_copy_fallback(self):
+        a, b = socket.socketpair()
+        c, d = socket.socketpair()
+        a.sendall(b"data" * 1000)
+        a.shutdown(socket.SHUT_WR)
+        self.assertEqual(relay._copy(b, c), 4000)
+        self.assertEqual(d.recv(4000, socket.MSG_WAITALL), b"data" * 1000)
+        for s in (a, b, c, d):
+            s.close()
+
+    def test_3_config(self):
+        config: Config = Config(BotLogger())
+        data: dict = {
+            "fanin": {"listen": ":25565", "clients": ["one"], "balance": "rtt"},
+            "server": {"handler": "system", "kcp": {"target": "1.2.3.4:1", "listen": ":2", "password": "p"}},
+            "clients": [{"name": "one", "handler": "system", "kcp": {"remote": "1.2.3.4:1", "listen": ":3", "password": "p"}}]
+        }
+        sections, _ = config._compile(data)
+        self.assertEqual(config.get_settings_config(sections).fanin_configs[0].balance, "rtt")
+        data["fanin"]["clients"] = ["two"]
+        self.assertRaises(ConfigException, config._compile, data)
+
+        # a client swapping ports on upgrades needs a front
+        data["clients"][0]["upgrade"] = {"alt_listen": ":4"}
+        data["fanin"]["clients"] = ["one"]
+        with self.assertNoLogs(config._bot_logger, "WARNING"):
+            config._compile(data)
+        del data["fanin"]
+        with self.assertLogs(config._bot_logger, "WARNING") as logs:
+            config._compile(data)
+        self.assertIn("fanin", logs.output[0])
+
+
+    def test_4_count_after_reset(self):
+        for can_splice in (relay._can_splice, lambda: False):
+            a, b = socket.socketpair()
+            c, d = socket.socketpair()
+            result: list[int] = []
+            can_splice_ = relay._can_splice
+            relay._can_splice = can_splice
+            try:
+                thread: threading.Thread = threading.Thread(target=lambda: result.append(relay.pump(b, c)))
+                thread.start()
+                a.sendall(b"data" * 1000)
+                self.assertEqual(d.recv(4000, socket.MSG_WAITALL), b"data" * 1000)
+                # the destination resets, the bytes already forwarded still count
+                d.close()
+                while thread.is_alive():
+                    try:
+                        a.sendall(b"more")
+                    except OSError:
+                        break
+                    thread.join(0.05)
+                thread.join(5)
+            finally:
+                relay._can_splice = can_splice_
+            self.assertEqual(result, [4000])
+            for s in (a, b, c):
+                s.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+
+from src.helpers.github import GithubReleaseClient
+from src.helpers.github_config import GithubConfig
+from src.kcp.kcp import GithubDownloadException
+from src.logger.bot_logger import BotLogger
+
+RELEASE: dict = {"assets": [{"name": "kcptun-linux-amd64-20240101.tar.gz", "browser_download_url": "https://example.com/a.tar.gz", "size": 10}]}
+
+
+class FakeGithub(ThreadingHTTPServer):
+    def __init__(self):
+        super(FakeGithub, self).__init__(("127.0.0.1", 0), FakeGithubHandler)
+        self.remaining: int = 60
+        self.requests: list[dict[str, str]] = []
+
+    def get_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/repos/xtaci/kcptun/releases/latest"
+
+
+class FakeGithubHandler(BaseHTTPRequestHandler):
+    server: FakeGithub
+
+    def log_message(self, format_: str, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == '"v1"':
+            status, body = 304, b""
+        elif self.server.remaining <= 0:
+            status, body = 403, b'{"message": "API rate limit exceeded"}'
+        else:
+            self.server.remaining -= 1
+            status, body = 200, json.dumps(RELEASE).encode()
+        self.send_response(status)
+        self.send_header("ETag", '"v1"')
+        self.send_header("X-RateLimit-Remaining", str(max(self.server.remaining, 0)))
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GithubTest(unittest.TestCase):
+    def setUp(self) -> None:
+        GithubReleaseClient._responses = {}
+        GithubReleaseClient._remaining, GithubReleaseClient._reset = None, 0.0
+        self.server: FakeGithub = FakeGithub()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        GithubReleaseClient._responses = {}
+        GithubReleaseClient._remaining, GithubReleaseClient._reset = None, 0.0
+
+    def _client(self, token: Optional[str] = None, cache_ttl: int = 0) -> GithubReleaseClient:
+        return GithubReleaseClient(BotLogger(), GithubConfig(token, 5, cache_ttl))
+
+    def test_0_token_and_rate_limit(self):
+        self.assertEqual(self._client("secret")._get_json(self.server.get_url()), RELEASE)
+        self.assertEqual(self.server.requests[0].get("Authorization"), "Bearer secret")
+        self.assertEqual(GithubReleaseClient.get_rate_limit()[0], 59)
+
+    def test_1_etag(self):
+        client: GithubReleaseClient = self._client()
+        client._get_json(self.server.get_url())
+        self.assertEqual(client._get_json(self.server.get_url()), RELEASE)
+        self.assertEqual(self.server.requests[1].get("If-None-Match"), '"v1"')
+        self.assertEqual(self.server.remaining, 59)
+
+    def test_2_shared_lookups(self):
+        self._client(cache_ttl=60)._get_json(self.server.get_url())
+        self._client(cache_ttl=60)._get_json(self.server.get_url())
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_3_near_limit(self):
+        self.server.remaining = 6
+        client: GithubReleaseClient = self._client()
+        client._get_json(self.server.get_url())
+        # 5 left, the last known release is used without asking
+        self.assertEqual(client._get_json(self.server.get_url()), RELEASE)
+        self.assertEqual(len(self.server.requests), 1)
+        GithubReleaseClient._responses = {}
+        self.assertRaises(GithubDownloadException, client._get_json, self.server.get_url())
+
+    def test_4_exhausted(self):
+        client: GithubReleaseClient = self._client()
+        client._get_json(self.server.get_url())
+        self.server.remaining = 0
+        GithubReleaseClient._responses[self.server.get_url()].etag = None
+        GithubReleaseClient._remaining = 60
+        self.assertEqual(client._get_json(self.server.get_url()), RELEASE)
+        self.assertEqual(GithubReleaseClient.get_rate_limit()[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import threading
+import time
+import unittest
+
+from requests import Response
+
+from src.handlers.apex.governor import RequestGovernor
+
+
+def response(status: int, headers: dict[str, str] = None) -> Response:
+    r: Response = Response()
+    r.status_code = status
+    r.headers.update(headers or {})
+    return r
+
+
+class GovernorTest(unittest.TestCase):
+    def test_0_token_bucket(self):
+        governor: RequestGovernor = RequestGovernor(rate=20, burst=2)
+        self.assertEqual(governor.get_wait(), 0)
+        self.assertEqual(governor.get_wait(), 0)
+        self.assertGreater(governor.get_wait(), 0)
+        started: float = time.monotonic()
+        for _ in range(4):
+            governor.acquire()
+        # 4 tokens at 20 per second after the burst is spent
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_1_backoff(self):
+        governor: RequestGovernor = RequestGovernor(rate=100, burst=5)
+        self.assertTrue(governor.report(response(429)))
+        first: float = governor.get_backoff()
+        self.assertAlmostEqual(first, RequestGovernor.BACKOFF_BASE, delta=1)
+        self.assertTrue(governor.report(response(403, {"cf-mitigated": "challenge"})))
+        self.assertAlmostEqual(governor.get_backoff(), RequestGovernor.BACKOFF_BASE * 2, delta=1)
+        self.assertGreater(governor.get_wait(), 0)
+        self.assertFalse(governor.report(response(200)))
+        self.assertEqual(governor.penalize(), RequestGovernor.BACKOFF_BASE)
+
+    def test_2_shared_per_host(self):
+        self.assertIs(RequestGovernor.for_url("https://panel.example.com/site/login"), RequestGovernor.for_url("https://panel.example.com/server/1"))
+        self.assertIsNot(RequestGovernor.for_url("https://panel.example.com/"), RequestGovernor.for_url("https://other.example.com/"))
+
+    def test_3_login_queue(self):
+        governor: RequestGovernor = RequestGovernor()
+        active: list[int] = []
+        overlaps: list[int] = []
+
+        def login():
+            with governor.login_slot():
+                active.append(1)
+                overlaps.append(len(active))
+                time.sleep(0.05)
+                active.pop()
+
+        threads: list[threading.Thread] = [threading.Thread(target=login) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(overlaps, [1, 1, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from src.helpers.artifacts import MirrorArtifactProvider
+from src.helpers.detector import Arch, OS
+from src.helpers.files import sha256_file
+from src.helpers.github import Artifact, GithubReleaseClient
+from src.logger.bot_logger import BotLogger
+from src.mirror.mirror import Mirror, MirrorServer, MirrorException
+
+
+class FakeReleaseClient(GithubReleaseClient):
+    def __init__(self, base_url: str, kcptun: dict[str, str], jar: dict[str, str]):
+        super(FakeReleaseClient, self).__init__(BotLogger())
+        self.kcptun: dict[str, Artifact] = {k: Artifact(v, f"{base_url}/{v}") for k, v in kcptun.items()}
+        self.jar: dict[str, Artifact] = {k: Artifact(v, f"{base_url}/{v}") for k, v in jar.items()}
+
+    def get_kcptun_artifacts(self) -> dict[str, Artifact]:
+        return self.kcptun
+
+    def get_jar_artifacts(self) -> dict[str, Artifact]:
+        return self.jar
+
+
+class MirrorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.upstream_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.mirror_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        for name in ("kcptun-linux-amd64-1.tar.gz", "apex_java-8.jar"):
+            with open(os.path.join(self.upstream_dir.name, name), "wb") as f:
+                f.write(name.encode() * 100)
+        self.upstream: MirrorServer = MirrorServer(BotLogger(), self.upstream_dir.name, "127.0.0.1:0")
+        self.upstream.start()
+        self.client: FakeReleaseClient = FakeReleaseClient(
+            f"http://127.0.0.1:{self.upstream.get_port()}",
+            {"linux-amd64": "kcptun-linux-amd64-1.tar.gz"},
+            {"java-8": "apex_java-8.jar"}
+        )
+
+    def tearDown(self) -> None:
+        self.upstream.stop()
+        self.upstream_dir.cleanup()
+        self.mirror_dir.cleanup()
+
+    def test_0_prefetch(self):
+        manifest: dict = Mirror(BotLogger(), self.mirror_dir.name).prefetch(self.client)
+        self.assertEqual(list(manifest["kcptun"].keys()), ["linux-amd64"])
+        entry: dict = manifest["kcptun"]["linux-amd64"]
+        self.assertEqual(entry["sha256"], sha256_file(os.path.join(self.upstream_dir.name, "kcptun-linux-amd64-1.tar.gz")))
+        self.assertTrue(os.path.isfile(os.path.join(self.mirror_dir.name, entry["file"])))
+
+    def test_1_offline_provider(self):
+        Mirror(BotLogger(), self.mirror_dir.name).prefetch(self.client)
+        provider: MirrorArtifactProvider = MirrorArtifactProvider(BotLogger(), self.mirror_dir.name, "http://10.0.0.1:8000/")
+        self.assertIsNone(provider.get_kcptun_artifact(OS.MACOS, Arch.ARM64))
+        artifact: Artifact = provider.get_kcptun_artifact(OS.LINUX, Arch.AMD64)
+        self.assertEqual(provider.get_remote_url(artifact), "http://10.0.0.1:8000/kcptun/kcptun-linux-amd64-1.tar.gz")
+        path: str = os.path.join(self.mirror_dir.name, "copy.jar")
+        provider.fetch(provider.get_jar_artifact("8"), path)
+        self.assertEqual(sha256_file(path), sha256_file(os.path.join(self.upstream_dir.name, "apex_java-8.jar")))
+
+    def test_2_checksum_mismatch(self):
+        self.client.jar["java-8"].sha256 = "0" * 64
+        self.assertRaises(MirrorException, Mirror(BotLogger(), self.mirror_dir.name).prefetch, self.client)
+
+    def test_3_missing_manifest(self):
+        self.assertRaises(MirrorException, Mirror(BotLogger(), self.mirror_dir.name).get_jar_artifact, "8")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import socket
+import threading
+import time
+import unittest
+
+from src.config.config import Config, KCPConfigException
+from src.kcp.kcp_config import KCPConfig
+from src.kcp.probe import EchoFront, TunnelProbe, ProbeResult, probe_tunnel
+from src.kcp.probe_config import ProbeConfig
+from src.logger.bot_logger import BotLogger
+
+
+class UpperTarget:
+    """
+    Stands for the real target, answers upper cased.
+    """
+    def __init__(self):
+        self.server: socket.socket = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def get_address(self) -> str:
+        return f"127.0.0.1:{self.server.getsockname()[1]}"
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            with client:
+                while data := client.recv(1024):
+                    client.sendall(data.upper())
+
+
+class ProbeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.target: UpperTarget = UpperTarget()
+        self.front: EchoFront = EchoFront(BotLogger(), self.target.get_address(), peek_timeout=0.3)
+        self.front.start()
+
+    def tearDown(self) -> None:
+        self.front.close()
+        self.target.server.close()
+
+    def test_0_probe_round(self):
+        result: ProbeResult = probe_tunnel(self.front.get_address(), ProbeConfig(samples=3, burst=1024 * 1024))
+        self.assertIsNone(result.error)
+        self.assertEqual(len(result.rtts), 3)
+        self.assertGreater(result.goodput, 0)
+        self.assertFalse(result.is_bad(ProbeConfig()))
+        self.assertTrue(result.is_bad(ProbeConfig(max_rtt=0)))
+        self.assertTrue(result.is_bad(ProbeConfig(min_goodput=10 ** 9)))
+
+    def test_1_target_traffic(self):
+        with socket.create_connection(self.front.get_address().split(":")) as s:
+            s.sendall(b"hello")
+            self.assertEqual(s.recv(1024), b"HELLO")
+        # the target talks first, nothing is sent before the peek gives up
+        with socket.create_connection(self.front.get_address().split(":")) as s:
+            time.sleep(0.5)
+            s.sendall(b"late")
+            self.assertEqual(s.recv(1024), b"LATE")
+
+    def test_2_bad_rounds(self):
+        bad: threading.Event = threading.Event()
+        config: ProbeConfig = ProbeConfig(interval=0.05, samples=1, burst=0, max_rtt=0, failures=2, grace=0, timeout=1)
+        probe: TunnelProbe = TunnelProbe(BotLogger(), "probe_test", config, lambda: [self.front.get_address()], bad.set)
+        probe.start()
+        self.assertTrue(bad.wait(5))
+        probe.stop()
+        self.assertEqual(len(probe.get_last_results()), 1)
+        self.assertIsNotNone(probe.get_rtt_percentile(50))
+        # a closed tunnel is a bad round too
+        self.assertIsNotNone(probe_tunnel("127.0.0.1:1", config).error)
+
+    def test_3_config(self):
+        config: Config = Config(BotLogger())
+        kcp: dict = {"remote": "1.2.3.4:1", "listen": ":25566", "password": "test123"}
+        self.assertIsNone(config.get_kcp_config({"kcp": kcp}, "client").probe)
+        client: KCPConfig = config.get_kcp_config({"kcp": kcp, "probe": {"max_rtt": 200}}, "client")
+        self.assertEqual(client.probe.max_rtt, 200)
+        self.assertEqual(client.probe.failures, ProbeConfig().failures)
+        self.assertRaises(KCPConfigException, config.get_kcp_config, {"kcp": kcp, "probe": {"samples": 0}}, "client")
+        self.assertEqual(config.get_kcp_config({"kcp": kcp, "probe": {"peek_timeout": 100}}, "server").probe.peek_timeout, 100)
+        self.assertRaises(KCPConfigException, config.get_kcp_config, {"kcp": kcp, "probe": {"peek_timeout": 0}}, "server")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from src.kcp.proc_sampler import ProcSnapshot, ResourceSeries, ProcessSampler
+from src.logger.bot_logger import BotLogger
+
+MIB: int = 1024 * 1024
+
+
+def snapshot(cpu_ticks: int, rss: int) -> ProcSnapshot:
+    return ProcSnapshot(cpu_ticks, rss, 4, 0, 8, None, None)
+
+
+@unittest.skipUnless(ProcessSampler.is_supported(), "needs /proc")
+class ProcSamplerTest(unittest.TestCase):
+    def test_0_snapshot(self):
+        own: ProcSnapshot = ProcSnapshot.read(os.getpid())
+        self.assertGreater(own.rss, 0)
+        self.assertGreater(own.fds, 0)
+        self.assertGreaterEqual(own.threads, 1)
+        self.assertIsNone(ProcSnapshot.read(2 ** 22 + 1))
+
+    def test_1_baseline(self):
+        series: ResourceSeries = ResourceSeries("sampler_test")
+        tick: int = ProcessSampler.CLK_TCK
+        warnings: list[str] = []
+        at: int = 0
+        # 10% of a core and 20MiB while the baseline is taken
+        for i in range(ResourceSeries.WARMUP + ResourceSeries.BASELINE_SAMPLES + 1):
+            warnings += series.add(1, snapshot(i * tick // 10, 20 * MIB), at)
+            at += 1
+        self.assertEqual(warnings, [])
+        self.assertEqual(series.get_baseline(), (10.0, 20 * MIB))
+        self.assertEqual(len(series.samples), ResourceSeries.WARMUP + ResourceSeries.BASELINE_SAMPLES)
+        # a leak is warned about once, and again after it came back
+        self.assertEqual(len(series.add(1, snapshot((at - 1) * tick // 10, 80 * MIB), at)), 1)
+        self.assertEqual(series.add(1, snapshot(at * tick // 10, 90 * MIB), at + 1), [])
+        self.assertEqual(series.add(1, snapshot((at + 1) * tick // 10, 20 * MIB), at + 2), [])
+        self.assertEqual(len(series.add(1, snapshot((at + 2) * tick // 10, 80 * MIB), at + 3)), 1)
+        # a new process takes its own baseline
+        series.add(2, snapshot(0, 500 * MIB), at + 4)
+        self.assertIsNone(series.get_baseline())
+
+    def test_2_sampler(self):
+        child: subprocess.Popen = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        sampler: ProcessSampler = ProcessSampler(BotLogger())
+        series: ResourceSeries = ResourceSeries("sampler_test")
+        try:
+            sampler.register(child.pid, series, 1)
+            deadline: float = time.time() + 10
+            while not series.samples and time.time() < deadline:
+                time.sleep(0.1)
+            self.assertGreater(series.samples[-1].rss, 0)
+        finally:
+            child.kill()
+            child.wait()
+        deadline: float = time.time() + 10
+        while sampler._thread and time.time() < deadline:
+            time.sleep(0.1)
+        # the gone process was dropped and the thread exited with nothing left to sample
+        self.assertIsNone(sampler._thread)
+
+
+if __name__ == "__main__":
+    unittest.main()
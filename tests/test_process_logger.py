@@ -0,0 +1,58 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from src.logger.log_config import LogConfig
+from src.logger.process_logger import ProcessLogger
+
+
+class ProcessLoggerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.log_config: LogConfig = LogConfig(True, self.tmp_dir.name, 100, 250, 5)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _segments(self) -> list[str]:
+        return sorted(f for f in os.listdir(self.tmp_dir.name) if f.endswith(".gz"))
+
+    def test_0_recent_lines(self):
+        logger: ProcessLogger = ProcessLogger("recent", self.log_config)
+        for i in range(10):
+            logger.write_line(f"line {i}")
+        logger.close()
+        self.assertEqual(logger.get_recent_lines(), [f"line {i}" for i in range(5, 10)])
+
+    def test_1_rotation_compression(self):
+        logger: ProcessLogger = ProcessLogger("rotation", self.log_config)
+        for i in range(6):
+            logger.write_line("x" * 39)
+        logger.wait_compression()
+        logger.close()
+        self.assertLessEqual(os.path.getsize(logger.get_log_path()), 100)
+        segments: list[str] = self._segments()
+        self.assertEqual(len(segments), 2)
+        with gzip.open(os.path.join(self.tmp_dir.name, segments[0]), "rb") as f:
+            self.assertEqual(f.read(), b"x" * 39 + b"\n" + b"x" * 39 + b"\n")
+
+    def test_2_disk_budget(self):
+        logger: ProcessLogger = ProcessLogger("budget", self.log_config)
+        for i in range(200):
+            logger.write_line(os.urandom(30).hex())
+            logger.wait_compression()
+        logger.close()
+        total: int = sum(os.path.getsize(os.path.join(self.tmp_dir.name, f)) for f in os.listdir(self.tmp_dir.name))
+        self.assertLessEqual(total, self.log_config.max_total_size)
+        self.assertGreater(len(self._segments()), 0)
+
+    def test_3_disabled(self):
+        logger: ProcessLogger = ProcessLogger("disabled", LogConfig(False, self.tmp_dir.name))
+        logger.write_line("nothing on disk")
+        self.assertEqual(logger.get_recent_lines(), ["nothing on disk"])
+        self.assertFalse(os.path.exists(logger.get_log_path()))
+
+
+if __name__ == "__main__":
+    unittest.main()
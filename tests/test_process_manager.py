@@ -0,0 +1,98 @@
+import signal
+import sys
+import threading
+import time
+import unittest
+from subprocess import Popen, PIPE, STDOUT
+
+from src.kcp.process_manager import ProcessManager
+from src.logger.bot_logger import BotLogger
+
+
+class ProcessManagerTest(unittest.TestCase):
+    def _spawn(self, code: str) -> Popen:
+        return Popen([sys.executable, "-c", code], stdout=PIPE, stderr=STDOUT)
+
+    def test_0_output_and_exit_codes(self):
+        manager: ProcessManager = ProcessManager(BotLogger())
+        lines: dict[int, list[str]] = {}
+        exit_codes: dict[int, int] = {}
+        done: threading.Event = threading.Event()
+
+        def on_exit(index: int, exit_code: int):
+            exit_codes[index] = exit_code
+            if len(exit_codes) == 5:
+                done.set()
+
+        for i in range(5):
+            lines[i] = []
+            process: Popen = self._spawn(f"import sys\nfor n in range(3): print('line', n, flush=True)\nsys.stdout.write('tail')\nsys.exit({i})")
+            manager.register(process, lines[i].append, lambda exit_code, index=i: on_exit(index, exit_code))
+        self.assertTrue(done.wait(20))
+        self.assertEqual(exit_codes, {i: i for i in range(5)})
+        for i in range(5):
+            self.assertEqual(lines[i], ["line 0", "line 1", "line 2", "tail"])
+        self.assertEqual(manager.get_count(), 0)
+
+    def test_1_terminate(self):
+        manager: ProcessManager = ProcessManager(BotLogger())
+        exited: threading.Event = threading.Event()
+        exit_codes: list[int] = []
+        process: Popen = self._spawn("import time\nprint('ready', flush=True)\ntime.sleep(60)")
+        manager.register(process, lambda line: None, lambda exit_code: (exit_codes.append(exit_code), exited.set()))
+        process.terminate()
+        self.assertTrue(exited.wait(10))
+        self.assertEqual(exit_codes, [-15])
+
+    def test_2_without_pidfd(self):
+        manager: ProcessManager = ProcessManager(BotLogger())
+        manager._use_pidfd = False
+        exited: threading.Event = threading.Event()
+        manager.register(self._spawn("print('x')"), lambda line: None, lambda exit_code: exited.set())
+        self.assertTrue(exited.wait(10))
+
+    @unittest.skipUnless(hasattr(signal, "SIGCHLD"), "no SIGCHLD")
+    def test_3_sigchld_wakeup(self):
+        manager: ProcessManager = ProcessManager(BotLogger())
+        manager._use_pidfd = False
+        # without the signal the exit would only be seen after a minute
+        manager.POLL_INTERVAL = 60
+        try:
+            self.assertTrue(manager.install_signal())
+            installed: list[bool] = []
+            thread: threading.Thread = threading.Thread(target=lambda: installed.append(manager.install_signal()))
+            thread.start()
+            thread.join()
+            self.assertEqual(installed, [False])
+            exited: threading.Event = threading.Event()
+            manager.register(self._spawn("import time\ntime.sleep(0.5)"), lambda line: None, lambda exit_code: exited.set())
+            self.assertTrue(exited.wait(10))
+        finally:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            manager._wakeup()
+
+    def test_4_failing_handlers(self):
+        bot_logger: BotLogger = BotLogger()
+        manager: ProcessManager = ProcessManager(bot_logger)
+        exited: threading.Event = threading.Event()
+
+        def on_exit(exit_code: int):
+            exited.set()
+            raise RuntimeError("exit handler")
+
+        def on_line(line: str):
+            raise RuntimeError("output handler")
+
+        with self.assertLogs(bot_logger, "ERROR") as logs:
+            manager.register(self._spawn("print('x')"), on_line, on_exit)
+            self.assertTrue(exited.wait(10))
+            # the exit handler is still unwinding in the manager thread
+            deadline: float = time.monotonic() + 10
+            while len(logs.records) < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self.assertIn("output handler", logs.output[0])
+        self.assertIn("exit handler", logs.output[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
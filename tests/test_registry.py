@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import unittest
+
+from src.config.config import Config, InvalidHandlerException
+from src.handlers.handler_config import HandlerConfig
+from src.handlers.registry import HandlerRegistry
+from src.kcp.kcp import KCPHandler
+from src.logger.bot_logger import BotLogger
+
+
+class DummyHandler(KCPHandler):
+    pass
+
+
+class RegistryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry: HandlerRegistry = HandlerRegistry()
+
+    def test_0_lazy_import(self):
+        code: str = "import sys; from src.config.config import Config; print(','.join(m for m in ('paramiko', 'bs4', 'requests') if m in sys.modules))"
+        output: str = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "")
+
+    def test_1_builtin_handlers(self):
+        self.assertIn("system", self.registry.get_names())
+        self.assertFalse(self.registry.is_loaded("ssh"))
+        self.assertEqual(self.registry.get_handler("ssh").__name__, "SSHHandler")
+        self.assertTrue(self.registry.is_loaded("ssh"))
+
+    def test_2_register(self):
+        self.registry.register("dummy", DummyHandler)
+        self.assertEqual(self.registry.get_handler("dummy"), DummyHandler)
+        self.registry.register("dummy_path", f"{__name__}:DummyHandler")
+        self.assertEqual(self.registry.get_handler("dummy_path"), DummyHandler)
+        config: Config = Config(BotLogger(), self.registry)
+        handler, handler_config = config.get_handler_config({"handler": "dummy"})
+        self.assertEqual(handler, DummyHandler)
+        self.assertEqual(type(handler_config), HandlerConfig)
+
+    def test_3_invalid_handler(self):
+        self.assertRaises(InvalidHandlerException, self.registry.get_handler, "idk")
+        self.registry.register("not_handler", "src.helpers.detector:Detector")
+        self.assertRaises(InvalidHandlerException, self.registry.get_handler, "not_handler")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from src.kcp.process_config import ProcessConfig
+from src.kcp.resources import AffinityAllocator, ProcessResources
+from src.logger.bot_logger import BotLogger
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "linux process controls")
+class ResourcesTest(unittest.TestCase):
+    def test_0_allocator(self):
+        cores: list[int] = sorted(os.sched_getaffinity(0))
+        first: list[int] = AffinityAllocator.allocate(1, [])
+        second: list[int] = AffinityAllocator.allocate(1, [])
+        self.assertEqual(len(first), 1)
+        if len(cores) > 1:
+            self.assertNotEqual(first, second)
+        self.assertEqual(AffinityAllocator.allocate(1, cores), [])
+
+    def test_1_env(self):
+        resources: ProcessResources = ProcessResources(BotLogger(), ProcessConfig(affinity=[0], gogc=50))
+        env: dict[str, str] = resources.get_env()
+        self.assertEqual(env["GOMAXPROCS"], "1")
+        self.assertEqual(env["GOGC"], "50")
+        self.assertNotIn("GOMAXPROCS", ProcessResources(BotLogger(), None).get_env())
+        self.assertEqual(ProcessResources(BotLogger(), None).get_command_prefix(), [])
+
+    def test_2_apply(self):
+        core: int = sorted(os.sched_getaffinity(0))[-1]
+        resources: ProcessResources = ProcessResources(BotLogger(), ProcessConfig(affinity=[core], nice=5, nofile=512))
+        # the go runtime starts its threads right away, they have to inherit the settings
+        script: str = "import threading, time; threading.Thread(target=time.sleep, args=(10,)).start(); time.sleep(10)"
+        process: subprocess.Popen = subprocess.Popen(resources.get_command_prefix() + [sys.executable, "-c", script])
+        try:
+            resources.apply(process.pid)
+            deadline: float = time.time() + 10
+            while len(os.listdir(f"/proc/{process.pid}/task")) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+            tids: list[int] = [int(tid) for tid in os.listdir(f"/proc/{process.pid}/task")]
+            self.assertEqual(len(tids), 2)
+            for tid in tids:
+                self.assertEqual(os.sched_getaffinity(tid), {core})
+                self.assertEqual(os.getpriority(os.PRIO_PROCESS, tid), max(5, os.getpriority(os.PRIO_PROCESS, 0)))
+            import resource
+            self.assertEqual(resource.prlimit(process.pid, resource.RLIMIT_NOFILE)[0], 512)
+        finally:
+            process.kill()
+            process.wait()
+
+if __name__ == "__main__":
+    unittest.main()
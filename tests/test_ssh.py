@@ -0,0 +1,127 @@
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+from typing import Optional
+
+from src.config.settings import BotSettings
+from src.handlers.ssh import ssh
+from src.handlers.ssh.ssh import SSHHandler
+from src.handlers.ssh.ssh_config import SSHHandlerConfig
+from src.helpers.artifacts import ArtifactProvider
+from src.helpers.detector import Arch, OS
+from src.helpers.files import sha256_file
+from src.helpers.github import Artifact
+from src.kcp.kcp_config import KCPClientConfig
+from src.kcp.upgrade_config import UpgradeConfig
+from src.logger.bot_logger import BotLogger
+from src.logger.log_config import LogConfig
+from src.service.mode import ServiceMode
+from src.state.state_config import StateConfig
+
+
+class FakeKcptunProvider(ArtifactProvider):
+    def get_kcptun_artifact(self, os_: OS, arch: Arch) -> Optional[Artifact]:
+        return Artifact(f"kcptun-{os_.value}-{arch.value}", f"fake://{os_.value}/{arch.value}")
+
+    def fetch(self, artifact: Artifact, path: str):
+        data: bytes = b"#!/bin/sh\n"
+        with tarfile.open(path, "w:gz") as tar:
+            info: tarfile.TarInfo = tarfile.TarInfo("client_linux_amd64")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+class FakeSFTP:
+    def __init__(self, uploads: list[str]):
+        self._uploads: list[str] = uploads
+        self.hash: str = ""
+
+    def put(self, localpath: str, remotepath: str):
+        self._uploads.append(remotepath)
+        self.hash = sha256_file(localpath)
+
+    def close(self):
+        pass
+
+
+class FakeSSHClient:
+    uploads: list[str] = []
+    sftp: Optional[FakeSFTP] = None
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, **kwargs):
+        pass
+
+    def open_sftp(self) -> FakeSFTP:
+        FakeSSHClient.sftp = FakeSFTP(FakeSSHClient.uploads)
+        return FakeSSHClient.sftp
+
+
+class SSHTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd: str = os.getcwd()
+        self.tmp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        self.ssh_client = ssh.SSHClient
+        ssh.SSHClient = FakeSSHClient
+        FakeSSHClient.uploads = []
+        self.commands: list[str] = []
+
+    def tearDown(self) -> None:
+        ssh.SSHClient = self.ssh_client
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def _remote(self, command: str) -> str:
+        self.commands.append(command)
+        if command == "uname -m":
+            return "x86_64\n"
+        if command == "uname -s":
+            return "Linux\n"
+        if command.startswith("test -x"):
+            return "ok\n"
+        if command.startswith("sha256sum"):
+            return f"{FakeSSHClient.sftp.hash}  auto_kcp/client_linux_amd64\n"
+        return ""
+
+    def _handler(self) -> SSHHandler:
+        settings: BotSettings = BotSettings(LogConfig(False), state_config=StateConfig(True, os.path.join(self.tmp_dir.name, "state.json")))
+        kcp_config: KCPClientConfig = KCPClientConfig("1.2.3.4:25566", ":25566", "key", conn=1)
+        handler: SSHHandler = SSHHandler(BotLogger(), ServiceMode.CLIENT, kcp_config, SSHHandlerConfig("user", "pass", "host", 22), settings, "ssh_test")
+        handler._artifacts = FakeKcptunProvider()
+        handler._simple_command = self._remote
+        return handler
+
+    def test_0_restart_from_state(self):
+        self._handler().download_bin()
+        self.assertIn("uname -m", self.commands)
+        self.assertEqual(FakeSSHClient.uploads, ["auto_kcp/client_linux_amd64"])
+
+        self.commands.clear()
+        restarted: SSHHandler = self._handler()
+        restarted.download_bin()
+        self.assertFalse([command for command in self.commands if command.startswith("uname")])
+        self.assertEqual(len(FakeSSHClient.uploads), 1)
+        self.assertEqual(restarted._bin_remote_path, "auto_kcp/client_linux_amd64")
+
+    def test_1_unknown_saved_system(self):
+        handler: SSHHandler = self._handler()
+        handler._state.set(system={"os": "Linux", "arch": "x86_64"})
+        self.assertEqual(handler._get_remote_system(True), (OS.LINUX, Arch.AMD64))
+        self.assertIn("uname -s", self.commands)
+
+    def test_2_upgrade_ignored(self):
+        bot_logger: BotLogger = BotLogger()
+        kcp_config: KCPClientConfig = KCPClientConfig("1.2.3.4:25566", ":25566", "key", conn=1)
+        kcp_config.upgrade = UpgradeConfig(True)
+        with self.assertLogs(bot_logger, "WARNING") as logs:
+            SSHHandler(bot_logger, ServiceMode.CLIENT, kcp_config, SSHHandlerConfig("user", "pass", "host", 22), BotSettings(LogConfig(False)), "ssh_test")
+        self.assertIn("the upgrade config is ignored", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import stat
+import tempfile
+import time
+import unittest
+from typing import Optional
+
+from src.helpers.artifacts import ArtifactProvider, CachedArtifactProvider
+from src.helpers.detector import Arch, OS
+from src.helpers.github import Artifact
+from src.state.state_config import StateConfig
+from src.state.state_store import StateStore, HandlerState
+
+
+class CountingArtifactProvider(ArtifactProvider):
+    def __init__(self):
+        self.resolved: int = 0
+        self.fail: bool = False
+
+    def get_kcptun_artifact(self, os_: OS, arch: Arch) -> Optional[Artifact]:
+        self.resolved += 1
+        return Artifact(f"kcptun-{self.resolved}", f"https://example.com/{self.resolved}.tar.gz", 10, "abc")
+
+    def fetch(self, artifact: Artifact, path: str):
+        if self.fail:
+            raise IOError("404")
+
+
+class StateTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.path: str = os.path.join(self.tmp_dir.name, "state.json")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_0_persistence(self):
+        state: HandlerState = HandlerState(StateStore(self.path), "client_0", "SSHHandler:client:user@host:22")
+        state.set(system={"os": "linux", "arch": "amd64"}, binary={"path": "auto_kcp/client_linux_amd64"})
+        state.remove("binary")
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        restored: HandlerState = HandlerState(StateStore(self.path), "client_0", "SSHHandler:client:user@host:22")
+        self.assertEqual(restored.get("system"), {"os": "linux", "arch": "amd64"})
+        self.assertIsNone(restored.get("binary"))
+        # same name pointing to another host must rediscover everything
+        moved: HandlerState = HandlerState(StateStore(self.path), "client_0", "SSHHandler:client:user@other:22")
+        self.assertIsNone(moved.get("system"))
+        moved.set(system={"os": "freebsd", "arch": "arm64"})
+        self.assertIsNone(HandlerState(StateStore(self.path), "client_0", "SSHHandler:client:user@host:22").get("system"))
+
+    def test_1_corrupted_file(self):
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        state: HandlerState = HandlerState(StateStore(self.path), "server", "SystemHandler:server:")
+        self.assertEqual(state.get("anything", 1), 1)
+        state.set(anything=2)
+        self.assertEqual(HandlerState(StateStore(self.path), "server", "SystemHandler:server:").get("anything"), 2)
+
+    def test_2_disabled(self):
+        state: HandlerState = HandlerState.from_config(StateConfig(False, self.path), "server", "")
+        state.set(anything=2)
+        self.assertIsNone(state.get("anything"))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_3_cached_artifacts(self):
+        provider: CountingArtifactProvider = CountingArtifactProvider()
+        state: HandlerState = HandlerState(StateStore(self.path), "server", "SystemHandler:server:")
+        artifact: Artifact = CachedArtifactProvider(provider, state, 3600).get_kcptun_artifact(OS.LINUX, Arch.AMD64)
+        cached: Artifact = CachedArtifactProvider(provider, state, 3600).get_kcptun_artifact(OS.LINUX, Arch.AMD64)
+        self.assertEqual(provider.resolved, 1)
+        self.assertEqual(cached.to_dict(), artifact.to_dict())
+        # expired
+        self.assertEqual(CachedArtifactProvider(provider, state, -1).get_kcptun_artifact(OS.LINUX, Arch.AMD64).name, "kcptun-2")
+        # a failing download proves the saved release stale
+        provider.fail = True
+        cached_provider: CachedArtifactProvider = CachedArtifactProvider(provider, state, 3600)
+        stale: Artifact = cached_provider.get_kcptun_artifact(OS.LINUX, Arch.AMD64)
+        self.assertRaises(IOError, cached_provider.fetch, stale, os.path.join(self.tmp_dir.name, "x"))
+        provider.fail = False
+        self.assertEqual(CachedArtifactProvider(provider, state, 3600).get_kcptun_artifact(OS.LINUX, Arch.AMD64).name, "kcptun-3")
+
+    def test_4_fresh_values(self):
+        state: HandlerState = HandlerState(StateStore(self.path), "server", "")
+        state.set_fresh("release", {"name": "a"})
+        self.assertEqual(state.get_fresh("release", 60), {"name": "a"})
+        state.set(release={"value": {"name": "a"}, "saved": time.time() - 120})
+        self.assertIsNone(state.get_fresh("release", 60))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.logger.log_config import LogConfig
+from src.logger.tracer import Tracer
+
+
+class TracerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.tracer: Tracer = Tracer(LogConfig(True, self.tmp_dir.name))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_0_spans_file(self):
+        with self.tracer.span("SystemHandler", "server", "download") as span:
+            span.add_bytes(1024)
+        with self.assertRaises(ValueError):
+            with self.tracer.span("SystemHandler", "server", "extract"):
+                raise ValueError("broken tarball")
+        with open(self.tracer.get_path()) as f:
+            spans: list[dict] = [json.loads(line) for line in f]
+        self.assertEqual([s["span"] for s in spans], ["download", "extract"])
+        self.assertEqual(spans[0]["bytes"], 1024)
+        self.assertEqual(spans[0]["outcome"], "ok")
+        self.assertEqual(spans[1]["outcome"], "error: ValueError")
+        self.assertEqual(spans[0]["handler_type"], "SystemHandler")
+        self.assertEqual(spans[0]["handler"], "server")
+        self.assertGreaterEqual(spans[0]["duration"], 0)
+
+    def test_1_percentiles(self):
+        values: list[float] = [float(i) for i in range(1, 101)]
+        self.assertEqual(Tracer.percentile(values, 50), 50.0)
+        self.assertEqual(Tracer.percentile(values, 90), 90.0)
+        self.assertEqual(Tracer.percentile(values, 99), 99.0)
+        self.assertEqual(Tracer.percentile([3.0], 99), 3.0)
+
+    def test_2_summary(self):
+        for _ in range(3):
+            with self.tracer.span("ApexHandler", "client_0", "login"):
+                pass
+        with self.tracer.span("SSHHandler", "client_1", "sftp_put"):
+            pass
+        summary: list[str] = self.tracer.summarize("ApexHandler")
+        self.assertEqual(len(summary), 1)
+        self.assertTrue(summary[0].startswith("ApexHandler login: n=3 p50="))
+        self.assertEqual(len(self.tracer.summarize()), 2)
+
+    def test_3_disabled(self):
+        tracer: Tracer = Tracer(LogConfig(True, self.tmp_dir.name, trace=False))
+        with tracer.span("SystemHandler", "server", "download"):
+            pass
+        self.assertFalse(os.path.exists(tracer.get_path()))
+        self.assertEqual(len(tracer.summarize()), 1)
+
+    def test_4_unwritable_dir(self):
+        blocker: str = os.path.join(self.tmp_dir.name, "file")
+        open(blocker, "w").close()
+        tracer: Tracer = Tracer(LogConfig(True, os.path.join(blocker, "logs")))
+        with tracer.span("SystemHandler", "server", "download"):
+            pass
+        with self.assertRaises(ValueError):
+            with tracer.span("SystemHandler", "server", "extract"):
+                raise ValueError("broken tarball")
+        self.assertEqual(len(tracer.summarize()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+import os
+import signal
+import socket
+import sys
+import tarfile
+import tempfile
+import time
+import unittest
+from typing import Optional
+
+from src.config.settings import BotSettings
+from src.handlers.handler_config import HandlerConfig
+from src.handlers.system.system import SystemHandler
+from src.helpers.artifacts import ArtifactProvider
+from src.helpers.detector import Arch, OS, Detector
+from src.helpers.github import Artifact
+from src.helpers.network import is_port_bound
+from src.kcp.exit_cause import ExitCause, ExitBackoff
+from src.kcp.kcp_config import KCPClientConfig
+from src.kcp.process_config import ProcessConfig
+from src.kcp.upgrade_config import UpgradeConfig
+from src.logger.bot_logger import BotLogger
+from src.logger.log_config import LogConfig
+from src.service.mode import ServiceMode
+
+FAKE_KCPTUN: str = f"""#!{sys.executable}
+import signal, socket, sys, time
+# a real kcptun takes a moment to close its sessions, the port is busy until it exits
+signal.signal(signal.SIGTERM, lambda *args: (time.sleep(0.5), sys.exit(0)))
+if "broken" in sys.argv[0]:
+    print("listen tcp: address already in use", flush=True)
+    sys.exit(1)
+host, port = sys.argv[sys.argv.index("-l") + 1].rsplit(":", 1)
+s = socket.socket()
+s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+s.bind((host, int(port)))
+s.listen()
+print("listening on", port, flush=True)
+while True:
+    s.accept()
+"""
+
+
+class FakeArtifactProvider(ArtifactProvider):
+    def __init__(self, tarball: str, broken_tarball: Optional[str] = None):
+        self.tarball: str = tarball
+        self.broken_tarball: Optional[str] = broken_tarball
+        self.version: int = 1
+        # releases whose binary exits right away
+        self.broken: set[int] = set()
+
+    def get_kcptun_artifact(self, os_: OS, arch: Arch) -> Optional[Artifact]:
+        return Artifact(f"kcptun-{self.version}", f"fake://{self.version}")
+
+    def fetch(self, artifact: Artifact, path: str):
+        with open(self.broken_tarball if artifact.name in {f"kcptun-{v}" for v in self.broken} else self.tarball, "rb") as src, open(path, "wb") as dst:
+            dst.write(src.read())
+
+
+def free_port() -> int:
+    s: socket.socket = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port: int = s.getsockname()[1]
+    s.close()
+    return port
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "needs /proc/net")
+class UpgradeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd: str = os.getcwd()
+        self.tmp_dir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        detector: Detector = Detector()
+        import platform
+        binary_name: str = f"client_{detector.detect_os(platform.uname().system).value}_{detector.detect_arch(platform.uname().machine).value}"
+        for tarball, name in (("fake.tar.gz", binary_name), ("broken.tar.gz", f"{binary_name}_broken")):
+            with open(name, "w") as f:
+                f.write(FAKE_KCPTUN)
+            os.chmod(name, 0o755)
+            with tarfile.open(tarball, "w:gz") as tar:
+                tar.add(name)
+            os.remove(name)
+        self.port, self.alt_port = free_port(), free_port()
+        kcp_config: KCPClientConfig = KCPClientConfig("127.0.0.1:1", f"127.0.0.1:{self.port}", "key", conn=1)
+        kcp_config.upgrade = UpgradeConfig(True, 3600, f"127.0.0.1:{self.alt_port}", 10, 1)
+        self.handler: SystemHandler = SystemHandler(BotLogger(), ServiceMode.CLIENT, kcp_config, HandlerConfig(), BotSettings(LogConfig(False)), "upgrade_test")
+        self.provider: FakeArtifactProvider = FakeArtifactProvider(os.path.abspath("fake.tar.gz"), os.path.abspath("broken.tar.gz"))
+        self.handler._artifacts = self.provider
+
+    def tearDown(self) -> None:
+        self.handler.stop_kcp()
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def _wait_bound(self, port: int, bound: bool = True):
+        deadline: float = time.time() + 10
+        while is_port_bound(port) != bound and time.time() < deadline:
+            time.sleep(0.1)
+        self.assertEqual(is_port_bound(port), bound)
+
+    def test_0_alt_port_upgrade(self):
+        self.handler.download_bin()
+        self.handler.run_kcp()
+        self._wait_bound(self.port)
+        # same release, nothing to do
+        self.handler._check_upgrade()
+        self.assertFalse(is_port_bound(self.alt_port))
+
+        self.provider.version = 2
+        self.handler._check_upgrade()
+        self._wait_bound(self.port, False)
+        self.assertTrue(is_port_bound(self.alt_port))
+        self.assertEqual(self.handler._kcp_config.listen, f"127.0.0.1:{self.alt_port}")
+        self.assertEqual(self.handler._kcp_config.upgrade.alt_listen, f"127.0.0.1:{self.port}")
+        self.assertTrue(self.handler.is_running())
+
+        self.provider.version = 3
+        self.handler._check_upgrade()
+        self._wait_bound(self.port)
+        self._wait_bound(self.alt_port, False)
+        self.handler.stop_kcp()
+        self.assertTrue(self.handler._kcp_process.wait(10))
+        self.assertFalse(self.handler.is_running())
+
+    def test_1_quick_swap(self):
+        self.handler._kcp_config.upgrade.alt_listen = None
+        self.handler.download_bin()
+        self.handler.run_kcp()
+        self._wait_bound(self.port)
+        self.provider.version = 2
+        self.handler._check_upgrade()
+        self._wait_bound(self.port)
+        # the new kcptun holds the port, it did not lose the bind race against the old one
+        time.sleep(1)
+        self.assertTrue(self.handler.is_running())
+        self.assertEqual(self.handler._artifact.name, "kcptun-2")
+
+    def test_2_memory_exec(self):
+        self.handler._kcp_config.process = ProcessConfig(exec_mode="memory")
+        self.handler._kcp_config.upgrade.alt_listen = None
+        handler: SystemHandler = SystemHandler(BotLogger(), ServiceMode.CLIENT, self.handler._kcp_config, HandlerConfig(), BotSettings(LogConfig(False)), "memory_test")
+        handler._artifacts = self.provider
+        self.handler = handler
+        handler.download_bin()
+        self.assertFalse(os.path.isdir(handler._RESOURCES_DIR))
+        handler.run_kcp()
+        self._wait_bound(self.port)
+        self.provider.version = 2
+        handler._check_upgrade()
+        self._wait_bound(self.port)
+        self.assertTrue(handler.is_running())
+        self.assertEqual(sorted(os.listdir(".")), ["broken.tar.gz", "fake.tar.gz", "state.json"])
+
+    def test_3_quick_swap_rollback(self):
+        self.handler._kcp_config.upgrade.alt_listen = None
+        self.handler._kcp_config.upgrade.health_timeout = 3
+        self.handler.download_bin()
+        self.handler.run_kcp()
+        self._wait_bound(self.port)
+        self.provider.version = 2
+        self.provider.broken.add(2)
+        self.handler._check_upgrade()
+        self._wait_bound(self.port)
+        self.assertTrue(self.handler.is_running())
+        self.assertEqual(self.handler._artifact.name, "kcptun-1")
+
+    def test_4_exit_after_upgrade(self):
+        self.handler._kcp_config.upgrade.alt_listen = None
+        self.handler.download_bin()
+        self.handler.run_kcp()
+        self._wait_bound(self.port)
+        self.provider.version = 2
+        self.handler._check_upgrade()
+        self._wait_bound(self.port)
+        os.kill(self.handler._kcp_process._process.pid, signal.SIGKILL)
+        self.assertTrue(self.handler._kcp_process.wait(10))
+        self.assertEqual(self.handler.get_exit_cause(), ExitCause.TRANSIENT)
+        self.assertEqual(self.handler.get_retry_delay(), ExitBackoff.TRANSIENT_DELAY)
+
+    def test_5_failing_exit_callback(self):
+        self.handler.download_bin()
+        self.handler.run_kcp()
+        self._wait_bound(self.port)
+
+        def fail(process):
+            raise RuntimeError("broken callback")
+
+        self.handler._kcp_process._on_exit_callback = fail
+        os.kill(self.handler._kcp_process._process.pid, signal.SIGKILL)
+        self.assertTrue(self.handler._kcp_process.wait(10))
+        self.assertFalse(self.handler.is_running())
+
+
+if __name__ == "__main__":
+    unittest.main()